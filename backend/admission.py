@@ -0,0 +1,92 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+
+from metrics import Counter, Gauge, Histogram
+
+QUEUE_DEPTH = Gauge("admission_queue_depth", "Requests waiting for a concurrency slot", ["limiter"])
+IN_FLIGHT = Gauge("admission_in_flight", "Requests holding a concurrency slot", ["limiter"])
+QUEUE_WAIT = Histogram("admission_queue_wait_seconds", "Time spent waiting for a concurrency slot", ["limiter"])
+SHED = Counter("admission_shed_total", "Requests rejected by admission control", ["limiter", "reason"])
+
+
+class Overloaded(HTTPException):
+    """
+    Raised when a request is shed by admission control. Rendered by FastAPI
+    as 429 (queue full) or 503 (queue wait timed out) with a Retry-After header.
+    """
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+
+
+class ConcurrencyLimiter:
+    """
+    Caps concurrent calls to an upstream service, with a bounded wait queue.
+    A caller that finds the queue full is rejected immediately; a queued caller
+    that does not get a slot within queue_timeout seconds is rejected too.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float, retry_after: int = 2):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+
+    def acquire(self):
+        start = time.monotonic()
+        with self._cond:
+            if self._active >= self.max_concurrent:
+                if self._waiting >= self.max_queue:
+                    SHED.inc(limiter=self.name, reason="queue_full")
+                    raise Overloaded(429, f"Too many concurrent {self.name} requests", self.retry_after)
+
+                self._waiting += 1
+                QUEUE_DEPTH.set(self._waiting, limiter=self.name)
+                try:
+                    deadline = start + self.queue_timeout
+                    while self._active >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            SHED.inc(limiter=self.name, reason="queue_timeout")
+                            raise Overloaded(503, f"Timed out waiting for a {self.name} slot", self.retry_after)
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+                    QUEUE_DEPTH.set(self._waiting, limiter=self.name)
+
+            self._active += 1
+            IN_FLIGHT.set(self._active, limiter=self.name)
+        QUEUE_WAIT.observe(time.monotonic() - start, limiter=self.name)
+
+    def try_acquire(self) -> bool:
+        """
+        Takes a slot without waiting: only when one is free and no caller is
+        queued for it.
+        """
+        with self._cond:
+            if self._active >= self.max_concurrent or self._waiting:
+                return False
+            self._active += 1
+            IN_FLIGHT.set(self._active, limiter=self.name)
+            return True
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            IN_FLIGHT.set(self._active, limiter=self.name)
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
@@ -0,0 +1,152 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Upper bound of every key that starts with a given prefix
+PREFIX_END = "\uffff"
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def term_keys(text: str) -> List[str]:
+    """
+    Keys a term is found under: the whole term and every word-start suffix,
+    so "Jazz Evening at Marina Bay" completes "jaz", "mar" and "bay".
+    """
+    words = normalize(text).split(" ")
+    return sorted({" ".join(words[i:]) for i in range(len(words)) if words[i]})
+
+
+class PrefixIndex:
+    """
+    Typeahead over (kind, text) terms, weighted by how many entities carry
+    the term. Keys live in one sorted list of (key, term id) pairs, so the
+    completions for a prefix are the contiguous range found with two
+    bisections. Top results for short prefixes, whose ranges are long, are
+    memoized and invalidated when a term under them changes.
+    """
+
+    def __init__(self, max_results: int = 20, cached_prefix_length: int = 2):
+        self.max_results = max_results
+        self.cached_prefix_length = cached_prefix_length
+        self._entries: List[Tuple[str, int]] = []
+        self._terms: List[Tuple[str, str]] = []
+        self._weights: List[int] = []
+        self._ids: Dict[Tuple[str, str], int] = {}
+        self._cache: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, terms: Iterable[Tuple[str, str]], **kwargs) -> "PrefixIndex":
+        """
+        Builds the index from (kind, text) pairs in one sort; repeated pairs add weight.
+        """
+        index = cls(**kwargs)
+        for (kind, text), weight in Counter(t for t in terms if normalize(t[1])).items():
+            index._ids[(kind, text)] = len(index._terms)
+            index._terms.append((kind, text))
+            index._weights.append(weight)
+            index._entries.extend((key, index._ids[(kind, text)]) for key in term_keys(text))
+        index._entries.sort()
+        return index
+
+    def __len__(self) -> int:
+        return sum(1 for w in self._weights if w > 0)
+
+    def _invalidate(self, text: str):
+        for key in term_keys(text):
+            for length in range(1, self.cached_prefix_length + 1):
+                self._cache.pop(key[:length], None)
+
+    def add(self, kind: str, text: str, weight: int = 1):
+        """
+        Adds weight to a term, inserting its keys if it is new.
+        """
+        if not normalize(text):
+            return
+        with self._lock:
+            term_id = self._ids.get((kind, text))
+            if term_id is None:
+                term_id = self._ids[(kind, text)] = len(self._terms)
+                self._terms.append((kind, text))
+                self._weights.append(0)
+            if self._weights[term_id] <= 0:
+                for key in term_keys(text):
+                    insort(self._entries, (key, term_id))
+            self._weights[term_id] += weight
+            self._invalidate(text)
+
+    def add_many(self, terms: Iterable[Tuple[str, str]]):
+        """
+        Adds a batch of (kind, text) terms with one merge of the sorted keys
+        instead of an insertion per key.
+        """
+        with self._lock:
+            entries = []
+            for (kind, text), weight in Counter(t for t in terms if normalize(t[1])).items():
+                term_id = self._ids.get((kind, text))
+                if term_id is None:
+                    term_id = self._ids[(kind, text)] = len(self._terms)
+                    self._terms.append((kind, text))
+                    self._weights.append(0)
+                if self._weights[term_id] <= 0:
+                    entries.extend((key, term_id) for key in term_keys(text))
+                self._weights[term_id] += weight
+            if entries:
+                entries.sort()
+                # Two sorted runs: timsort merges them in linear time
+                self._entries.extend(entries)
+                self._entries.sort()
+            self._cache.clear()
+
+    def remove(self, kind: str, text: str, weight: int = 1):
+        """
+        Removes weight from a term, dropping its keys once no entity carries it.
+        """
+        with self._lock:
+            term_id = self._ids.get((kind, text))
+            if term_id is None or self._weights[term_id] <= 0:
+                return
+            self._weights[term_id] -= weight
+            if self._weights[term_id] <= 0:
+                self._weights[term_id] = 0
+                for key in term_keys(text):
+                    position = bisect_left(self._entries, (key, term_id))
+                    if position < len(self._entries) and self._entries[position] == (key, term_id):
+                        del self._entries[position]
+            self._invalidate(text)
+
+    def _top(self, prefix: str, limit: int, kinds: Optional[Sequence[str]]) -> List[int]:
+        lo = bisect_left(self._entries, (prefix,))
+        hi = bisect_left(self._entries, (prefix + PREFIX_END,))
+        candidates = {term_id for _, term_id in self._entries[lo:hi]}
+        if kinds:
+            candidates = {t for t in candidates if self._terms[t][0] in kinds}
+        return heapq.nsmallest(
+            limit, candidates, key=lambda t: (-self._weights[t], len(self._terms[t][1]), self._terms[t][1])
+        )
+
+    def complete(self, prefix: str, limit: int = 8, kinds: Optional[Sequence[str]] = None) -> List[dict]:
+        """
+        Returns up to limit completions for prefix, heaviest first, optionally
+        restricted to some kinds.
+        """
+        prefix = normalize(prefix)
+        limit = min(limit, self.max_results)
+        if not prefix or limit <= 0:
+            return []
+        with self._lock:
+            if not kinds and len(prefix) <= self.cached_prefix_length:
+                top = self._cache.get(prefix)
+                if top is None:
+                    top = self._cache[prefix] = self._top(prefix, self.max_results, None)
+            else:
+                top = self._top(prefix, limit, kinds)
+            return [
+                {"text": self._terms[t][1], "kind": self._terms[t][0], "weight": self._weights[t]}
+                for t in top[:limit]
+            ]
@@ -0,0 +1,125 @@
+"""
+Benchmark of the encoder backends on the entity corpus.
+
+    python bench_encoders.py --backends float,int8 --k 5 10
+
+For each backend it reports model load time, single-query encode latency
+(p50/p95), corpus encode throughput, and retrieval agreement with the float
+backend: recall@k of each query's top-k entities against the float top-k.
+"""
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from encoders import ENCODER_BACKENDS, load_local_encoder
+from events import COMMUNITIES, EVENTS, USERS
+from retrieval import entity_texts, normalize_rows
+
+QUERIES = [
+    "jazz music by the beach",
+    "weekend tech conference",
+    "yoga and meditation in the morning",
+    "street food and local markets",
+    "art workshops for beginners",
+    "stand-up comedy night",
+    "photography walk",
+    "people who like coding and gadgets",
+    "fitness and healthy living",
+    "book lovers and creative writing",
+    "classical dance and carnatic music",
+    "outdoor adventure trekking",
+    "environment and sustainability volunteers",
+    "startup founders and entrepreneurs",
+    "family friendly festival",
+    "gaming and esports",
+]
+
+
+def corpus() -> Dict[str, List[str]]:
+    return {
+        "event": entity_texts(EVENTS, "event"),
+        "user": entity_texts(USERS, "user"),
+        "community": entity_texts(COMMUNITIES, "community"),
+    }
+
+
+def top_k(query_vectors: np.ndarray, matrix: np.ndarray, k: int) -> np.ndarray:
+    scores = query_vectors @ matrix.T
+    return np.argsort(-scores, axis=1, kind="stable")[:, :k]
+
+
+def benchmark(backend: str, texts: Dict[str, List[str]], repeat: int, batch_size: int) -> dict:
+    start = time.perf_counter()
+    encoder = load_local_encoder(backend)
+    load_seconds = time.perf_counter() - start
+
+    # Warm up
+    encoder.encode(QUERIES[:2], batch_size=batch_size)
+
+    latencies = []
+    for _ in range(repeat):
+        for query in QUERIES:
+            start = time.perf_counter()
+            encoder.encode([query], batch_size=1)
+            latencies.append(time.perf_counter() - start)
+
+    all_texts = [t for values in texts.values() for t in values]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encoder.encode(all_texts, batch_size=batch_size)
+    throughput = repeat * len(all_texts) / (time.perf_counter() - start)
+
+    return {
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "p50_ms": 1000 * float(np.percentile(latencies, 50)),
+        "p95_ms": 1000 * float(np.percentile(latencies, 95)),
+        "texts_per_second": throughput,
+        "queries": normalize_rows(np.asarray(encoder.encode(QUERIES, batch_size=batch_size), dtype=np.float32)),
+        "matrices": {
+            entity_type: normalize_rows(np.asarray(encoder.encode(values, batch_size=batch_size), dtype=np.float32))
+            for entity_type, values in texts.items()
+        },
+    }
+
+
+def recall_at_k(result: dict, reference: dict, k: int) -> float:
+    """
+    Mean overlap of each query's top-k entities with the reference backend's
+    top-k, over all entity types.
+    """
+    recalls = []
+    for entity_type, matrix in result["matrices"].items():
+        expected = top_k(reference["queries"], reference["matrices"][entity_type], k)
+        actual = top_k(result["queries"], matrix, k)
+        recalls.extend(len(set(a) & set(e)) / len(e) for a, e in zip(actual, expected))
+    return float(np.mean(recalls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark encoder backends on the entity corpus.")
+    parser.add_argument("--backends", default=",".join(ENCODER_BACKENDS))
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    texts = corpus()
+    backends = args.backends.split(",")
+    results = [benchmark(backend, texts, args.repeat, args.batch_size) for backend in backends]
+    reference = next((r for r in results if r["backend"] == "float"), results[0])
+
+    header = f"{'backend':<8} {'load s':>7} {'p50 ms':>7} {'p95 ms':>7} {'texts/s':>9}"
+    header += "".join(f" {'recall@' + str(k):>9}" for k in args.k)
+    print(f"Corpus: {sum(len(v) for v in texts.values())} entities, {len(QUERIES)} queries; recall vs {reference['backend']}")
+    print(header)
+    for r in results:
+        line = f"{r['backend']:<8} {r['load_seconds']:>7.2f} {r['p50_ms']:>7.2f} {r['p95_ms']:>7.2f} {r['texts_per_second']:>9.1f}"
+        line += "".join(f" {recall_at_k(r, reference, k):>9.3f}" for k in args.k)
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
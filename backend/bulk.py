@@ -0,0 +1,293 @@
+"""
+Streaming JSONL import and export of events, users and communities.
+
+    python bulk.py import events events.jsonl --url http://127.0.0.1:8000
+    python bulk.py export users users.jsonl
+
+The CLI streams the file to (or from) the /bulk/{collection} endpoints of a
+running server ("-" reads stdin or writes stdout). Imports are processed
+batch by batch: records are validated, their embeddings computed in
+fixed-size encoder batches and appended to the indexes before the next
+batch is read, so memory use does not grow with the size of the file.
+"""
+import argparse
+import http.client
+import json
+import logging
+import sys
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+from pydantic import BaseModel, EmailStr, ValidationError
+
+from metrics import Counter
+from retrieval import entity_texts, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+IMPORTED_RECORDS = Counter("bulk_import_records_total", "Records read by bulk imports", ["entity_type", "result"])
+
+# URL path segment of each entity type
+COLLECTIONS = {"events": "event", "users": "user", "communities": "community"}
+
+# Error details kept in an import report
+MAX_ERROR_SAMPLES = 20
+
+
+class EventRecord(BaseModel):
+    id: int
+    name: str
+    location: str
+    type: str
+    date: str
+    time: str
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+
+
+class UserRecord(BaseModel):
+    id: int
+    username: str
+    email: EmailStr
+    interests: List[str]
+    community_ids: List[int] = []
+
+
+class CommunityRecord(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    interests: List[str]
+
+
+RECORD_MODELS = {"event": EventRecord, "user": UserRecord, "community": CommunityRecord}
+
+
+class ImportReport:
+    def __init__(self, entity_type: str):
+        self.entity_type = entity_type
+        self.read = 0
+        self.imported = 0
+        self.errors = 0
+        self.error_samples: List[dict] = []
+        self.started = time.perf_counter()
+
+    def error(self, line: int, message: str):
+        self.errors += 1
+        IMPORTED_RECORDS.inc(entity_type=self.entity_type, result="error")
+        if len(self.error_samples) < MAX_ERROR_SAMPLES:
+            self.error_samples.append({"line": line, "error": message})
+
+    def as_dict(self) -> dict:
+        seconds = time.perf_counter() - self.started
+        return {
+            "entity_type": self.entity_type,
+            "read": self.read,
+            "imported": self.imported,
+            "errors": self.errors,
+            "error_samples": self.error_samples,
+            "seconds": round(seconds, 3),
+            "records_per_second": round(self.imported / seconds, 1) if seconds > 0 else None,
+        }
+
+
+class BulkImporter:
+    """
+    Streams JSONL lines into an entity collection.
+
+    add() buffers parsed lines and returns a batch once batch_size lines are
+    buffered; process() validates it, rejects ids that already exist (per
+    exists, or earlier in the import), encodes the valid records in
+    embed_batch_size chunks and hands them with their embeddings to apply.
+    """
+
+    def __init__(
+        self,
+        entity_type: str,
+        encoder,
+        apply: Callable[[List[dict], np.ndarray], None],
+        exists: Callable[[int], bool],
+        batch_size: int = 1024,
+        embed_batch_size: int = 64,
+    ):
+        self.entity_type = entity_type
+        self.model = RECORD_MODELS[entity_type]
+        self.encoder = encoder
+        self.apply = apply
+        self.exists = exists
+        self.batch_size = batch_size
+        self.embed_batch_size = embed_batch_size
+        self.report = ImportReport(entity_type)
+        self._pending: List[Tuple[int, str]] = []
+
+    def add(self, line: str) -> Optional[List[Tuple[int, str]]]:
+        self.report.read += 1
+        if line.strip():
+            self._pending.append((self.report.read, line))
+        if len(self._pending) >= self.batch_size:
+            batch, self._pending = self._pending, []
+            return batch
+        return None
+
+    def validate(self, batch: List[Tuple[int, str]]) -> List[dict]:
+        records = []
+        seen = set()
+        for line_number, line in batch:
+            try:
+                record = self.model.model_validate_json(line).model_dump(exclude_none=True)
+            except ValidationError as e:
+                details = (f"{'.'.join(map(str, err['loc'])) or 'record'}: {err['msg']}" for err in e.errors())
+                self.report.error(line_number, "; ".join(details))
+                continue
+            if record["id"] in seen or self.exists(record["id"]):
+                self.report.error(line_number, f"duplicate id {record['id']}")
+                continue
+            seen.add(record["id"])
+            records.append(record)
+        return records
+
+    def process(self, batch: List[Tuple[int, str]]):
+        records = self.validate(batch)
+        if not records:
+            return
+        texts = entity_texts(records, self.entity_type)
+        embeddings = np.concatenate([
+            normalize_rows(np.asarray(
+                self.encoder.encode(texts[i:i + self.embed_batch_size], batch_size=self.embed_batch_size),
+                dtype=np.float32,
+            ))
+            for i in range(0, len(texts), self.embed_batch_size)
+        ])
+        self.apply(records, embeddings)
+        self.report.imported += len(records)
+        IMPORTED_RECORDS.inc(len(records), entity_type=self.entity_type, result="imported")
+
+    def run(self, lines: Iterable[str]) -> dict:
+        """
+        Imports every line synchronously and returns the report.
+        """
+        for line in lines:
+            batch = self.add(line)
+            if batch:
+                self.process(batch)
+        return self.finish()
+
+    def finish(self) -> dict:
+        """
+        Processes the last partial batch and returns the report.
+        """
+        batch, self._pending = self._pending, []
+        self.process(batch)
+        report = self.report.as_dict()
+        logger.info(
+            f"Imported {report['imported']} {self.entity_type}(s) with {report['errors']} error(s) "
+            f"in {report['seconds']}s ({report['records_per_second']}/s)"
+        )
+        return report
+
+
+class LineSplitter:
+    """
+    Re-chunks a byte stream into text lines, holding at most one partial line.
+    """
+
+    def __init__(self):
+        self._partial = b""
+
+    def feed(self, chunk: bytes) -> List[str]:
+        *lines, self._partial = (self._partial + chunk).split(b"\n")
+        return [line.decode("utf-8", errors="replace") for line in lines]
+
+    def flush(self) -> List[str]:
+        partial, self._partial = self._partial, b""
+        return [partial.decode("utf-8", errors="replace")] if partial else []
+
+
+def iter_jsonl(records: Iterable[dict], chunk_records: int = 1000) -> Iterator[str]:
+    """
+    Serializes records as JSONL, chunk_records lines per yielded string.
+    """
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) >= chunk_records:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def read_chunks(stream, size: int = 1 << 16) -> Iterator[bytes]:
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def connect(url: str) -> Tuple[http.client.HTTPConnection, str]:
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    return connection_class(parts.netloc, timeout=None), parts.path.rstrip("/")
+
+
+def import_file(url: str, collection: str, path: str) -> Dict:
+    connection, prefix = connect(url)
+    stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        connection.request(
+            "POST", f"{prefix}/bulk/{collection}", body=read_chunks(stream),
+            headers={"Content-Type": "application/x-ndjson"}, encode_chunked=True,
+        )
+        response = connection.getresponse()
+        body = json.loads(response.read() or b"null")
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+        connection.close()
+    if response.status != 200:
+        raise SystemExit(f"Import failed with HTTP {response.status}: {body}")
+    return body
+
+
+def export_file(url: str, collection: str, path: str) -> int:
+    connection, prefix = connect(url)
+    connection.request("GET", f"{prefix}/bulk/{collection}")
+    response = connection.getresponse()
+    if response.status != 200:
+        raise SystemExit(f"Export failed with HTTP {response.status}: {response.read().decode(errors='replace')}")
+    out = sys.stdout.buffer if path == "-" else open(path, "wb")
+    written = 0
+    try:
+        for chunk in read_chunks(response):
+            out.write(chunk)
+            written += chunk.count(b"\n")
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+        connection.close()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk JSONL import/export against a running API.")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("collection", choices=list(COLLECTIONS))
+    parser.add_argument("path", help="JSONL file, or - for stdin/stdout")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.action == "import":
+        report = import_file(args.url, args.collection, args.path)
+        print(json.dumps(report, indent=2), file=sys.stderr)
+    else:
+        count = export_file(args.url, args.collection, args.path)
+        seconds = time.perf_counter() - start
+        print(f"Exported {count} {args.collection} in {seconds:.2f}s ({count / max(seconds, 1e-9):.0f}/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+import logging
+import threading
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Column kinds: scalar ints, interned strings, interned strings also parsed as
+# YYYY-MM-DD dates, free text kept as UTF-8 bytes, and list fields; text and
+# lists are stored as CSR (indptr + flat values)
+INT, STR, DATE, TEXT, STR_LIST, INT_LIST = "int", "str", "date", "text", "str_list", "int_list"
+LIST_KINDS = (STR_LIST, INT_LIST)
+CSR_KINDS = LIST_KINDS + (TEXT,)
+
+# Code of a missing (None) string, and the bytes of a missing text value (never valid UTF-8)
+MISSING = -1
+MISSING_TEXT = b"\xff"
+
+
+class StringPool:
+    """
+    Interned strings shared by every string column of a store: each distinct
+    value is kept once and columns hold int32 codes into it.
+    """
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return MISSING
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, code: int) -> Optional[str]:
+        return None if code == MISSING else self.values[code]
+
+
+def fit(array: np.ndarray, length: int) -> np.ndarray:
+    """
+    Returns array if it holds at least length items, else a geometrically
+    larger copy of it.
+    """
+    if len(array) >= length:
+        return array
+    grown = np.empty(max(length, 2 * len(array), 1024), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def parse_date(value: Optional[str]) -> np.datetime64:
+    try:
+        return np.datetime64(datetime.strptime(value, "%Y-%m-%d").date(), "D")
+    except (TypeError, ValueError):
+        return np.datetime64("NaT", "D")
+
+
+class ColumnStore:
+    """
+    Column-oriented storage of an entity list.
+
+    Ints live in int64 arrays, strings as int32 codes into a shared StringPool,
+    dates additionally as datetime64[D] (NaT when unparseable), free text
+    (names, descriptions, urls: mostly unique, so interning would only add a
+    lookup entry per value) as UTF-8 bytes in one uint8 array, and text and
+    list fields as CSR pairs (indptr, values). Records are read through RowView,
+    which decodes a field only when it is accessed, so a request pays for
+    the rows it returns and never for the rest.
+
+    List fields can be replaced per row; the new values are kept in an
+    overlay until compact() folds them back into the CSR arrays. append()
+    writes new rows into spare capacity at the end of every array, and ids
+    appended since the last sort are looked up in a small dict.
+    """
+
+    def __init__(self, name: str, records: Sequence[dict], schema: Dict[str, str]):
+        self.name = name
+        self.schema = dict(schema)
+        self.fields = tuple(schema)
+        self.size = len(records)
+        self.pool = StringPool()
+        self._overlay: Dict[str, Dict[int, list]] = {f: {} for f, kind in schema.items() if kind in LIST_KINDS}
+        self._recent_ids: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.columns, self.dates = self._encode(records)
+        self._sort_ids()
+        logger.info(f"Built columnar {name} store: {self.size} rows, {self.nbytes()} bytes")
+
+    def _encode(self, records: Sequence[dict]) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """
+        Encodes records into one array (or CSR pair) per column, plus the parsed dates.
+        """
+        columns: Dict[str, Any] = {}
+        dates: Dict[str, np.ndarray] = {}
+        count = len(records)
+        for field, kind in self.schema.items():
+            if kind == INT:
+                columns[field] = np.fromiter((r[field] for r in records), dtype=np.int64, count=count)
+            elif kind in (STR, DATE):
+                columns[field] = np.fromiter((self.pool.intern(r.get(field)) for r in records), dtype=np.int32, count=count)
+                if kind == DATE:
+                    dates[field] = np.array([parse_date(r.get(field)) for r in records], dtype="datetime64[D]")
+            elif kind == TEXT:
+                columns[field] = self._text([r.get(field) for r in records])
+            elif kind in LIST_KINDS:
+                columns[field] = self._csr(kind, [r.get(field) or [] for r in records])
+            else:
+                raise ValueError(f"Unknown column kind {kind} for {field}")
+        return columns, dates
+
+    def _sort_ids(self):
+        ids = self.columns["id"][:self.size]
+        order = np.argsort(ids, kind="stable")
+        self._sorted = (order, ids[order])
+        self._recent_ids = {}
+
+    def append(self, records: Sequence[dict]):
+        """
+        Adds records at the end of the store. Readers never look past size,
+        which is bumped once every column has been written.
+        """
+        if not records:
+            return
+        with self._lock:
+            columns, dates = self._encode(records)
+            start, stop = self.size, self.size + len(records)
+            for field, kind in self.schema.items():
+                if kind in CSR_KINDS:
+                    indptr, values = self.columns[field]
+                    new_indptr, new_values = columns[field]
+                    offset = int(indptr[start])
+                    indptr = fit(indptr, stop + 1)
+                    indptr[start + 1:stop + 1] = new_indptr[1:] + offset
+                    values = fit(values, offset + len(new_values))
+                    values[offset:offset + len(new_values)] = new_values
+                    self.columns[field] = (indptr, values)
+                else:
+                    array = fit(self.columns[field], stop)
+                    array[start:stop] = columns[field]
+                    self.columns[field] = array
+            for field, parsed in dates.items():
+                array = fit(self.dates[field], stop)
+                array[start:stop] = parsed
+                self.dates[field] = array
+            self._recent_ids.update(zip(columns["id"].tolist(), range(start, stop)))
+            self.size = stop
+            if len(self._recent_ids) > max(1024, stop // 8):
+                self._sort_ids()
+
+    def _csr(self, kind: str, lists: List[list]):
+        lengths = np.fromiter((len(values) for values in lists), dtype=np.int64, count=len(lists))
+        indptr = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        encode = self.pool.intern if kind == STR_LIST else int
+        dtype = np.int32 if kind == STR_LIST else np.int64
+        values = np.fromiter((encode(v) for values in lists for v in values), dtype=dtype, count=int(indptr[-1]))
+        return indptr, values
+
+    @staticmethod
+    def _text(texts: List[Optional[str]]):
+        encoded = [MISSING_TEXT if text is None else text.encode("utf-8") for text in texts]
+        indptr = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(raw) for raw in encoded], out=indptr[1:])
+        return indptr, np.frombuffer(b"".join(encoded), dtype=np.uint8).copy()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def nbytes(self) -> int:
+        total = 0
+        for column in self.columns.values():
+            total += sum(a.nbytes for a in column) if isinstance(column, tuple) else column.nbytes
+        total += sum(a.nbytes for a in self.dates.values())
+        return total + sum(len(v) for v in self.pool.values)
+
+    def row_of(self, entity_id: int) -> Optional[int]:
+        """
+        Row of the entity with this id, by binary search over the sorted ids
+        (or in the ids appended since they were sorted).
+        """
+        row = self._recent_ids.get(entity_id)
+        if row is not None:
+            return row
+        order, sorted_ids = self._sorted
+        position = int(np.searchsorted(sorted_ids, entity_id))
+        if position < len(sorted_ids) and sorted_ids[position] == entity_id:
+            return int(order[position])
+        return None
+
+    def value(self, row: int, field: str) -> Any:
+        kind = self.schema[field]
+        if kind == INT:
+            return int(self.columns[field][row])
+        if kind in (STR, DATE):
+            return self.pool.lookup(int(self.columns[field][row]))
+        if kind == TEXT:
+            indptr, values = self.columns[field]
+            raw = values[indptr[row]:indptr[row + 1]].tobytes()
+            return None if raw == MISSING_TEXT else raw.decode("utf-8")
+        override = self._overlay[field].get(row)
+        if override is not None:
+            return list(override)
+        indptr, values = self.columns[field]
+        items = values[indptr[row]:indptr[row + 1]]
+        if kind == STR_LIST:
+            return [self.pool.values[code] for code in items]
+        return items.tolist()
+
+    def row(self, row: int) -> "RowView":
+        return RowView(self, row)
+
+    def rows(self, rows: Sequence[int]) -> List["RowView"]:
+        return [RowView(self, int(row)) for row in rows]
+
+    def page(self, skip: int, limit: int) -> List["RowView"]:
+        return self.rows(range(max(skip, 0), min(max(skip, 0) + max(limit, 0), self.size)))
+
+    def rows_where(self, field: str, value: Any) -> np.ndarray:
+        """
+        Rows whose field equals value (for list fields: contains it),
+        found with a vectorized scan of the codes.
+        """
+        kind = self.schema[field]
+        if kind == TEXT:
+            raise ValueError(f"Text field {field} cannot be searched by value")
+        if kind in (STR, DATE, STR_LIST):
+            code = self.pool.codes.get(value)
+            if code is None:
+                return np.zeros(0, dtype=np.int64)
+        else:
+            code = value
+        size = self.size
+        if kind not in LIST_KINDS:
+            return np.flatnonzero(self.columns[field][:size] == code)
+        indptr, values = self.columns[field]
+        indptr = indptr[:size + 1]
+        rows = np.unique(np.searchsorted(indptr, np.flatnonzero(values[:indptr[-1]] == code), side="right") - 1)
+        overlay = self._overlay[field]
+        if overlay:
+            rows = np.setdiff1d(rows, np.fromiter(overlay, dtype=np.int64))
+            matching = [row for row, items in list(overlay.items()) if value in items]
+            rows = np.union1d(rows, np.asarray(matching, dtype=np.int64))
+        return rows
+
+    def set_list(self, row: int, field: str, items: list):
+        """
+        Replaces a list field of one row (kept in the overlay until compact()).
+        """
+        if self.schema[field] == STR_LIST:
+            for item in items:
+                self.pool.intern(item)
+        self._overlay[field][row] = list(items)
+
+    def compact(self):
+        """
+        Folds the overlay into fresh CSR arrays and re-sorts the ids. Each
+        field's arrays are swapped in with one assignment, before its overlay
+        entries are dropped.
+        """
+        with self._lock:
+            self._sort_ids()
+            for field, overlay in self._overlay.items():
+                if not overlay:
+                    continue
+                pending = dict(overlay)
+                lists = [pending[row] if row in pending else self.value(row, field) for row in range(self.size)]
+                self.columns[field] = self._csr(self.schema[field], lists)
+                for row, items in pending.items():
+                    if overlay.get(row) is items:
+                        del overlay[row]
+
+
+class RowView(Mapping):
+    """
+    Read-only mapping over one row of a ColumnStore; fields are decoded on access.
+    """
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: ColumnStore, row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, field: str) -> Any:
+        if field not in self._store.schema:
+            raise KeyError(field)
+        return self._store.value(self._row, field)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store.fields)
+
+    def __len__(self) -> int:
+        return len(self._store.fields)
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    def date(self, field: str = "date") -> np.datetime64:
+        return self._store.dates[field][self._row]
+
+    def __reduce__(self):
+        # Pickled (e.g. into a process-pool job) as the plain dict
+        return dict, (self.to_dict(),)
+
+    def to_dict(self) -> dict:
+        return {field: self._store.value(self._row, field) for field in self._store.fields}
@@ -0,0 +1,75 @@
+import gzip
+import logging
+from typing import Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def load_brotli():
+    """
+    The brotli module, or None when it is not installed (gzip is then the only encoding).
+    """
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+BROTLI = load_brotli()
+
+# Encodings this server produces, most preferred first
+ENCODINGS = ("br", "gzip") if BROTLI is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: Optional[str], encodings: Sequence[str] = ENCODINGS) -> Optional[str]:
+    """
+    Picks the content coding for an Accept-Encoding header: the highest q
+    value wins, ties go to the server's preference, q=0 refuses a coding and
+    "*" stands for any coding not listed. None means send identity.
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    if encoding == "br":
+        return BROTLI.compress(body, quality=brotli_quality)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+    raise ValueError(f"Unsupported content coding {encoding}")
+
+
+def encode_body(
+    body: bytes, encoding: Optional[str], min_size: int, gzip_level: int = 6, brotli_quality: int = 4
+) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Compresses body with the negotiated encoding when it is at least
+    min_size bytes. Returns the body and the headers to send with it.
+    """
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding is None or len(body) < min_size:
+        return body, headers
+    headers["Content-Encoding"] = encoding
+    return compress(body, encoding, gzip_level, brotli_quality), headers
@@ -0,0 +1,158 @@
+import abc
+import logging
+import os
+import threading
+from multiprocessing.connection import Client, Listener
+from typing import List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Encoder backend for this deployment: "float" (PyTorch float32) or "int8" (dynamically quantized)
+ENCODER_BACKEND_ENV = "ENCODER_BACKEND"
+
+# Set by serve.py when workers share one encoder process
+ENCODER_ADDRESS_ENV = "ENCODER_ADDRESS"
+ENCODER_AUTHKEY_ENV = "ENCODER_AUTHKEY"
+
+
+class EncoderBackend(abc.ABC):
+    """
+    Interface of every encoder backend: the subset of
+    SentenceTransformer.encode used by the API.
+    """
+
+    name = ""
+
+    @abc.abstractmethod
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        """
+        Embeds a text or a list of texts, like SentenceTransformer.encode.
+        """
+
+
+class TorchEncoder(EncoderBackend):
+    """
+    The SentenceTransformer model in float32 on PyTorch.
+    """
+
+    name = "float"
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=convert_to_numpy, **kwargs)
+
+
+class QuantizedEncoder(TorchEncoder):
+    """
+    The same model with its Linear layers dynamically quantized to int8 for
+    faster CPU inference. Embeddings stay float32 and comparable with the
+    float backend; see bench_encoders.py for latency and recall.
+    """
+
+    name = "int8"
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        import torch
+
+        super().__init__(model_name)
+        self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+ENCODER_BACKENDS = {backend.name: backend for backend in (TorchEncoder, QuantizedEncoder)}
+
+
+class RemoteEncoder(EncoderBackend):
+    """
+    Client for a shared encoder process started with serve_encoder().
+    Each thread keeps its own connection.
+    """
+
+    name = "remote"
+
+    def __init__(self, address: str, authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or conn.closed:
+            conn = Client(self.address, authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        single = isinstance(texts, str)
+        conn = self._connection()
+        try:
+            conn.send(([texts] if single else list(texts), {"batch_size": batch_size, **kwargs}))
+            status, payload = conn.recv()
+        except (EOFError, OSError):
+            conn.close()
+            raise
+        if status != "ok":
+            raise RuntimeError(f"Encoder process error: {payload}")
+        return payload[0] if single else payload
+
+
+def load_local_encoder(backend: Optional[str] = None, model_name: str = MODEL_NAME) -> EncoderBackend:
+    """
+    Loads an encoder backend in the current process, by default the one
+    selected with ENCODER_BACKEND.
+    """
+    backend = backend or os.getenv(ENCODER_BACKEND_ENV, "float")
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend {backend!r}; expected one of {', '.join(ENCODER_BACKENDS)}")
+    logger.info(f"Loading {backend} encoder backend for {model_name}")
+    return ENCODER_BACKENDS[backend](model_name)
+
+
+def load_encoder() -> EncoderBackend:
+    """
+    Returns the encoder for this process: a client for the shared encoder
+    process when ENCODER_ADDRESS is set, otherwise the local ENCODER_BACKEND.
+    """
+    address = os.getenv(ENCODER_ADDRESS_ENV)
+    if address:
+        logger.info(f"Using shared encoder process at {address}")
+        return RemoteEncoder(address, bytes.fromhex(os.environ[ENCODER_AUTHKEY_ENV]))
+    return load_local_encoder()
+
+
+def serve_encoder(address: str, authkey: bytes, ready=None):
+    """
+    Loads the model once and serves encode requests from worker processes.
+    Each connection is handled on its own thread. Intended as a
+    multiprocessing.Process target; runs until the process is terminated.
+    """
+    model = load_local_encoder()
+    with Listener(address, authkey=authkey) as listener:
+        logger.info(f"Encoder process listening on {address}")
+        if ready is not None:
+            ready.set()
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                logger.warning(f"Rejected encoder connection: {str(e)}")
+                continue
+            threading.Thread(target=_handle_encoder_connection, args=(model, conn), daemon=True).start()
+
+
+def _handle_encoder_connection(model, conn):
+    with conn:
+        while True:
+            try:
+                texts, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                conn.send(("ok", model.encode(texts, convert_to_numpy=True, **kwargs)))
+            except Exception as e:
+                conn.send(("error", str(e)))
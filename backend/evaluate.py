@@ -0,0 +1,207 @@
+"""
+Offline evaluation of the LLM match pipeline on a labeled query set.
+
+    python evaluate.py --protocols compact verbose --candidates 10 20 40 --token-budgets 400 800 1600 \\
+        --chunk-sizes 250 500 1000 --chunk-top-k 3 5 10
+
+Every configuration runs each query of eval_queries.json (queries over
+EVENTS, USERS and COMMUNITIES with the ids of their relevant entities)
+through match_entities against the LLM stub of stub_llm.py, started
+in-process with the given injected latency unless --llm-url is set. For
+each configuration it reports:
+
+- recall and MRR of the retrieval stage: the share of relevant entities
+  among those the prompt offers the LLM, and the reciprocal rank of the
+  first relevant one in prompt order;
+- precision of the end-to-end matches;
+- prompt size (estimated tokens) and match latency (p50/p95).
+
+Configurations on the Pareto front, i.e. not beaten on precision, recall,
+p50 latency and prompt tokens at once by another one, are marked with *.
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import time
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from retrieval import estimate_tokens
+from stub_llm import add_latency_arguments, latency_options, start_stub_server
+
+DEFAULT_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_queries.json")
+
+# Candidate lines of the compact prompt
+PROMPT_ID = re.compile(r"^(\d+)\|", re.MULTILINE)
+
+
+def load_queries(path: str, entity_types: Sequence[str]) -> List[dict]:
+    with open(path) as f:
+        queries = json.load(f)
+    return [q for q in queries if q["entity_type"] in entity_types]
+
+
+def configurations(args: argparse.Namespace) -> List[dict]:
+    configs = []
+    if "compact" in args.protocols:
+        for candidates, budget in itertools.product(args.candidates, args.token_budgets):
+            configs.append({"protocol": "compact", "candidates": candidates, "token_budget": budget})
+    if "verbose" in args.protocols:
+        for chunk_size, top_k in itertools.product(args.chunk_sizes, args.chunk_top_k):
+            configs.append({"protocol": "verbose", "chunk_size": chunk_size, "chunk_top_k": top_k})
+    return configs
+
+
+def apply(fast, config: dict):
+    fast.LLM_MATCH_PROTOCOL = config["protocol"]
+    fast.LLM_CANDIDATES = config.get("candidates", fast.LLM_CANDIDATES)
+    fast.LLM_INPUT_TOKEN_BUDGET = config.get("token_budget", fast.LLM_INPUT_TOKEN_BUDGET)
+    fast.LLM_CHUNK_SIZE = config.get("chunk_size", fast.LLM_CHUNK_SIZE)
+    fast.LLM_CHUNK_TOP_K = config.get("chunk_top_k", fast.LLM_CHUNK_TOP_K)
+
+
+def offered(fast, query: str, entity_type: str, top_n: int):
+    """
+    Ids of the entities the prompt shows the LLM, in prompt order, and the
+    prompt's estimated token count.
+    """
+    if fast.LLM_MATCH_PROTOCOL == "compact":
+        messages = fast.build_compact_messages(query, entity_type, fast.rank_entities(query, entity_type), top_n)
+        ids = [int(i) for i in PROMPT_ID.findall(messages[-1]["content"])]
+    else:
+        messages = fast.build_verbose_messages(query, fast.get_dataset(entity_type), entity_type)
+        text = " ".join(messages[-1]["content"].split())
+        label = "Username" if entity_type == "user" else "Name"
+        key = "username" if entity_type == "user" else "name"
+        positions = []
+        for entity in fast.get_dataset(entity_type):
+            position = text.find(f"{label}: {entity[key]} ")
+            if position >= 0:
+                positions.append((position, entity["id"]))
+        ids = [entity_id for _, entity_id in sorted(positions)]
+    return ids, sum(estimate_tokens(m["content"]) for m in messages)
+
+
+def reciprocal_rank(ranked: Sequence[int], relevant: set) -> float:
+    return next((1.0 / (rank + 1) for rank, entity_id in enumerate(ranked) if entity_id in relevant), 0.0)
+
+
+def embedding_quality(fast, queries: List[dict], ks: Sequence[int]) -> Dict[str, float]:
+    """
+    recall@k and MRR of the embedding ranking alone, over the whole collection.
+    """
+    recalls = {k: [] for k in ks}
+    ranks = []
+    for q in queries:
+        relevant = set(q["relevant"])
+        ranked = [e["id"] for e in fast.rank_entities(q["query"], q["entity_type"], k=len(fast.get_dataset(q["entity_type"])))]
+        for k in ks:
+            recalls[k].append(len(relevant & set(ranked[:k])) / len(relevant))
+        ranks.append(reciprocal_rank(ranked, relevant))
+    result = {f"recall@{k}": float(np.mean(values)) for k, values in recalls.items()}
+    result["mrr"] = float(np.mean(ranks))
+    return result
+
+
+def evaluate(fast, config: dict, queries: List[dict], top_n: int, repeat: int) -> dict:
+    apply(fast, config)
+    recalls, ranks, precisions, tokens, latencies = [], [], [], [], []
+    degraded_count = 0
+    for q in queries:
+        relevant = set(q["relevant"])
+        ids, prompt_tokens = offered(fast, q["query"], q["entity_type"], top_n)
+        recalls.append(len(relevant & set(ids)) / len(relevant))
+        ranks.append(reciprocal_rank(ids, relevant))
+        tokens.append(prompt_tokens)
+        for attempt in range(repeat):
+            start = time.perf_counter()
+            matched, degraded = fast.match_entities(q["query"], q["entity_type"], top_n=top_n)
+            latencies.append(time.perf_counter() - start)
+            if attempt == 0:
+                precisions.append(len(relevant & {e["id"] for e in matched}) / len(matched) if matched else 0.0)
+                degraded_count += degraded
+    return {
+        **config,
+        "tokens": float(np.mean(tokens)),
+        "recall": float(np.mean(recalls)),
+        "mrr": float(np.mean(ranks)),
+        "precision": float(np.mean(precisions)),
+        "degraded": degraded_count / len(queries),
+        "p50_ms": 1000 * float(np.percentile(latencies, 50)),
+        "p95_ms": 1000 * float(np.percentile(latencies, 95)),
+    }
+
+
+def pareto_front(results: List[dict]) -> List[bool]:
+    """
+    Whether each result is not dominated: no other result is at least as good
+    on precision, recall, p50 latency and tokens and better on one of them.
+    """
+    def objectives(r):
+        return (r["precision"], r["recall"], -r["p50_ms"], -r["tokens"])
+
+    flags = []
+    for r in results:
+        mine = objectives(r)
+        flags.append(not any(
+            all(o >= m for o, m in zip(objectives(other), mine)) and objectives(other) != mine
+            for other in results
+        ))
+    return flags
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval and LLM match quality and latency per configuration.")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="Labeled query set (JSON)")
+    parser.add_argument("--entity-types", nargs="+", default=["event", "user", "community"])
+    parser.add_argument("--protocols", nargs="+", default=["compact", "verbose"], choices=["compact", "verbose"])
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 20, 40], help="Compact: LLM_CANDIDATES")
+    parser.add_argument("--token-budgets", type=int, nargs="+", default=[400, 800, 1600], help="Compact: LLM_INPUT_TOKEN_BUDGET")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[250, 500, 1000], help="Verbose: LLM_CHUNK_SIZE")
+    parser.add_argument("--chunk-top-k", type=int, nargs="+", default=[3, 5, 10], help="Verbose: LLM_CHUNK_TOP_K")
+    parser.add_argument("--top-n", type=int, default=10, help="Matches requested per query")
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10], help="Cut-offs of the embedding recall@k")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per query")
+    parser.add_argument("--llm-url", default=None, help="Use this Groq-compatible server instead of the in-process stub")
+    add_latency_arguments(parser)
+    parser.set_defaults(latency_ms=150.0, prefill_ms_per_1k=100.0, token_ms=2.0, seed=0)
+    args = parser.parse_args()
+
+    if args.llm_url:
+        os.environ["GROQ_BASE_URL"] = args.llm_url
+    else:
+        _, url = start_stub_server(**latency_options(args))
+        os.environ["GROQ_BASE_URL"] = url
+        os.environ.setdefault("GROQ_API_KEY", "stub")
+    import fast
+
+    queries = load_queries(args.queries, args.entity_types)
+    quality = embedding_quality(fast, queries, args.k)
+    print(f"{len(queries)} labeled queries; LLM at {os.environ['GROQ_BASE_URL']}")
+    print("Embedding ranking: " + ", ".join(f"{name} {value:.3f}" for name, value in quality.items()))
+
+    configs = configurations(args)
+    # One untimed call so connection setup and lazy initialization are not measured
+    fast.match_entities(queries[0]["query"], queries[0]["entity_type"], top_n=args.top_n)
+    results = [evaluate(fast, config, queries, args.top_n, args.repeat) for config in configs]
+    front = pareto_front(results)
+
+    header = (
+        f"  {'protocol':<8} {'cand':>5} {'budget':>6} {'chunk':>6} {'top_k':>5} {'tokens':>7} "
+        f"{'recall':>7} {'mrr':>6} {'prec':>6} {'degr':>5} {'p50 ms':>8} {'p95 ms':>8}"
+    )
+    print(header)
+    for r, optimal in sorted(zip(results, front), key=lambda item: item[0]["p50_ms"]):
+        print(
+            f"{'*' if optimal else ' '} {r['protocol']:<8} {r.get('candidates', '-'):>5} {r.get('token_budget', '-'):>6} "
+            f"{r.get('chunk_size', '-'):>6} {r.get('chunk_top_k', '-'):>5} {r['tokens']:>7.0f} "
+            f"{r['recall']:>7.3f} {r['mrr']:>6.3f} {r['precision']:>6.3f} {r['degraded']:>5.2f} "
+            f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+# Number of set bits in every byte value
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.int64)
+
+# field name -> function returning the entity's values for that field
+FacetFields = Mapping[str, Callable[[dict], Iterable[str]]]
+
+
+class FacetIndex:
+    """
+    One packed bitmap per facet value (bit i set when entity row i has the
+    value). Each field's bitmaps are stacked into a values x bytes matrix, so
+    counting a field for a result set is one AND and one popcount over the
+    whole matrix, and a filter is an OR within a field and an AND across
+    fields, never a loop over entities.
+    """
+
+    def __init__(self, entities: List[dict], fields: FacetFields):
+        self.size = len(entities)
+        self.nbytes = (self.size + 7) // 8
+        self.row_by_id = {e["id"]: row for row, e in enumerate(entities)}
+        self.values: Dict[str, List[str]] = {}
+        self.columns: Dict[str, Dict[str, int]] = {}
+        self.bitmaps: Dict[str, np.ndarray] = {}
+        for field, values_of in fields.items():
+            rows_by_value: Dict[str, List[int]] = {}
+            for row, entity in enumerate(entities):
+                for value in set(values_of(entity)):
+                    if value:
+                        rows_by_value.setdefault(value, []).append(row)
+            values = sorted(rows_by_value)
+            bits = np.zeros((len(values), self.size), dtype=bool)
+            for i, value in enumerate(values):
+                bits[i, rows_by_value[value]] = True
+            self.values[field] = values
+            self.columns[field] = {value: i for i, value in enumerate(values)}
+            self.bitmaps[field] = np.packbits(bits, axis=1).reshape(len(values), self.nbytes)
+
+    def all(self) -> np.ndarray:
+        return np.packbits(np.ones(self.size, dtype=bool))
+
+    def from_rows(self, rows: Iterable[int]) -> np.ndarray:
+        bits = np.zeros(self.size, dtype=bool)
+        bits[np.fromiter(rows, dtype=np.int64)] = True
+        return np.packbits(bits)
+
+    def from_ids(self, ids: Iterable[int]) -> np.ndarray:
+        """
+        Bitmap of a result set given by entity ids; unknown ids are ignored.
+        """
+        return self.from_rows(self.row_by_id[i] for i in ids if i in self.row_by_id)
+
+    def filter(self, selected: Mapping[str, Union[str, Sequence[str], None]], base: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Bitmap of the rows matching every selected field (any of the listed
+        values within a field). Unknown fields and values match nothing.
+        """
+        bitmap = self.all() if base is None else base.copy()
+        for field, wanted in selected.items():
+            if wanted is None:
+                continue
+            wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+            columns = self.columns.get(field, {})
+            rows = [columns[v] for v in wanted if v in columns]
+            if not rows:
+                return np.zeros(self.nbytes, dtype=np.uint8)
+            bitmap &= np.bitwise_or.reduce(self.bitmaps[field][rows], axis=0)
+        return bitmap
+
+    def count(self, bitmap: np.ndarray) -> int:
+        return int(POPCOUNT[bitmap].sum())
+
+    def rows(self, bitmap: np.ndarray) -> np.ndarray:
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.size))
+
+    def mask(self, bitmap: np.ndarray) -> np.ndarray:
+        """
+        Boolean row mask, e.g. for EntityIndex.search.
+        """
+        return np.unpackbits(bitmap, count=self.size).astype(bool)
+
+    def counts(self, bitmap: Optional[np.ndarray] = None, fields: Optional[Sequence[str]] = None) -> Dict[str, Dict[str, int]]:
+        """
+        Per-field value counts within bitmap (all rows by default), most
+        frequent first, omitting zero counts.
+        """
+        bitmap = self.all() if bitmap is None else bitmap
+        result = {}
+        for field in fields or self.bitmaps:
+            counts = POPCOUNT[self.bitmaps[field] & bitmap].sum(axis=1)
+            order = np.argsort(-counts, kind="stable")
+            result[field] = {self.values[field][i]: int(counts[i]) for i in order if counts[i]}
+        return result
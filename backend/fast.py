@@ -1,18 +1,56 @@
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Query, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
 import numpy as np
 from fastapi.middleware.cors import CORSMiddleware
-from sentence_transformers import SentenceTransformer
 
+import asyncio
+import hmac
+import json
 import logging
 import os
-import re
-import json
-from groq import Groq  # Ensure this is the correct import for your Groq client
+import threading
+import time
+from contextlib import asynccontextmanager
+from itertools import zip_longest
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from groq import APIConnectionError, Groq, InternalServerError, RateLimitError  # Ensure this is the correct import for your Groq client
 
 from events import EVENTS, USERS, COMMUNITIES  # Import data arrays
+from admission import ConcurrencyLimiter, Overloaded
+from autocomplete import PrefixIndex
+from bulk import COLLECTIONS, BulkImporter, LineSplitter, iter_jsonl
+from columnar import DATE, INT, INT_LIST, STR, STR_LIST, TEXT, ColumnStore
+from compression import encode_body, negotiate_encoding
+from encoders import load_encoder
+from facets import FacetIndex
+from hedging import HedgeBudget, HedgedCaller, peek_stream
+from json_stream import iter_json_array
+from metrics import Counter, Histogram, render_prometheus
+from names import NAME_RESOLUTIONS, NameResolver
+from payloads import PayloadCache
+from profiling import ProfileMiddleware, RequestProfiler, format_collapsed, sample_stacks, traced
+from neighbors import NeighborEngine, compute_neighbor_lists
+from recommend import CommunityRecommender, compute_recommendations
+from profiles import build_user_profiles, personalize, user_profile_vector
+from readiness import Readiness
+from retrieval import (
+    CANDIDATE_HEADERS,
+    EntityIndex,
+    QueryCache,
+    convert_data_to_string,
+    entity_texts,
+    estimate_tokens,
+    fit_candidates,
+    format_candidate_line,
+    normalize_rows,
+)
+from scheduler import Job, Scheduler
+from sharding import ShardedIndex
+from sessions import ChatSession, SessionStore
+from timeindex import TimeConstraint, TimeIndex, parse_time_constraint
 
 from datetime import datetime
 
@@ -23,7 +61,36 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 # (Assuming environment variables are managed appropriately elsewhere)
 
-app = FastAPI()
+# Start-up components; /health/ready reports ready once all of them have completed
+READINESS = Readiness([
+    "encoder_load",
+    "indexes",
+    "user_profiles",
+    "neighbors",
+    "recommendations",
+    "encoder_warmup",
+    "index_warmup",
+    "query_cache",
+])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts the background precomputation jobs with the app and stops them on shutdown.
+    Warmup runs in the background so /health/live answers while it is in progress.
+    """
+    warmup = asyncio.get_running_loop().run_in_executor(None, warm_up)
+    if BACKGROUND_JOBS:
+        await SCHEDULER.start()
+    yield
+    warmup.cancel()
+    # Also shuts down the pools of jobs run manually while not scheduled
+    await SCHEDULER.stop()
+    for index in INDEXES.values():
+        if isinstance(index, ShardedIndex):
+            index.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS (Adjust origins as needed)
 app.add_middleware(
@@ -34,11 +101,169 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Groq client directly with API key
-client = Groq(api_key="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")
+# /debug/profile is only served when DEBUG_PROFILE_TOKEN is set; callers send it in X-Debug-Token
+DEBUG_PROFILE_TOKEN = os.getenv("DEBUG_PROFILE_TOKEN")
+# /jobs/{name}/run is only served when JOBS_TOKEN is set; callers send it in X-Jobs-Token
+JOBS_TOKEN = os.getenv("JOBS_TOKEN")
+# Longest profile that can be requested, and the stack sampling interval of mode=sample
+DEBUG_PROFILE_MAX_SECONDS = float(os.getenv("DEBUG_PROFILE_MAX_SECONDS", "60"))
+DEBUG_PROFILE_INTERVAL_MS = float(os.getenv("DEBUG_PROFILE_INTERVAL_MS", "5"))
+# Endpoints whose requests mode=request can trace with cProfile
+PROFILED_PATHS = ("/chatbot", "/match/users", "/users/match", "/match/communities")
+REQUEST_PROFILER = RequestProfiler(PROFILED_PATHS)
+DEBUG_PROFILE_LOCK = asyncio.Lock()
+if DEBUG_PROFILE_TOKEN:
+    app.add_middleware(ProfileMiddleware, profiler=REQUEST_PROFILER)
+
+# Initialize Groq client; GROQ_BASE_URL points it at another compatible server (e.g. stub_llm.py).
+# Its own retries are off: LLM calls are retried and hedged by LLM_STREAM_CALLER / LLM_CHAT_CALLER.
+client = Groq(
+    api_key=os.getenv("GROQ_API_KEY", "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"),
+    base_url=os.getenv("GROQ_BASE_URL"),
+    max_retries=0,
+)
+
+# Initialize SentenceTransformer model (or a client for the shared encoder process, see serve.py)
+with READINESS.component("encoder_load"):
+    model = load_encoder()
+
+# Cache of query embeddings; the most frequent queries are warmed in the background
+QUERY_CACHE = QueryCache(maxsize=int(os.getenv("QUERY_CACHE_SIZE", "4096")))
+
+# Directory of prebuilt, memory-mapped indexes, user profiles, neighbor lists and
+# recommendations shared by all workers (set by serve.py)
+SHARED_INDEX_DIR = os.getenv("SHARED_INDEX_DIR")
+# Set by serve.py in the process that builds those files: it skips the structures only
+# needed to serve requests (name lookups, payloads, facets, autocomplete, shard processes)
+SHARED_INDEX_BUILDER = os.getenv("SHARED_INDEX_BUILDER") == "1"
+# Number of workers serving the app (set by serve.py). Each worker keeps its own copy of the
+# users, stores and autocomplete, so with more than one a write would only reach the worker
+# that took it; writes are rejected instead, and the background rebuilds are not scheduled
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", "1"))
+
+def serving_only(build: Callable[[], object]):
+    """
+    Builds a structure only needed to serve requests; None in the serve.py builder process.
+    """
+    return None if SHARED_INDEX_BUILDER else build()
+
+def load_shared_table(name: str, rows: int, k: int) -> np.ndarray:
+    """
+    Maps a precomputed table saved by serve.py copy-on-write: its pages are
+    shared between workers, and a row updated in a single worker is copied.
+    """
+    table = np.load(os.path.join(SHARED_INDEX_DIR, f"{name}.npy"), mmap_mode="c")
+    if table.shape != (rows, k):
+        raise ValueError(f"Shared {name} table does not match the loaded dataset")
+    return table
+
+# Maximum number of matches returned by the LLM match pipeline
+DEFAULT_TOP_N = 10
+
+# LLM match protocol: "compact" (id lines in, id list out) or "verbose" (text chunks in, full objects out)
+LLM_MATCH_PROTOCOL = os.getenv("LLM_MATCH_PROTOCOL", "compact")
+# Number of index candidates considered for the compact prompt, before the token budget trims them
+LLM_CANDIDATES = int(os.getenv("LLM_CANDIDATES", "40"))
+# Approximate input token budget for the compact prompt
+LLM_INPUT_TOKEN_BUDGET = int(os.getenv("LLM_INPUT_TOKEN_BUDGET", "800"))
+# Verbose prompt: characters per dataset text chunk, and number of best-ranked chunks sent
+LLM_CHUNK_SIZE = int(os.getenv("LLM_CHUNK_SIZE", "500"))
+LLM_CHUNK_TOP_K = int(os.getenv("LLM_CHUNK_TOP_K", "5"))
+# Weight of the user's profile vector when personalizing candidate scores (0 disables it)
+PERSONALIZATION_WEIGHT = float(os.getenv("PERSONALIZATION_WEIGHT", "0.3"))
+# Deadline for the LLM part of a match request; past it, embedding-ranked results are returned
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "6"))
+# Restrict event candidates to the days and times a query names ("Saturday after 6pm") before ranking
+TIME_PREFILTER = os.getenv("TIME_PREFILTER", "1") == "1"
+# Score (cosine scale) added to events matching the query's soft time preferences, e.g. "evening"
+TIME_PREFERENCE_BOOST = float(os.getenv("TIME_PREFERENCE_BOOST", "0.05"))
+
+# /search: default results per entity type and input token budget of its combined prompt
+SEARCH_DEFAULT_LIMIT = int(os.getenv("SEARCH_DEFAULT_LIMIT", "5"))
+SEARCH_INPUT_TOKEN_BUDGET = int(os.getenv("SEARCH_INPUT_TOKEN_BUDGET", "1200"))
+# Prefixes that make candidate ids unique across entity types in the /search prompt, e.g. "e12"
+SEARCH_ID_PREFIXES = {"event": "e", "user": "u", "community": "c"}
+
+# Admission control for all LLM calls: concurrent calls, bounded wait queue and wait timeout
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "2"))
+LLM_LIMITER = ConcurrencyLimiter(
+    "llm",
+    max_concurrent=LLM_MAX_CONCURRENT,
+    max_queue=LLM_MAX_QUEUE,
+    queue_timeout=LLM_QUEUE_TIMEOUT_SECONDS,
+    retry_after=int(os.getenv("LLM_RETRY_AFTER_SECONDS", "2")),
+)
+
+# LLM calls run on this pool so a request can stop waiting when its deadline passes.
+# It has a thread for every admitted or queued call, so nothing waits unseen in the pool.
+LLM_EXECUTOR = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENT + LLM_MAX_QUEUE, thread_name_prefix="llm")
+
+# Hedged LLM requests: when an attempt has not answered (first token, for streams) after this
+# percentile of recent attempt latencies (the default delay until enough are recorded, and never
+# less than the minimum), a duplicate is sent and the first to answer wins
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SECONDS", "1.0"))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.05"))
+# Global hedge budget shared by all LLM calls: hedges per call (0 disables hedging) and burst size
+LLM_HEDGE_BUDGET = HedgeBudget(
+    ratio=float(os.getenv("LLM_HEDGE_BUDGET_RATIO", "0.1")),
+    burst=float(os.getenv("LLM_HEDGE_BUDGET_BURST", "5")),
+)
+# Retries of LLM calls failing with a transient error (connection errors, timeouts, 429, 5xx),
+# after a full-jitter exponential backoff starting at LLM_RETRY_BACKOFF_SECONDS
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF_SECONDS = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", "0.1"))
+LLM_RETRY_BACKOFF_CAP_SECONDS = float(os.getenv("LLM_RETRY_BACKOFF_CAP_SECONDS", "1.0"))
+# Attempts run on their own pool. Every running attempt holds an LLM_LIMITER slot (the caller's,
+# or the one its hedge took), so the pool never needs more threads than there are slots
+LLM_ATTEMPT_EXECUTOR = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENT, thread_name_prefix="llm-attempt")
+
+def is_transient_llm_error(error: BaseException) -> bool:
+    return isinstance(error, (APIConnectionError, RateLimitError, InternalServerError))
+
+def llm_caller(name: str) -> HedgedCaller:
+    return HedgedCaller(
+        name,
+        LLM_ATTEMPT_EXECUTOR,
+        LLM_HEDGE_BUDGET,
+        is_transient_llm_error,
+        percentile=LLM_HEDGE_PERCENTILE,
+        default_delay=LLM_HEDGE_DEFAULT_DELAY_SECONDS,
+        min_delay=LLM_HEDGE_MIN_DELAY_SECONDS,
+        max_retries=LLM_MAX_RETRIES,
+        backoff=LLM_RETRY_BACKOFF_SECONDS,
+        backoff_cap=LLM_RETRY_BACKOFF_CAP_SECONDS,
+        limiter=LLM_LIMITER,
+    )
 
-# Initialize SentenceTransformer model
-model = SentenceTransformer('all-MiniLM-L6-v2')
+# Streamed ranking calls (latency to first token) and non-streamed /chat calls track latencies separately
+LLM_STREAM_CALLER = llm_caller("stream")
+LLM_CHAT_CALLER = llm_caller("chat")
+
+# Server-side /chat sessions: token budget for the recent turns, summary size, LRU size and TTL
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "1500"))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "200"))
+# Cap on the turns kept while summary updates fail (they are folded in once the summarizer recovers)
+CHAT_MAX_UNSUMMARIZED_TOKENS = int(os.getenv("CHAT_MAX_UNSUMMARIZED_TOKENS", str(4 * CHAT_CONTEXT_TOKEN_BUDGET)))
+CHAT_SESSIONS = SessionStore(
+    max_sessions=int(os.getenv("CHAT_MAX_SESSIONS", "10000")),
+    ttl=float(os.getenv("CHAT_SESSION_TTL_SECONDS", "1800")),
+)
+
+# Metrics
+LLM_MATCH_REQUESTS = Counter("llm_match_requests_total", "Match requests sent to the LLM", ["entity_type"])
+LLM_MATCH_FALLBACKS = Counter(
+    "llm_match_fallbacks_total", "Match requests answered with vector-only results", ["entity_type", "reason"]
+)
+TIME_PREFILTERS = Counter(
+    "time_prefilters_total", "Event rankings with day or time constraints or preferences in the query", ["result"]
+)
+LLM_MATCH_LATENCY = Histogram("llm_match_latency_seconds", "Latency of successful LLM match calls", ["entity_type"])
+CHAT_PROMPT_TOKENS = Histogram(
+    "chat_prompt_tokens", "Estimated prompt tokens per /chat turn", buckets=(100, 250, 500, 1000, 2000, 4000, 8000)
+)
 
 # Pydantic Models
 class Event(BaseModel):
@@ -67,28 +292,6 @@ class Community(BaseModel):
 
 # Helper Functions
 
-def convert_data_to_string(entities: List[dict], entity_type: str) -> str:
-    """
-    Converts a list of entities into a single string representation.
-    """
-    if entity_type == "event":
-        return "\n".join([
-            f"Name: {e['name']}\nLocation: {e['location']}\nType: {e['type']}\nDate: {e['date']}\nTime: {e['time']}\nDescription: {e.get('description', '')}\n"
-            for e in entities
-        ])
-    elif entity_type == "user":
-        return "\n".join([
-            f"Username: {u['username']}\nEmail: {u['email']}\nInterests: {', '.join(u['interests'])}\n"
-            for u in entities
-        ])
-    elif entity_type == "community":
-        return "\n".join([
-            f"Name: {c['name']}\nDescription: {c.get('description', '')}\nInterests: {', '.join(c['interests'])}\n"
-            for c in entities
-        ])
-    else:
-        return ""
-
 def chunk_text(text: str, chunk_size: int = 500) -> List[str]:
     """
     Breaks a large text string into smaller chunks without splitting words.
@@ -133,27 +336,43 @@ def extract_json_array(text: str) -> List[dict]:
     """
     Extracts and parses the first JSON array found in the text.
     """
-    try:
-        # Regular expression to find JSON arrays
-        json_array_pattern = re.compile(r'\[.*\]', re.DOTALL)
-        match = json_array_pattern.search(text)
-        if not match:
-            raise ValueError("No JSON array found in the response.")
-
-        json_str = match.group()
-
-        # Parse the JSON
-        data = json.loads(json_str)
-        if isinstance(data, list):
-            # Validate each item has required fields
-            for item in data:
-                if not isinstance(item, dict):
-                    raise ValueError("Array contains non-object items")
-            return data
-        raise ValueError("Response is not a JSON array")
-    except Exception as e:
-        logger.error(f"JSON parsing error: {str(e)}\nText: {text}")
-        return []
+    items = [item for item in iter_json_array([text]) if isinstance(item, dict)]
+    if not items:
+        logger.error(f"JSON parsing error: No JSON array of objects found\nText: {text}")
+    return items
+
+def iter_completion_text(stream, usage: Optional[dict] = None) -> Iterator[str]:
+    """
+    Yields the content deltas of a streamed chat completion.
+    If a usage dict is given, it collects the completion text length and any
+    token usage reported by the API.
+    """
+    for chunk in stream:
+        if usage is not None:
+            reported = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None)
+            if reported is not None:
+                usage["prompt_tokens"] = reported.prompt_tokens
+                usage["completion_tokens"] = reported.completion_tokens
+        if chunk.choices and chunk.choices[0].delta.content:
+            if usage is not None:
+                usage["completion_chars"] = usage.get("completion_chars", 0) + len(chunk.choices[0].delta.content)
+            yield chunk.choices[0].delta.content
+
+def log_token_usage(entity_type: str, messages: List[dict], usage: dict):
+    """
+    Logs prompt and completion token counts for an LLM call. Counts reported
+    by the API are preferred; when the stream was closed early they are estimated.
+    """
+    prompt_tokens = usage.get("prompt_tokens")
+    completion_tokens = usage.get("completion_tokens")
+    estimated = prompt_tokens is None
+    if estimated:
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        completion_tokens = usage.get("completion_chars", 0) // 4
+    logger.info(
+        f"LLM tokens for {entity_type}: prompt={prompt_tokens} completion={completion_tokens}"
+        f"{' (estimated)' if estimated else ''}"
+    )
 
 def get_day_from_date(date_str: str) -> str:
     """
@@ -165,102 +384,432 @@ def get_day_from_date(date_str: str) -> str:
     except ValueError:
         return ""
 
-def get_entities_from_groq(query: str, entity_type: str) -> List[dict]:
+def get_dataset(entity_type: str) -> List[dict]:
     """
-    Processes the query to find relevant entities using Groq's LLM.
-    Steps:
-    1. Convert entities to string.
-    2. Chunk the text.
-    3. Rank and select top chunks.
-    4. Send chunks to LLM with a specific prompt.
-    5. Parse LLM's JSON response.
+    Returns the dataset for an entity type.
     """
-    try:
-        # Select dataset based on entity_type
-        if entity_type == "event":
-            dataset = EVENTS
-        elif entity_type == "user":
-            dataset = USERS
-        elif entity_type == "community":
-            dataset = COMMUNITIES
-        else:
-            dataset = []
+    if entity_type == "event":
+        return EVENTS
+    elif entity_type == "user":
+        return USERS
+    elif entity_type == "community":
+        return COMMUNITIES
+    return []
 
-        if not dataset:
-            logger.warning(f"No dataset found for entity type: {entity_type}")
-            return []
+def build_verbose_messages(query: str, dataset: List[dict], entity_type: str) -> List[dict]:
+    """
+    Builds the original prompt: top ranked text chunks in, full JSON objects out.
+    """
+    # Convert data to string
+    data_string = convert_data_to_string(dataset, entity_type)
 
-        # Convert data to string
-        data_string = convert_data_to_string(dataset, entity_type)
+    # Chunk the data
+    chunks = chunk_text(data_string, chunk_size=LLM_CHUNK_SIZE)
 
-        # Chunk the data
-        chunks = chunk_text(data_string, chunk_size=500)
+    # Rank and select the top chunks
+    top_chunks = rank_chunks(query, chunks, top_k=LLM_CHUNK_TOP_K)
 
-        # Rank and select top 5 chunks
-        top_chunks = rank_chunks(query, chunks, top_k=5)
+    # Combine top chunks into a single string
+    top_data = "\n".join(top_chunks)
 
-        # Combine top chunks into a single string
-        top_data = "\n".join(top_chunks)
+    # Customize prompt based on entity type
+    if entity_type == "event":
+        fields = ["id", "name", "location", "type", "date", "time", "description"]
+    elif entity_type == "user":
+        fields = ["id", "username", "email", "interests", "community_ids"]
+    else:  # community
+        fields = ["id", "name", "description", "interests"]
+
+    prompt = (
+        f"Based on the following data, find matching {entity_type}s for: '{query}'.\n\n"
+        f"Data:\n{top_data}\n\n"
+        f"Respond with ONLY a JSON array of the best matches. "
+        f"Each object should have these fields: {', '.join(fields)}.\n"
+        f"Do NOT include any additional text or explanations. "
+        f"Format the response as a JSON array without any markdown or code blocks."
+    )
 
-        # Customize prompt based on entity type
-        if entity_type == "event":
-            fields = ["id", "name", "location", "type", "date", "time", "description"]
-        elif entity_type == "user":
-            fields = ["id", "username", "email", "interests", "community_ids"]
-        else:  # community
-            fields = ["id", "name", "description", "interests"]
-
-        prompt = (
-            f"Based on the following data, find matching {entity_type}s for: '{query}'.\n\n"
-            f"Data:\n{top_data}\n\n"
-            f"Respond with ONLY a JSON array of the best matches. "
-            f"Each object should have these fields: {', '.join(fields)}.\n"
-            f"Do NOT include any additional text or explanations. "
-            f"Format the response as a JSON array without any markdown or code blocks."
-        )
+    return [
+        {
+            "role": "system",
+            "content": "You are a JSON-only response bot. Always respond with valid JSON arrays without any additional text."
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
 
-        # Get LLM response
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a JSON-only response bot. Always respond with valid JSON arrays without any additional text."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            model="llama-3.3-70b-versatile",
-            temperature=0.1,
-        )
+def encode_query(query: str) -> np.ndarray:
+    """
+    Returns the normalized embedding of a query, from QUERY_CACHE when possible.
+    """
+    query_embedding = QUERY_CACHE.get(query)
+    if query_embedding is None:
+        query_embedding = normalize_rows(model.encode([query])[0])
+        QUERY_CACHE.put(query, query_embedding)
+    return query_embedding
 
-        response_content = chat_completion.choices[0].message.content.strip()
-        logger.info(f"Raw LLM Response for {entity_type}: {response_content}")
+def query_vector(query: str, user_id: Optional[int] = None) -> np.ndarray:
+    """
+    Returns the query embedding. If user_id is given, it is blended with that
+    user's precomputed profile vector.
+    """
+    query_embedding = encode_query(query)
+    row = USER_PROFILE_ROWS.get(user_id) if user_id is not None else None
+    if row is not None and PERSONALIZATION_WEIGHT > 0:
+        query_embedding = personalize(query_embedding, USER_PROFILES.embeddings[row], PERSONALIZATION_WEIGHT)
+    return query_embedding
 
-        # Parse LLM response
-        matched_items = extract_json_array(response_content)
-        if not matched_items:
-            logger.warning(f"No valid matches found in LLM response for {entity_type}")
-            return []
+def time_constraint(query: str, entity_type: str) -> Optional[TimeConstraint]:
+    """
+    The day and time constraints of an event query, or None.
+    """
+    if entity_type != "event" or not TIME_PREFILTER:
+        return None
+    return parse_time_constraint(query, EVENT_TIMES.name_phrases) or None
 
-        # Map parsed items back to full entities
-        matched_entities = []
-        for item in matched_items:
-            if entity_type == "user":
-                entity = next((e for e in dataset if e["username"].lower() == item.get("username", "").lower()), None)
-            else:
-                entity = next((e for e in dataset if e["name"].lower() == item.get("name", "").lower()), None)
+def candidate_mask(query: str, entity_type: str, constraint: Optional[TimeConstraint] = None) -> Optional[np.ndarray]:
+    """
+    Row mask of the events meeting the hard day and time constraints of
+    the query, for EntityIndex.search. None when there is nothing to
+    filter: other entity types, queries without hard constraints, and
+    constraints no event satisfies (ranking then considers every event).
+    """
+    constraint = constraint or time_constraint(query, entity_type)
+    if constraint is None or not constraint.hard:
+        return None
+    mask = EVENT_TIMES.mask(constraint)
+    if len(mask) != len(INDEXES["event"]) or not mask.any():
+        TIME_PREFILTERS.inc(result="unfiltered")
+        return None
+    TIME_PREFILTERS.inc(result="filtered")
+    logger.info(f"{constraint} keeps {int(mask.sum())} of {len(mask)} events")
+    return mask
+
+def search_candidates(entity_type: str, query: str, vector: np.ndarray, k: int) -> List[Tuple[dict, float]]:
+    """
+    Index search for a query's candidates. Events are restricted to the
+    query's hard day and time constraints, and events matching its soft
+    preferences rank as if they scored TIME_PREFERENCE_BOOST higher. The
+    boosted top k is exact: it is taken from the top k of all candidates
+    and the top k of the preferred ones.
+    """
+    index = INDEXES[entity_type]
+    constraint = time_constraint(query, entity_type)
+    mask = candidate_mask(query, entity_type, constraint)
+    hits = index.search(vector, k, mask)
+    if constraint is None or not constraint.soft or TIME_PREFERENCE_BOOST <= 0:
+        return hits
+    preferred = EVENT_TIMES.preferred(constraint)
+    if len(preferred) != len(index):
+        return hits
+    if mask is not None:
+        preferred &= mask
+    if not preferred.any():
+        return hits
+    TIME_PREFILTERS.inc(result="preferred")
+    boosted = index.search(vector, k, preferred)
+    boosted_ids = {entity["id"] for entity, _ in boosted}
+    merged = {}
+    for entity, score in hits + boosted:
+        merged[entity["id"]] = (entity, score + (TIME_PREFERENCE_BOOST if entity["id"] in boosted_ids else 0.0))
+    return sorted(merged.values(), key=lambda hit: -hit[1])[:k]
+
+def rank_entities(query: str, entity_type: str, k: Optional[int] = None, user_id: Optional[int] = None) -> List[dict]:
+    """
+    Returns the k (default LLM_CANDIDATES) entities most similar to the
+    query, best first, personalized for user_id if given. Events outside
+    the days and times the query names are not considered (see
+    search_candidates).
+    """
+    k = LLM_CANDIDATES if k is None else k
+    return [entity for entity, _ in search_candidates(entity_type, query, query_vector(query, user_id), k)]
 
-            if entity:
-                matched_entities.append(entity)
+def build_compact_messages(query: str, entity_type: str, candidates: List[dict], top_n: int) -> List[dict]:
+    """
+    Builds the compact prompt: numbered candidate lines in, a JSON array of ids out.
+    The candidates (best first) are trimmed to LLM_INPUT_TOKEN_BUDGET.
+    """
 
-        return matched_entities
+    system = "You rank candidates. Respond with ONLY a JSON array of candidate ids, best match first."
+    header = (
+        f"Query: {query}\n"
+        f"Return up to {top_n} ids of matching {entity_type}s, e.g. [3,12], or [] if none match.\n"
+        f"{CANDIDATE_HEADERS[entity_type]}\n"
+    )
+    lines = fit_candidates(
+        [format_candidate_line(entity, entity_type) for entity in candidates],
+        estimate_tokens(system) + estimate_tokens(header),
+        LLM_INPUT_TOKEN_BUDGET,
+    )
 
-    except Exception as e:
-        logger.error(f"Error in get_entities_from_groq: {str(e)}")
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": header + "\n".join(lines)},
+    ]
+
+def resolve_llm_item(item, entity_type: str) -> Optional[dict]:
+    """
+    Maps an item of the LLM's JSON array back to a full entity.
+    Compact responses carry ids; verbose responses carry objects with a name,
+    which is matched exactly after normalization, then fuzzily.
+    """
+    if isinstance(item, dict):
+        key = "username" if entity_type == "user" else "name"
+        return NAME_RESOLVERS[entity_type].resolve(str(item.get(key, "")))
+    if isinstance(item, (int, str)) and not isinstance(item, bool):
+        try:
+            entity = INDEXES[entity_type].by_id.get(int(item))
+        except ValueError:
+            # A name where an id was asked for
+            return NAME_RESOLVERS[entity_type].resolve(item)
+        NAME_RESOLUTIONS.inc(entity_type=entity_type, result="exact" if entity else "miss")
+        return entity
+    NAME_RESOLUTIONS.inc(entity_type=entity_type, result="miss")
+    return None
+
+def stream_completion(messages: List[dict], max_tokens: Optional[int], cancel: Optional[threading.Event] = None):
+    """
+    Starts a streamed ranking completion and returns once its first chunk
+    has arrived, hedged and retried by LLM_STREAM_CALLER.
+    """
+    start = lambda: client.chat.completions.create(
+        messages=messages,
+        model="llama-3.3-70b-versatile",
+        temperature=0.1,
+        max_tokens=max_tokens,
+        stream=True,
+        timeout=LLM_DEADLINE_SECONDS,
+    )
+    return LLM_STREAM_CALLER.call(peek_stream(start), cancel, discard=lambda stream: stream.close())
+
+def get_entities_from_groq(
+    query: str,
+    entity_type: str,
+    top_n: int = DEFAULT_TOP_N,
+    candidates: Optional[List[dict]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> List[dict]:
+    """
+    Processes the query to find relevant entities using Groq's LLM.
+    Steps:
+    1. Build the prompt for the configured LLM_MATCH_PROTOCOL:
+       - compact: send the embedding-ranked candidates as short id lines;
+         the model answers with ids.
+       - verbose: chunk the dataset text, rank the chunks and ask for full
+         JSON objects.
+    2. Stream the LLM's response.
+    3. Parse the streamed JSON array, hydrating each match as soon as its
+       element closes, and stop reading once top_n matches are collected
+       or the cancel event is set.
+    The LLM call holds an LLM_LIMITER slot; Overloaded is raised when it is shed.
+    Errors are raised to the caller; see match_entities for the fallback.
+    """
+    dataset = get_dataset(entity_type)
+
+    if not dataset:
+        logger.warning(f"No dataset found for entity type: {entity_type}")
         return []
 
+    if LLM_MATCH_PROTOCOL == "compact":
+        if candidates is None:
+            candidates = rank_entities(query, entity_type)
+        messages = build_compact_messages(query, entity_type, candidates, top_n)
+        max_tokens = 8 + 6 * top_n
+    else:
+        mask = candidate_mask(query, entity_type)
+        if mask is not None:
+            dataset = [entity for entity, keep in zip(dataset, mask) if keep]
+        messages = build_verbose_messages(query, dataset, entity_type)
+        max_tokens = None
+
+    usage = {}
+    matched_entities = []
+    seen_ids = set()
+    with LLM_LIMITER.slot():
+        if cancel is not None and cancel.is_set():
+            return matched_entities
+
+        # Stream LLM response
+        stream = stream_completion(messages, max_tokens, cancel)
+
+        # Map parsed items back to full entities as they arrive
+        try:
+            for item in iter_json_array(iter_completion_text(stream, usage)):
+                if cancel is not None and cancel.is_set():
+                    logger.info(f"LLM match for {entity_type} cancelled")
+                    return matched_entities
+                entity = resolve_llm_item(item, entity_type)
+                if entity and entity["id"] not in seen_ids:
+                    seen_ids.add(entity["id"])
+                    matched_entities.append(entity)
+                    if len(matched_entities) >= top_n:
+                        break
+        finally:
+            stream.close()
+
+    log_token_usage(entity_type, messages, usage)
+    logger.info(f"LLM matched {len(matched_entities)} {entity_type}(s): {[e['id'] for e in matched_entities]}")
+    if not matched_entities:
+        logger.warning(f"No valid matches found in LLM response for {entity_type}")
+
+    return matched_entities
+
+def match_entities(
+    query: str,
+    entity_type: str,
+    top_n: int = DEFAULT_TOP_N,
+    deadline: Optional[float] = None,
+    user_id: Optional[int] = None,
+) -> Tuple[List[dict], bool]:
+    """
+    Matches entities with the LLM within a latency budget.
+    Returns (entities, degraded). If the LLM call fails or has not answered
+    within the deadline (LLM_DEADLINE_SECONDS by default), it is cancelled and
+    the embedding-ranked candidates are returned with degraded=True.
+    Calls shed by admission control raise Overloaded (429/503) instead.
+    A user_id personalizes the candidate ranking.
+    """
+    candidates = rank_entities(query, entity_type, user_id=user_id)
+    return refine_candidates(query, entity_type, candidates, top_n, deadline)
+
+def refine_candidates(
+    query: str,
+    entity_type: str,
+    candidates: List[dict],
+    top_n: int = DEFAULT_TOP_N,
+    deadline: Optional[float] = None,
+) -> Tuple[List[dict], bool]:
+    """
+    Has the LLM pick the matches among the embedding-ranked candidates.
+    Returns (entities, degraded) like match_entities.
+    """
+    deadline = LLM_DEADLINE_SECONDS if deadline is None else deadline
+    matched, reason = run_with_deadline(entity_type, deadline, get_entities_from_groq, query, entity_type, top_n, candidates)
+    if reason is None:
+        return matched, False
+    return candidates[:top_n], True
+
+def run_with_deadline(label: str, deadline: float, target, *args):
+    """
+    Runs target(*args, cancel) on LLM_EXECUTOR for up to deadline seconds.
+    Returns (result, None), or (None, reason) when the call failed or timed
+    out, in which case it is cancelled and the caller falls back to
+    vector-only results. Overloaded is re-raised.
+    """
+    cancel = threading.Event()
+    start = time.monotonic()
+
+    LLM_MATCH_REQUESTS.inc(entity_type=label)
+    future = LLM_EXECUTOR.submit(traced(target), *args, cancel)
+    try:
+        result = future.result(timeout=deadline)
+        LLM_MATCH_LATENCY.observe(time.monotonic() - start, entity_type=label)
+        return result, None
+    except Overloaded:
+        raise
+    except FutureTimeoutError:
+        cancel.set()
+        future.cancel()
+        reason = "timeout"
+        logger.warning(f"LLM match for {label} exceeded the {deadline}s deadline; returning vector-only results")
+    except Exception as e:
+        reason = "error"
+        logger.error(f"Error in {target.__name__}: {str(e)}; returning vector-only results")
+
+    LLM_MATCH_FALLBACKS.inc(entity_type=label, reason=reason)
+    return None, reason
+
+def build_search_messages(query: str, candidates: Dict[str, List[dict]], limits: Dict[str, int]) -> List[dict]:
+    """
+    Builds the combined /search prompt: one section of typed candidate lines
+    per entity type in, a JSON array of typed ids out. Candidates are taken
+    in rank order across the types, so SEARCH_INPUT_TOKEN_BUDGET trims the
+    weakest candidates of every type rather than a whole type.
+    """
+    system = "You rank candidates. Respond with ONLY a JSON array of candidate ids, best match first."
+    wanted = ", ".join(f"{limits[t]} {t}s" for t in candidates)
+    header = (
+        f"Query: {query}\n"
+        f"Return the ids of the matching candidates, at most {wanted}, e.g. [\"e3\",\"c12\"], or [] if none match.\n"
+    )
+    sections = {t: f"{t.capitalize()}s ({CANDIDATE_HEADERS[t]}):" for t in candidates}
+    per_type = [
+        [(t, f"{SEARCH_ID_PREFIXES[t]}{format_candidate_line(e, t)}") for e in entities]
+        for t, entities in candidates.items()
+    ]
+    ranked = [pair for row in zip_longest(*per_type) for pair in row if pair is not None]
+    kept = fit_candidates(
+        [line for _, line in ranked],
+        estimate_tokens(system) + estimate_tokens(header) + sum(estimate_tokens(h) for h in sections.values()),
+        SEARCH_INPUT_TOKEN_BUDGET,
+    )
+    lines = {t: [] for t in candidates}
+    for entity_type, line in ranked[:len(kept)]:
+        lines[entity_type].append(line)
+
+    body = "\n".join(f"{sections[t]}\n" + "\n".join(lines[t]) for t in candidates if lines[t])
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": header + body},
+    ]
+
+def resolve_search_item(item) -> Tuple[Optional[str], Optional[dict]]:
+    """
+    Maps a typed id from the /search response (e.g. "e12") to (entity_type, entity).
+    """
+    id_types = {prefix: entity_type for entity_type, prefix in SEARCH_ID_PREFIXES.items()}
+    if isinstance(item, str) and len(item) > 1 and item[0].lower() in id_types:
+        entity_type = id_types[item[0].lower()]
+        try:
+            entity = INDEXES[entity_type].by_id.get(int(item[1:]))
+        except ValueError:
+            entity = None
+        NAME_RESOLUTIONS.inc(entity_type=entity_type, result="exact" if entity else "miss")
+        return entity_type, entity
+    NAME_RESOLUTIONS.inc(entity_type="search", result="miss")
+    return None, None
+
+def search_with_llm(
+    query: str,
+    candidates: Dict[str, List[dict]],
+    limits: Dict[str, int],
+    cancel: Optional[threading.Event] = None,
+) -> Dict[str, List[dict]]:
+    """
+    Ranks the candidates of every entity type with a single streamed LLM
+    call and returns the matches grouped by type, within the per-type
+    limits. Always uses the compact id protocol.
+    """
+    messages = build_search_messages(query, candidates, limits)
+    usage = {}
+    matched = {entity_type: [] for entity_type in candidates}
+    seen = set()
+    with LLM_LIMITER.slot():
+        if cancel is not None and cancel.is_set():
+            return matched
+
+        stream = stream_completion(messages, 8 + 7 * sum(limits[t] for t in candidates), cancel)
+        try:
+            for item in iter_json_array(iter_completion_text(stream, usage)):
+                if cancel is not None and cancel.is_set():
+                    logger.info("LLM search cancelled")
+                    return matched
+                entity_type, entity = resolve_search_item(item)
+                if entity is None or entity_type not in matched or (entity_type, entity["id"]) in seen:
+                    continue
+                if len(matched[entity_type]) < limits[entity_type]:
+                    seen.add((entity_type, entity["id"]))
+                    matched[entity_type].append(entity)
+                if all(len(matched[t]) >= limits[t] for t in matched):
+                    break
+        finally:
+            stream.close()
+
+    log_token_usage("search", messages, usage)
+    return matched
+
 def format_entities_for_frontend(entities: List[dict], entity_type: str) -> List[dict]:
     """
     Formats the entities into a structure suitable for frontend card rendering.
@@ -327,7 +876,7 @@ def format_community_response(communities: List[dict], query: str) -> dict:
         "communities": formatted_communities
     }
 
-def format_user_response(user: dict, include_related: bool = False) -> dict:
+def format_user_response(user: Mapping, include_related: bool = False) -> dict:
     """Format user response with optional related data."""
     response = {
         "id": user["id"],
@@ -341,10 +890,9 @@ def format_user_response(user: dict, include_related: bool = False) -> dict:
     
     if include_related:
         # Get related communities based on user's interests
-        related_communities = [
-            c for c in COMMUNITIES 
-            if any(interest in c["interests"] for interest in user["interests"])
-        ][:5]
+        store = STORES["community"]
+        rows = [store.rows_where("interests", interest) for interest in user["interests"]]
+        related_communities = store.rows(np.unique(np.concatenate(rows))[:5]) if rows else []
         
         response["related_communities"] = [
             {
@@ -359,40 +907,690 @@ def format_user_response(user: dict, include_related: bool = False) -> dict:
     
     return response
 
+# Columnar stores holding every entity. Each entity list (EVENTS, USERS, COMMUNITIES) is then
+# refilled with lazy row views over its store, so the per-record dicts are freed and the
+# indexes, name lookups, engines and endpoints all read the columns
+ENTITY_TYPES = ("event", "user", "community")
+ENTITY_SCHEMAS = {
+    "event": {
+        "id": INT, "name": TEXT, "location": STR, "type": STR, "date": DATE, "time": STR,
+        "description": TEXT, "image_url": TEXT,
+    },
+    "user": {"id": INT, "username": TEXT, "email": TEXT, "interests": STR_LIST, "community_ids": INT_LIST},
+    "community": {"id": INT, "name": TEXT, "description": TEXT, "interests": STR_LIST},
+}
+STORES = {
+    entity_type: ColumnStore(entity_type, get_dataset(entity_type), ENTITY_SCHEMAS[entity_type])
+    for entity_type in ENTITY_TYPES
+}
+for entity_type, store in STORES.items():
+    get_dataset(entity_type)[:] = store.page(0, len(store))
+
+# Worker processes each entity index is partitioned across (0 or 1 searches in-process)
+RETRIEVAL_SHARDS = int(os.getenv("RETRIEVAL_SHARDS", "0"))
+# How rows are assigned to shards: "range" (contiguous id ranges) or "hash" (blocks spread modulo the shard count)
+RETRIEVAL_SHARD_MODE = os.getenv("RETRIEVAL_SHARD_MODE", "range")
+# Queries each sharded index can have in flight at once (every shard serves this many connections)
+RETRIEVAL_SHARD_LANES = int(os.getenv("RETRIEVAL_SHARD_LANES", "4"))
+
+def build_index(entity_type: str) -> EntityIndex:
+    """
+    Builds the embedding index for an entity type from its dataset, or maps
+    the shared prebuilt one when SHARED_INDEX_DIR is set. With
+    RETRIEVAL_SHARDS > 1 the index is searched by that many shard processes
+    (which map the shared file directly).
+    """
+    dataset = get_dataset(entity_type)
+    if SHARED_INDEX_DIR:
+        index = EntityIndex.load(entity_type, dataset, SHARED_INDEX_DIR)
+    else:
+        index = EntityIndex.build(entity_type, dataset, entity_texts(dataset, entity_type), model)
+    if RETRIEVAL_SHARDS > 1 and not SHARED_INDEX_BUILDER and len(index) and index.embeddings.shape[1]:
+        return ShardedIndex(index, RETRIEVAL_SHARDS, RETRIEVAL_SHARD_MODE, RETRIEVAL_SHARD_LANES)
+    return index
+
+# Precomputed entity indexes
+with READINESS.component("indexes"):
+    INDEXES = {entity_type: build_index(entity_type) for entity_type in ENTITY_TYPES}
+
+# Normalized-name and trigram lookups for names in LLM responses
+NAME_MATCH_THRESHOLD = float(os.getenv("NAME_MATCH_THRESHOLD", "0.5"))
+NAME_RESOLVERS = serving_only(lambda: {
+    entity_type: NameResolver(
+        entity_type, get_dataset(entity_type), "username" if entity_type == "user" else "name", NAME_MATCH_THRESHOLD
+    )
+    for entity_type in ENTITY_TYPES
+})
+
+# Day-of-week and minute-of-day columns parsed from the free-text event date and time
+EVENT_TIMES = serving_only(lambda: TimeIndex(EVENTS))
+
+def event_payload(event: Mapping) -> dict:
+    """
+    The /events representation of an event, with its derived day.
+    """
+    return {**event, "day": get_day_from_date(event["date"])}
+
+# Pre-serialized /events payloads, one JSON fragment per field, for fields= projections
+EVENT_FIELDS = tuple(ENTITY_SCHEMAS["event"]) + ("day",)
+EVENT_PAYLOADS = serving_only(lambda: PayloadCache(EVENT_FIELDS, event_payload, STORES["event"].page(0, len(STORES["event"]))))
+
+# Largest /events page, and the larger one allowed when the response is compressed
+EVENTS_MAX_LIMIT = int(os.getenv("EVENTS_MAX_LIMIT", "100"))
+EVENTS_MAX_COMPRESSED_LIMIT = int(os.getenv("EVENTS_MAX_COMPRESSED_LIMIT", "1000"))
+# Responses smaller than this are sent uncompressed; gzip level and brotli quality otherwise
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+def event_projection(fields: Optional[str]) -> Tuple[int, ...]:
+    """
+    Payload fragment positions for a comma-separated fields= value, or a 400.
+    """
+    try:
+        return EVENT_PAYLOADS.projection([f.strip() for f in fields.split(",") if f.strip()] if fields else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{str(e)}; available fields: {', '.join(EVENT_FIELDS)}")
+
+def json_body_response(body: bytes, encoding: Optional[str]) -> Response:
+    """
+    A pre-serialized JSON body, compressed with the negotiated encoding when large enough.
+    """
+    body, headers = encode_body(body, encoding, COMPRESSION_MIN_BYTES, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def require_single_worker():
+    """
+    Rejects a write with a 409 when several workers serve the app.
+    """
+    if SERVE_WORKERS > 1:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Writes are disabled while {SERVE_WORKERS} workers each serve their own copy of the data; run a single worker to update data",
+        )
+
+def request_user_id(data: dict) -> Optional[int]:
+    """
+    The optional user_id of a JSON body as an int (numeric strings such as
+    "1" included), or a 422.
+    """
+    value = data.get("user_id")
+    if value is None or (isinstance(value, int) and not isinstance(value, bool)):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            pass
+    raise HTTPException(status_code=422, detail="user_id must be an integer")
+
+def find_row(entity_type: str, entity_id: int, detail: str):
+    """
+    Row view of an entity by id, or a 404.
+    """
+    row = STORES[entity_type].row_of(entity_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail=detail)
+    return STORES[entity_type].row(row)
+
+def event_day(event: dict) -> str:
+    """
+    The event's day of the week, whether its date is YYYY-MM-DD or already a day name.
+    """
+    return get_day_from_date(event["date"]) or event["date"]
+
+# Facet bitmaps for result counts and filters
+def build_event_facets() -> FacetIndex:
+    return FacetIndex(EVENTS, {
+        "type": lambda e: [e["type"]],
+        "location": lambda e: [e["location"]],
+        "day": lambda e: [event_day(e)],
+    })
+
+def build_community_facets() -> FacetIndex:
+    return FacetIndex(COMMUNITIES, {"interest": lambda c: c["interests"]})
+
+EVENT_FACETS = serving_only(build_event_facets)
+COMMUNITY_FACETS = serving_only(build_community_facets)
+
+def result_facets(facets: FacetIndex, entities: List[dict]) -> dict:
+    """
+    Facet counts for a result set.
+    """
+    return facets.counts(facets.from_ids(e["id"] for e in entities))
+
+def autocomplete_terms() -> Iterator[Tuple[str, str]]:
+    """
+    Every (kind, text) typeahead term, once per entity carrying it.
+    """
+    for entity_type in ENTITY_TYPES:
+        yield from entity_terms(entity_type, get_dataset(entity_type))
+
+def entity_terms(entity_type: str, entities: List[dict]) -> Iterator[Tuple[str, str]]:
+    """
+    The (kind, text) typeahead terms of some entities of one type.
+    """
+    for e in entities:
+        if entity_type == "event":
+            yield "event", e["name"]
+            yield "location", e["location"]
+            yield "type", e["type"]
+        elif entity_type == "community":
+            yield "community", e["name"]
+            yield from (("interest", i) for i in e["interests"])
+        elif entity_type == "user":
+            yield "user", e["username"]
+            yield from (("interest", i) for i in e["interests"])
+
+# Prefix index for /autocomplete
+AUTOCOMPLETE = serving_only(lambda: PrefixIndex.build(autocomplete_terms()))
+
+# Precomputed user profile vectors for personalized ranking
+with READINESS.component("user_profiles"):
+    if SHARED_INDEX_DIR:
+        USER_PROFILES = EntityIndex.load("profile", USERS, SHARED_INDEX_DIR)
+    else:
+        USER_PROFILES = build_user_profiles(USERS, INDEXES["community"], model)
+USER_PROFILE_ROWS = {u["id"]: row for row, u in enumerate(USERS)}
+
+# Precomputed similar-user lists
+NEIGHBOR_K = int(os.getenv("NEIGHBOR_K", "20"))
+NEIGHBOR_INTEREST_WEIGHT = float(os.getenv("NEIGHBOR_INTEREST_WEIGHT", "0.5"))
+NEIGHBORS = NeighborEngine(list(USERS), USER_PROFILES, k=NEIGHBOR_K, interest_weight=NEIGHBOR_INTEREST_WEIGHT)
+with READINESS.component("neighbors"):
+    if SHARED_INDEX_DIR:
+        NEIGHBORS.neighbors = load_shared_table("neighbors", len(USERS), NEIGHBOR_K)
+        NEIGHBORS.scores = load_shared_table("neighbor_scores", len(USERS), NEIGHBOR_K)
+    else:
+        NEIGHBORS.build()
+
+# Precomputed community recommendations for every user
+RECOMMENDATIONS_K = int(os.getenv("RECOMMENDATIONS_K", "10"))
+RECOMMENDER = CommunityRecommender(list(USERS), USER_PROFILES, INDEXES["community"], k=RECOMMENDATIONS_K)
+with READINESS.component("recommendations"):
+    if SHARED_INDEX_DIR:
+        RECOMMENDER.recommendations = load_shared_table("recommendations", len(USERS), RECOMMENDATIONS_K)
+        RECOMMENDER.scores = load_shared_table("recommendation_scores", len(USERS), RECOMMENDATIONS_K)
+    else:
+        RECOMMENDER.build()
+PROFILE_UPDATE_LOCK = threading.Lock()
+# Sequence number of every user's last interest update (under PROFILE_UPDATE_LOCK), so structures
+# rebuilt in the background from an older snapshot can replay the updates they missed
+USER_UPDATES = 0
+USER_UPDATED_AT: Dict[int, int] = {}
+# USER_UPDATES at the last snapshot of each background job
+SNAPSHOT_UPDATES: Dict[str, int] = {}
+
+def update_user_interests(user: dict, interests: List[str]):
+    """
+    Applies new interests to a user and refreshes every structure derived
+    from them: the user index row, the profile vector, the neighbor lists,
+    the community recommendations, the autocomplete terms and the user store.
+    Both vectors are computed before anything changes, so an update that
+    fails leaves every structure as it was.
+    """
+    updated = {**user, "interests": interests}
+    with PROFILE_UPDATE_LOCK:
+        row = USER_PROFILE_ROWS[user["id"]]
+        user_vector = normalize_rows(np.asarray(
+            model.encode([convert_data_to_string([updated], "user")], convert_to_numpy=True)[0], dtype=np.float32
+        ))
+        dim = USER_PROFILES.embeddings.shape[1]
+        profile = user_profile_vector(updated, INDEXES["community"], model, dim) if dim else None
+
+        INDEXES["user"].set_row(row, user_vector)
+        if profile is not None:
+            USER_PROFILES.set_row(row, profile)
+        for interest in user["interests"]:
+            AUTOCOMPLETE.remove("interest", interest)
+        for interest in interests:
+            AUTOCOMPLETE.add("interest", interest)
+        record_user_update(user["id"])
+        STORES["user"].set_list(row, "interests", interests)
+        # Users imported since the last rebuild get their lists from the next background run
+        if user["id"] in NEIGHBORS.row_by_id:
+            NEIGHBORS.update_user(user["id"], interests)
+        if user["id"] in RECOMMENDER.row_by_id:
+            RECOMMENDER.update_user(user["id"])
+    SCHEDULER.notify("users")
+
+def record_user_update(user_id: int):
+    """
+    Marks a user's interests as changed; call under PROFILE_UPDATE_LOCK.
+    """
+    global USER_UPDATES
+    USER_UPDATES += 1
+    USER_UPDATED_AT[user_id] = USER_UPDATES
+
+def users_updated_since(since: int) -> Tuple[List[int], int]:
+    """
+    Ids of the users whose interests changed after update number since,
+    and the latest update number.
+    """
+    with PROFILE_UPDATE_LOCK:
+        return [user_id for user_id, at in USER_UPDATED_AT.items() if at > since], USER_UPDATES
+
+# Bulk import: lines validated per batch, and the encoder batch size for their embeddings
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1024"))
+BULK_EMBED_BATCH_SIZE = int(os.getenv("BULK_EMBED_BATCH_SIZE", "64"))
+BULK_IMPORT_LOCK = asyncio.Lock()
+
+def append_entities(entity_type: str, records: List[dict], embeddings: np.ndarray):
+    """
+    Appends a validated batch and its embeddings to the columnar store and to
+    every structure kept current per batch: the dataset's row views, the
+    index, the time columns of events, the name lookup, autocomplete and, for
+    users, the profile vectors. Only the store keeps the records' values.
+    """
+    with PROFILE_UPDATE_LOCK:
+        dataset = get_dataset(entity_type)
+        start = len(dataset)
+        if entity_type == "event":
+            # Payloads first: /events serves store rows only once the store's size is bumped
+            EVENT_PAYLOADS.append(event_payload(r) for r in records)
+        store = STORES[entity_type]
+        store.append(records)
+        rows = store.page(start, len(records))
+        dataset.extend(rows)
+        INDEXES[entity_type].append(rows, embeddings)
+        if entity_type == "event":
+            EVENT_TIMES.append(rows)
+        for row in rows:
+            NAME_RESOLVERS[entity_type].add(row)
+        AUTOCOMPLETE.add_many(entity_terms(entity_type, rows))
+        if entity_type == "user":
+            profiles = build_user_profiles(rows, INDEXES["community"], model).embeddings
+            if profiles.shape[1] != USER_PROFILES.embeddings.shape[1]:
+                profiles = np.zeros((len(rows), USER_PROFILES.embeddings.shape[1]), dtype=np.float32)
+            USER_PROFILES.append(rows, profiles)
+            USER_PROFILE_ROWS.update((r["id"], row) for row, r in enumerate(rows, start))
+
+def finish_import(entity_type: str):
+    """
+    Rebuilds the aggregate structures once an import is done: the facet
+    bitmaps here, the neighbor lists and recommendations in the background.
+    """
+    global EVENT_FACETS, COMMUNITY_FACETS
+    if entity_type == "event":
+        EVENT_FACETS = build_event_facets()
+    elif entity_type == "community":
+        COMMUNITY_FACETS = build_community_facets()
+    SCHEDULER.notify("import")
+
+# Background precomputation jobs
+
+def snapshot_users(job: str) -> Tuple[List[dict], EntityIndex]:
+    """
+    Copies the users and their profile vectors for a background rebuild by job.
+    """
+    with PROFILE_UPDATE_LOCK:
+        SNAPSHOT_UPDATES[job] = USER_UPDATES
+        users = [dict(u, interests=list(u["interests"]), community_ids=list(u["community_ids"])) for u in USERS]
+        return users, EntityIndex("profile", users, np.array(USER_PROFILES.embeddings))
+
+def refresh_neighbors(engine: NeighborEngine, user_ids: List[int]):
+    for user_id in user_ids:
+        if user_id in engine.row_by_id:
+            engine.update_user(user_id, engine.users[engine.row_by_id[user_id]]["interests"])
+
+def refresh_recommendations(recommender: CommunityRecommender, user_ids: List[int]):
+    for user_id in user_ids:
+        if user_id in recommender.row_by_id:
+            recommender.update_user(user_id)
+
+def prepare_neighbor_lists(result: Tuple[np.ndarray, np.ndarray]) -> Tuple[NeighborEngine, int]:
+    """
+    Builds the neighbor engine around freshly computed lists, on the job
+    thread pool, and replays the interest updates made since the snapshot
+    they were computed from. Returns the engine and the last replayed update.
+    """
+    engine = NeighborEngine(USERS[:len(result[0])], USER_PROFILES, k=NEIGHBOR_K, interest_weight=NEIGHBOR_INTEREST_WEIGHT)
+    engine.neighbors, engine.scores = result
+    updated, latest = users_updated_since(SNAPSHOT_UPDATES["neighbors"])
+    refresh_neighbors(engine, updated)
+    return engine, latest
+
+def apply_neighbor_lists(prepared: Tuple[NeighborEngine, int]):
+    """
+    Swaps in a prepared neighbor engine, first replaying any update made
+    while it was prepared (usually none). Runs on the job thread pool: the
+    replay and the swap share PROFILE_UPDATE_LOCK so no update is lost.
+    """
+    global NEIGHBORS
+    engine, latest = prepared
+    with PROFILE_UPDATE_LOCK:
+        refresh_neighbors(engine, [user_id for user_id, at in USER_UPDATED_AT.items() if at > latest])
+        NEIGHBORS = engine
+
+def prepare_recommendations(result: Tuple[np.ndarray, np.ndarray]) -> Tuple[CommunityRecommender, int]:
+    """
+    Builds the recommender around a freshly computed table, like prepare_neighbor_lists.
+    """
+    recommender = CommunityRecommender(USERS[:len(result[0])], USER_PROFILES, INDEXES["community"], k=RECOMMENDATIONS_K)
+    recommender.recommendations, recommender.scores = result
+    # So interest updates only score the one user
+    recommender.index_communities()
+    updated, latest = users_updated_since(SNAPSHOT_UPDATES["recommendations"])
+    refresh_recommendations(recommender, updated)
+    return recommender, latest
+
+def apply_recommendations(prepared: Tuple[CommunityRecommender, int]):
+    """
+    Swaps in a prepared recommender, like apply_neighbor_lists.
+    """
+    global RECOMMENDER
+    recommender, latest = prepared
+    with PROFILE_UPDATE_LOCK:
+        refresh_recommendations(recommender, [user_id for user_id, at in USER_UPDATED_AT.items() if at > latest])
+        RECOMMENDER = recommender
+
+def compact_indexes():
+    """
+    Replaces every entity index with a compacted copy and folds pending
+    list updates into the columnar stores. Copy and swap happen under
+    PROFILE_UPDATE_LOCK so no in-place update is lost.
+    """
+    with PROFILE_UPDATE_LOCK:
+        INDEXES.update({entity_type: index.compacted() for entity_type, index in INDEXES.items()})
+        for store in STORES.values():
+            store.compact()
+
+def warm_query_cache(limit: int) -> int:
+    """
+    Encodes the most frequent uncached queries in one batch and caches them.
+    """
+    queries = QUERY_CACHE.top_missing(limit)
+    if queries:
+        for query, vector in zip(queries, normalize_rows(np.asarray(model.encode(queries), dtype=np.float32))):
+            QUERY_CACHE.put(query, vector)
+    return len(queries)
+
+def parse_batch_sizes(value: str) -> List[int]:
+    """
+    Positive batch sizes of a comma-separated list; empty and invalid entries are skipped.
+    """
+    sizes = []
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        try:
+            size = int(item)
+        except ValueError:
+            logger.warning(f"Ignoring invalid warmup batch size {item.strip()!r}")
+            continue
+        if size > 0:
+            sizes.append(size)
+    return sizes
+
+# Batch sizes encoded once at start-up so the first real requests don't pay for lazy initialization (empty disables it)
+WARMUP_BATCH_SIZES = parse_batch_sizes(os.getenv("WARMUP_BATCH_SIZES", "1,8,32"))
+# Number of queries (event types, locations and interests) whose embeddings are cached at start-up
+QUERY_CACHE_PRIME_COUNT = int(os.getenv("QUERY_CACHE_PRIME_COUNT", "200"))
+
+def priming_queries(limit: int) -> List[str]:
+    """
+    The likeliest short queries: event types, locations and interests,
+    most common first.
+    """
+    counts = {}
+    for value in [e["type"] for e in EVENTS] + [e["location"] for e in EVENTS] + [
+        i for entity in USERS + COMMUNITIES for i in entity["interests"]
+    ]:
+        key = QueryCache.key(value)
+        if key:
+            counts[key] = counts.get(key, 0) + 1
+    return sorted(counts, key=lambda q: -counts[q])[:limit]
+
+def warm_up():
+    """
+    Readies the process for traffic: runs dummy batches through the encoder,
+    touches every index (paging in memory-mapped ones) and caches the
+    embeddings of the likeliest queries. Each step is timed by READINESS.
+    """
+    try:
+        with READINESS.component("encoder_warmup"):
+            vectors = None
+            for batch_size in WARMUP_BATCH_SIZES:
+                vectors = model.encode(["warmup query"] * batch_size, batch_size=batch_size)
+            if vectors is None:
+                # No warmup batches configured; the index warmup still needs a probe vector
+                vectors = model.encode(["warmup query"])
+            probe = normalize_rows(np.asarray(vectors, dtype=np.float32))[0]
+        with READINESS.component("index_warmup"):
+            for index in list(INDEXES.values()) + [USER_PROFILES]:
+                index.search(probe, 1)
+        with READINESS.component("query_cache"):
+            queries = priming_queries(QUERY_CACHE_PRIME_COUNT)
+            if queries:
+                for query, vector in zip(queries, normalize_rows(np.asarray(model.encode(queries), dtype=np.float32))):
+                    QUERY_CACHE.put(query, vector)
+    except Exception as e:
+        logger.error(f"Warmup failed: {str(e)}")
+
+BACKGROUND_JOBS = os.getenv("BACKGROUND_JOBS", "1") == "1"
+SCHEDULER = Scheduler(process_workers=int(os.getenv("BACKGROUND_PROCESS_WORKERS", "1")))
+# The rebuilds only matter where data can change: with several workers writes are rejected
+if SERVE_WORKERS == 1:
+    SCHEDULER.add(Job(
+        "neighbors",
+        compute_neighbor_lists,
+        snapshot=lambda: (*snapshot_users("neighbors"), NEIGHBOR_K, NEIGHBOR_INTEREST_WEIGHT),
+        prepare=prepare_neighbor_lists,
+        apply=apply_neighbor_lists,
+        interval=float(os.getenv("NEIGHBORS_REFRESH_SECONDS", "3600")),
+        triggers=("import",),
+    ))
+    SCHEDULER.add(Job(
+        "recommendations",
+        compute_recommendations,
+        snapshot=lambda: (*snapshot_users("recommendations"), INDEXES["community"], RECOMMENDATIONS_K),
+        prepare=prepare_recommendations,
+        apply=apply_recommendations,
+        interval=float(os.getenv("RECOMMENDATIONS_REFRESH_SECONDS", "3600")),
+        triggers=("users", "import"),
+        debounce=30.0,
+    ))
+    SCHEDULER.add(Job(
+        "index_compaction",
+        compact_indexes,
+        interval=float(os.getenv("INDEX_COMPACTION_SECONDS", "21600")),
+        executor="thread",
+    ))
+SCHEDULER.add(Job(
+    "query_cache_warming",
+    warm_query_cache,
+    snapshot=lambda: (int(os.getenv("QUERY_CACHE_WARM_COUNT", "100")),),
+    interval=float(os.getenv("QUERY_CACHE_WARM_SECONDS", "300")),
+    executor="thread",
+))
+
+def complete_chat(messages: List[dict], max_tokens: Optional[int] = None) -> str:
+    """
+    Sends chat messages to the LLM, holding an LLM_LIMITER slot; the call
+    is hedged and retried by LLM_CHAT_CALLER.
+    """
+    with LLM_LIMITER.slot():
+        chat_completion = LLM_CHAT_CALLER.call(lambda: client.chat.completions.create(
+            messages=messages,
+            model="llama-3.3-70b-versatile",  # Replace with your actual model name
+            max_tokens=max_tokens,
+            stream=False,
+        ))
+    return chat_completion.choices[0].message.content.strip()
+
+def summarize_turns(previous_summary: str, turns: List[dict]) -> str:
+    """
+    Folds conversation turns into the rolling summary of a chat session.
+    """
+    transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+    prompt = (
+        f"Current summary:\n{previous_summary or '(none)'}\n\n"
+        f"New conversation turns:\n{transcript}\n\n"
+        f"Write the updated summary in under {CHAT_SUMMARY_MAX_TOKENS * 3 // 4} words."
+    )
+    return complete_chat(
+        [
+            {
+                "role": "system",
+                "content": "You summarize conversations concisely, keeping facts, user preferences and open questions."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        max_tokens=CHAT_SUMMARY_MAX_TOKENS,
+    )
+
+def chat_turn(session: ChatSession, user_message: str) -> str:
+    """
+    Runs one /chat turn within a session: the prompt is the rolling summary
+    plus the recent turns that fit CHAT_CONTEXT_TOKEN_BUDGET, so its size
+    stays roughly constant however long the conversation runs.
+    """
+    with session.lock:
+        session.add("user", user_message)
+        messages = session.context(CHAT_CONTEXT_TOKEN_BUDGET, summarize_turns, CHAT_MAX_UNSUMMARIZED_TOKENS)
+        CHAT_PROMPT_TOKENS.observe(sum(estimate_tokens(m["content"]) for m in messages))
+        try:
+            reply = complete_chat(messages)
+        except Exception:
+            session.turns.pop()
+            raise
+        session.add("assistant", reply)
+        return reply
+
+# Match response bodies, shared by the JSON and the progressive (streamed) variants
+
+def chatbot_response(events: List[dict], degraded: bool) -> dict:
+    if not events:
+        return {
+            "response": "I couldn't find any events matching your criteria. Would you like to try a different search?",
+            "events": [],
+            "facets": result_facets(EVENT_FACETS, []),
+            "degraded": degraded
+        }
+    return {
+        "response": f"Here are the events that suit's you according to your preferences: {', '.join([e['name'] for e in events])}",
+        "events": format_entities_for_frontend(events, "event"),
+        "facets": result_facets(EVENT_FACETS, events),
+        "degraded": degraded
+    }
+
+def match_users_response(users: List[dict], degraded: bool) -> dict:
+    if not users:
+        return {
+            "response": "I couldn't find any users matching your criteria. Would you like to try a different search?",
+            "users": [],
+            "degraded": degraded
+        }
+    return {
+        "response": f"Here are the users that match your query: {', '.join([u['username'] for u in users])}",
+        "users": format_entities_for_frontend(users, "user"),
+        "degraded": degraded
+    }
+
+def users_match_response(users: List[dict], degraded: bool, user_id: Optional[int] = None) -> dict:
+    # Remove current user if user_id provided
+    if user_id:
+        users = [u for u in users if u["id"] != user_id]
+    return {
+        "users": [format_user_response(u) for u in users[:10]],
+        "total": len(users),
+        "message": f"Found {len(users)} users matching your interests",
+        "degraded": degraded
+    }
+
+def match_communities_response(communities: List[dict], degraded: bool, query: str) -> dict:
+    response = format_community_response(communities, query)
+    response["facets"] = result_facets(COMMUNITY_FACETS, communities)
+    response["degraded"] = degraded
+    return response
+
+def stream_format(request: Request) -> Optional[str]:
+    """
+    "sse" or "ndjson" when the client asks for progressive results, with a
+    stream= query parameter or its Accept header; None for a single JSON body.
+    """
+    requested = request.query_params.get("stream")
+    if requested in ("sse", "ndjson"):
+        return requested
+    accept = request.headers.get("accept", "")
+    if "text/event-stream" in accept:
+        return "sse"
+    if "application/x-ndjson" in accept:
+        return "ndjson"
+    return None
+
+async def progressive_match(
+    query: str,
+    entity_type: str,
+    respond: Callable[[List[dict], bool], dict],
+    user_id: Optional[int] = None,
+) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Yields ("candidates", body) with the embedding-ranked matches as soon as
+    they are ranked, then ("results", body) once the LLM has reordered and
+    filtered them (or the candidates again, degraded, when it failed or
+    missed its deadline). If admission control sheds the LLM call, the
+    second event is ("error", {status_code, detail}) instead.
+    """
+    candidates = await run_in_threadpool(traced(rank_entities), query, entity_type, None, user_id)
+    yield "candidates", respond(candidates[:DEFAULT_TOP_N], True)
+    try:
+        matched, degraded = await run_in_threadpool(traced(refine_candidates), query, entity_type, candidates)
+    except Overloaded as e:
+        yield "error", {"status_code": e.status_code, "detail": e.detail}
+        return
+    yield "results", respond(matched, degraded)
+
+def progressive_response(events: AsyncIterator[Tuple[str, dict]], stream: str) -> StreamingResponse:
+    """
+    Streams (event, body) pairs as server-sent events or as NDJSON lines of
+    {"event": ..., "data": ...}, each sent as soon as it is produced.
+    """
+    def frame(event: str, payload: dict) -> str:
+        if stream == "sse":
+            return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        return json.dumps({"event": event, "data": payload}, ensure_ascii=False) + "\n"
+
+    async def body():
+        try:
+            async for event, payload in events:
+                yield frame(event, payload)
+        except Exception as e:
+            logger.error(f"Error in progressive match: {str(e)}")
+            yield frame("error", {"status_code": 500, "detail": "Internal server error."})
+
+    media_type = "text/event-stream" if stream == "sse" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # Existing Endpoints
 
 @app.post("/chatbot")
 async def chatbot_endpoint(request: Request):
     """
     Endpoint to handle event-related queries.
+    An optional user_id personalizes the ranking with that user's profile.
     """
     try:
         data = await request.json()
         query = data.get("query", "").strip()
+        user_id = request_user_id(data)
 
         if not query:
             raise HTTPException(status_code=400, detail="Query cannot be empty")
 
         entity_type = "event"
 
-        # Get matched events using LLM
-        matched_events = get_entities_from_groq(query, entity_type)
-
-        if not matched_events:
-            return JSONResponse({
-                "response": "I couldn't find any events matching your criteria. Would you like to try a different search?",
-                "events": []
-            })
+        stream = stream_format(request)
+        if stream:
+            return progressive_response(progressive_match(query, entity_type, chatbot_response, user_id=user_id), stream)
 
-        # Format events for frontend
-        formatted_events = format_entities_for_frontend(matched_events, entity_type)
-
-        response = {
-            "response": f"Here are the events that suit's you according to your preferences: {', '.join([e['name'] for e in matched_events])}",
-            "events": formatted_events
-        }
+        # Get matched events using LLM
+        matched_events, degraded = await run_in_threadpool(traced(match_entities), query, entity_type, user_id=user_id)
 
-        return JSONResponse(response)
+        return JSONResponse(chatbot_response(matched_events, degraded))
 
     except HTTPException as he:
         raise he
@@ -404,6 +1602,8 @@ async def chatbot_endpoint(request: Request):
 async def chat_endpoint(request: Request):
     """
     General chat endpoint for other interactions.
+    Conversations are kept server-side: pass back the returned session_id to
+    continue one. Unknown or expired session ids start a new session.
     """
     try:
         data = await request.json()
@@ -412,40 +1612,132 @@ async def chat_endpoint(request: Request):
         if not user_message:
             raise HTTPException(status_code=400, detail="Message cannot be empty")
 
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": user_message,
-                }
-            ],
-            model="llama-3.3-70b-versatile",  # Replace with your actual model name
-            stream=False,
-        )
-        response_content = chat_completion.choices[0].message.content.strip()
+        session = CHAT_SESSIONS.get_or_create(data.get("session_id"))
+        response_content = await run_in_threadpool(chat_turn, session, user_message)
 
-        return JSONResponse({"response": response_content})
+        return JSONResponse({"response": response_content, "session_id": session.id})
 
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"Error in chat_endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error.")
 
+@app.post("/search")
+async def search_endpoint(request: Request):
+    """
+    Searches events, users and communities for one query.
+    The query is encoded once and scored against the three indexes
+    concurrently; a single LLM call then ranks the combined candidates
+    (unless "rerank" is false). Body: query, optional per-type "limits"
+    (e.g. {"event": 5, "user": 0}), user_id and rerank.
+    """
+    try:
+        data = await request.json()
+        query = data.get("query", "").strip()
+        if not query:
+            raise HTTPException(status_code=400, detail="Query cannot be empty")
+
+        try:
+            requested = data.get("limits") or {}
+            limits = {t: int(requested.get(t, SEARCH_DEFAULT_LIMIT)) for t in ENTITY_TYPES}
+        except (AttributeError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Limits must map entity types to integers")
+        if any(n < 0 for n in limits.values()):
+            raise HTTPException(status_code=400, detail="Limits cannot be negative")
+        types = [t for t in ENTITY_TYPES if limits[t] > 0]
+
+        vector = await run_in_threadpool(query_vector, query, request_user_id(data))
+        ranked = await asyncio.gather(
+            *(run_in_threadpool(search_candidates, t, query, vector, max(LLM_CANDIDATES, limits[t])) for t in types)
+        )
+        candidates = {t: [entity for entity, _ in hits] for t, hits in zip(types, ranked)}
+        results = {t: entities[:limits[t]] for t, entities in candidates.items()}
+
+        degraded = False
+        if data.get("rerank", True) and any(candidates.values()):
+            reranked, reason = await run_in_threadpool(
+                run_with_deadline, "search", LLM_DEADLINE_SECONDS, search_with_llm, query, candidates, limits
+            )
+            if reason is None:
+                results = reranked
+            else:
+                degraded = True
+
+        return JSONResponse({
+            "query": query,
+            "events": format_entities_for_frontend(results.get("event", []), "event"),
+            "users": format_entities_for_frontend(results.get("user", []), "user"),
+            "communities": format_entities_for_frontend(results.get("community", []), "community"),
+            "degraded": degraded
+        })
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error in search_endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error.")
+
+@app.get("/autocomplete")
+async def autocomplete(q: str, limit: int = 8, kinds: Optional[str] = None):
+    """
+    Typeahead completions for event names, locations and types, community
+    names, usernames and interests, most common first. kinds is an optional
+    comma-separated subset of: event, location, type, community, user, interest.
+    """
+    selected = [k.strip() for k in kinds.split(",") if k.strip()] if kinds else None
+    return {"query": q, "completions": AUTOCOMPLETE.complete(q, limit=limit, kinds=selected)}
+
 @app.get("/events", response_model=List[Event])
-async def get_events(skip: int = 0, limit: int = 100):
+async def get_events(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    type: Optional[List[str]] = Query(None),
+    location: Optional[List[str]] = Query(None),
+    day: Optional[List[str]] = Query(None),
+    fields: Optional[str] = None,
+):
+    """
+    Retrieve a paginated list of events, optionally filtered by type, location
+    and day (repeat a parameter to match any of several values). fields=
+    (comma-separated) returns only those keys. Pages hold up to
+    EVENTS_MAX_LIMIT events, or EVENTS_MAX_COMPRESSED_LIMIT when the client
+    accepts a compressed response.
     """
-    Retrieve a paginated list of events.
+    positions = event_projection(fields)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    limit = min(limit, EVENTS_MAX_COMPRESSED_LIMIT if encoding else EVENTS_MAX_LIMIT)
+    skip = max(skip, 0)
+    if type or location or day:
+        rows = EVENT_FACETS.rows(EVENT_FACETS.filter({"type": type, "location": location, "day": day}))
+        rows = rows[skip : skip + max(limit, 0)].tolist()
+    else:
+        rows = range(skip, min(skip + max(limit, 0), len(STORES["event"])))
+    return json_body_response(EVENT_PAYLOADS.render_rows(rows, positions), encoding)
+
+@app.get("/events/facets")
+async def get_event_facets(
+    type: Optional[List[str]] = Query(None),
+    location: Optional[List[str]] = Query(None),
+    day: Optional[List[str]] = Query(None),
+):
     """
-    return [Event(**e, day=get_day_from_date(e["date"])) for e in EVENTS[skip : skip + limit]]
+    Event counts by type, location and day for the events matching the
+    same filters as /events.
+    """
+    bitmap = EVENT_FACETS.filter({"type": type, "location": location, "day": day})
+    return {"total": EVENT_FACETS.count(bitmap), "facets": EVENT_FACETS.counts(bitmap)}
 
 @app.get("/events/{event_id}", response_model=Event)
-async def get_event(event_id: int):
+async def get_event(event_id: int, request: Request, fields: Optional[str] = None):
     """
-    Retrieve a specific event by its ID.
+    Retrieve a specific event by its ID, optionally only some fields.
     """
-    event = next((e for e in EVENTS if e["id"] == event_id), None)
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-    return Event(**event, day=get_day_from_date(event["date"]))
+    positions = event_projection(fields)
+    row = find_row("event", event_id, "Event not found").row
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    return json_body_response(EVENT_PAYLOADS.render_row(row, positions), encoding)
 
 # New Endpoints for Users
 
@@ -454,24 +1746,70 @@ async def get_users_endpoint(skip: int = 0, limit: int = 100):
     """
     Retrieve a paginated list of users.
     """
-    return [User(**u) for u in USERS[skip : skip + limit]]
+    return JSONResponse([u.to_dict() for u in STORES["user"].page(skip, limit)])
 
 @app.get("/users/{user_id}", response_model=None)
 async def get_user_endpoint(user_id: int):
     """Get basic user profile."""
-    user = next((u for u in USERS if u["id"] == user_id), None)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return format_user_response(user)
+    return format_user_response(find_row("user", user_id, "User not found"))
 
 @app.get("/users/{user_id}/full")
 async def get_user_full_profile(user_id: int):
     """Get complete user profile including related data."""
-    user = next((u for u in USERS if u["id"] == user_id), None)
-    if not user:
+    return format_user_response(find_row("user", user_id, "User not found"), include_related=True)
+
+@app.get("/users/{user_id}/similar")
+async def get_similar_users(user_id: int, limit: int = 10):
+    """Get users with similar interests from the precomputed neighbor lists."""
+    interests = set(find_row("user", user_id, "User not found")["interests"])
+    similar = NEIGHBORS.similar(user_id, limit)
+    return {
+        "user_id": user_id,
+        "users": [
+            {
+                **format_user_response(u),
+                "similarity": round(score, 4),
+                "shared_interests": [i for i in u["interests"] if i in interests],
+            }
+            for u, score in similar
+        ],
+    }
+
+@app.get("/users/{user_id}/recommended-communities")
+async def get_recommended_communities(user_id: int, limit: int = 5):
+    """Get communities the user should join, from the precomputed recommendations."""
+    find_row("user", user_id, "User not found")
+    return {
+        "user_id": user_id,
+        "communities": [
+            {
+                "id": c["id"],
+                "name": c["name"],
+                "description": c.get("description", "No description available."),
+                "interests": c["interests"],
+                "score": round(score, 4),
+                "image_url": f"https://picsum.photos/400/200/?random={c['id']}",
+            }
+            for c, score in RECOMMENDER.recommend(user_id, limit)
+        ],
+    }
+
+@app.put("/users/{user_id}/interests")
+async def update_user_interests_endpoint(user_id: int, request: Request):
+    """Replace a user's interests and refresh their similar-user lists."""
+    require_single_worker()
+    row = USER_PROFILE_ROWS.get(user_id)
+    if row is None:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    return format_user_response(user, include_related=True)
+    user = USERS[row]
+
+    data = await request.json()
+    interests = data.get("interests")
+    if not isinstance(interests, list) or not all(isinstance(i, str) and i.strip() for i in interests):
+        raise HTTPException(status_code=400, detail="Interests must be a list of non-empty strings")
+
+    await run_in_threadpool(update_user_interests, user, [i.strip() for i in interests])
+    return format_user_response(user)
 
 @app.post("/match/users")
 async def match_users_endpoint(request: Request):
@@ -487,24 +1825,14 @@ async def match_users_endpoint(request: Request):
 
         entity_type = "user"
 
-        # Get matched users using LLM
-        matched_users = get_entities_from_groq(query, entity_type)
-
-        if not matched_users:
-            return JSONResponse({
-                "response": "I couldn't find any users matching your criteria. Would you like to try a different search?",
-                "users": []
-            })
-
-        # Format users for frontend
-        formatted_users = format_entities_for_frontend(matched_users, entity_type)
+        stream = stream_format(request)
+        if stream:
+            return progressive_response(progressive_match(query, entity_type, match_users_response), stream)
 
-        response = {
-            "response": f"Here are the users that match your query: {', '.join([u['username'] for u in matched_users])}",
-            "users": formatted_users
-        }
+        # Get matched users using LLM
+        matched_users, degraded = await run_in_threadpool(traced(match_entities), query, entity_type)
 
-        return JSONResponse(response)
+        return JSONResponse(match_users_response(matched_users, degraded))
 
     except HTTPException as he:
         raise he
@@ -518,29 +1846,23 @@ async def match_users(request: Request):
     try:
         data = await request.json()
         query = data.get("query", "").strip()
-        user_id = data.get("user_id")  # Optional: to exclude current user
+        user_id = request_user_id(data)  # Optional: to exclude current user
         
         if not query:
             raise HTTPException(status_code=400, detail="Query cannot be empty")
-        
+
+        respond = lambda users, degraded: users_match_response(users, degraded, user_id)
+        stream = stream_format(request)
+        if stream:
+            return progressive_response(progressive_match(query, "user", respond), stream)
+
         # Get matched users using LLM
-        matched_users = get_entities_from_groq(query, "user")
-        
-        # Remove current user if user_id provided
-        if user_id:
-            matched_users = [u for u in matched_users if u["id"] != user_id]
-        
-        # Format response
-        formatted_users = [format_user_response(u) for u in matched_users[:10]]
-        
-        response = {
-            "users": formatted_users,
-            "total": len(matched_users),
-            "message": f"Found {len(matched_users)} users matching your interests"
-        }
-        
-        return JSONResponse(response)
+        matched_users, degraded = await run_in_threadpool(traced(match_entities), query, "user")
+
+        return JSONResponse(respond(matched_users, degraded))
         
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"Error in match_users: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -552,17 +1874,14 @@ async def get_communities_endpoint(skip: int = 0, limit: int = 100):
     """
     Retrieve a paginated list of communities.
     """
-    return [Community(**c) for c in COMMUNITIES[skip : skip + limit]]
+    return JSONResponse([c.to_dict() for c in STORES["community"].page(skip, limit)])
 
 @app.get("/communities/{community_id}", response_model=Community)
 async def get_community_endpoint(community_id: int):
     """
     Retrieve a specific community by its ID.
     """
-    community = next((c for c in COMMUNITIES if c["id"] == community_id), None)
-    if not community:
-        raise HTTPException(status_code=404, detail="Community not found")
-    return Community(**community)
+    return JSONResponse(find_row("community", community_id, "Community not found").to_dict())
 
 @app.post("/match/communities")
 async def match_communities_endpoint(request: Request):
@@ -577,13 +1896,18 @@ async def match_communities_endpoint(request: Request):
                 "communities": []
             })
 
+        respond = lambda communities, degraded: match_communities_response(communities, degraded, query)
+        stream = stream_format(request)
+        if stream:
+            return progressive_response(progressive_match(query, "community", respond), stream)
+
         # Get matched communities using LLM
-        matched_communities = get_entities_from_groq(query, "community")
-        
-        # Format response for frontend
-        response = format_community_response(matched_communities, query)
-        return JSONResponse(response)
+        matched_communities, degraded = await run_in_threadpool(traced(match_entities), query, "community")
+
+        return JSONResponse(respond(matched_communities, degraded))
 
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"Error in match_communities_endpoint: {str(e)}")
         return JSONResponse(
@@ -597,6 +1921,142 @@ async def match_communities_endpoint(request: Request):
 
 # Optional: Health Check Endpoint
 
+@app.post("/bulk/{collection}")
+async def bulk_import(collection: str, request: Request):
+    """
+    Imports a JSONL body (one event, user or community per line) as a stream.
+    Lines are validated in batches; valid records are embedded and appended
+    to the indexes batch by batch. Returns counts, throughput and sample errors.
+    One import runs at a time.
+    """
+    entity_type = COLLECTIONS.get(collection)
+    if entity_type is None:
+        raise HTTPException(status_code=404, detail="Unknown collection")
+    require_single_worker()
+    if BULK_IMPORT_LOCK.locked():
+        raise HTTPException(status_code=409, detail="Another import is running")
+
+    async with BULK_IMPORT_LOCK:
+        importer = BulkImporter(
+            entity_type,
+            model,
+            lambda records, embeddings: append_entities(entity_type, records, embeddings),
+            lambda entity_id: entity_id in INDEXES[entity_type].by_id,
+            batch_size=BULK_BATCH_SIZE,
+            embed_batch_size=BULK_EMBED_BATCH_SIZE,
+        )
+        lines = LineSplitter()
+        try:
+            async for chunk in request.stream():
+                for line in lines.feed(chunk):
+                    batch = importer.add(line)
+                    if batch:
+                        await run_in_threadpool(importer.process, batch)
+            for line in lines.flush():
+                importer.add(line)
+            report = await run_in_threadpool(importer.finish)
+        finally:
+            if importer.report.imported:
+                await run_in_threadpool(finish_import, entity_type)
+    return report
+
+@app.get("/bulk/{collection}")
+async def bulk_export(collection: str):
+    """
+    Streams every event, user or community as JSONL.
+    """
+    entity_type = COLLECTIONS.get(collection)
+    if entity_type is None:
+        raise HTTPException(status_code=404, detail="Unknown collection")
+    store = STORES[entity_type]
+    records = (store.row(row).to_dict() for row in range(len(store)))
+    return StreamingResponse(iter_jsonl(records), media_type="application/x-ndjson")
+
 @app.get("/health")
 async def health_check():
     return {"status": "API is running smoothly!"}
+
+@app.get("/health/live")
+async def liveness_check():
+    """
+    Liveness probe: the process is up and serving requests.
+    """
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """
+    Readiness probe: 200 once the encoder is warmed, the indexes are built and
+    the caches are primed, 503 until then. Reports per-component timings.
+    """
+    report = READINESS.report()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
+@app.get("/jobs")
+async def get_jobs():
+    """
+    Status of the background precomputation jobs.
+    """
+    return {"jobs": SCHEDULER.status()}
+
+@app.post("/jobs/{name}/run")
+async def run_job(name: str, request: Request):
+    """
+    Run a background job now and return its status.
+    """
+    if not JOBS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("x-jobs-token", ""), JOBS_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if name not in SCHEDULER.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return await SCHEDULER.run(name)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    Expose service metrics in the Prometheus text format.
+    """
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile")
+async def debug_profile(
+    request: Request,
+    seconds: float = Query(10, gt=0),
+    mode: str = "sample",
+    path: Optional[str] = None,
+):
+    """
+    Profile this worker. mode=sample samples the stacks of every thread for
+    seconds and returns collapsed stacks for flamegraph tools; mode=request
+    waits up to seconds for the next /chatbot or match request (or one to
+    path) and returns its cProfile statistics.
+    """
+    if not DEBUG_PROFILE_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("x-debug-token", ""), DEBUG_PROFILE_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+    if mode not in ("sample", "request"):
+        raise HTTPException(status_code=400, detail="mode must be sample or request")
+    if seconds > DEBUG_PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be at most {DEBUG_PROFILE_MAX_SECONDS:g}")
+    if path is not None and path not in PROFILED_PATHS:
+        raise HTTPException(status_code=400, detail=f"path must be one of {', '.join(PROFILED_PATHS)}")
+    if DEBUG_PROFILE_LOCK.locked():
+        raise HTTPException(status_code=409, detail="Another profile is running")
+
+    async with DEBUG_PROFILE_LOCK:
+        if mode == "sample":
+            counts = await run_in_threadpool(sample_stacks, seconds, DEBUG_PROFILE_INTERVAL_MS / 1000)
+            return PlainTextResponse(format_collapsed(counts))
+
+        done = REQUEST_PROFILER.arm([path] if path else None)
+        try:
+            await asyncio.wait({done}, timeout=seconds)
+            if not done.done() and REQUEST_PROFILER.armed:
+                raise HTTPException(status_code=408, detail=f"No request to trace arrived within {seconds:g}s")
+            # A request was claimed in time; wait for it to finish
+            trace = await done
+        finally:
+            REQUEST_PROFILER.disarm()
+        return PlainTextResponse(trace.report())
@@ -0,0 +1,267 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from typing import Callable, Iterator, Optional, TypeVar
+
+import numpy as np
+
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+HEDGES = Counter("llm_hedges_total", "Hedged LLM attempts by outcome", ["caller", "result"])
+RETRIES = Counter("llm_retries_total", "LLM calls retried after a transient error", ["caller"])
+
+
+class LatencyTracker:
+    """
+    Latencies of the most recent attempts, for percentile-based hedge delays.
+    """
+
+    def __init__(self, window: int = 512, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        The q-th percentile of the window, or None until min_samples are recorded.
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            samples = list(self._samples)
+        return float(np.percentile(samples, q))
+
+
+class HedgeBudget:
+    """
+    Global cap on hedges: every call earns ratio tokens (up to burst) and a
+    hedge spends one, so hedges stay below ratio of all calls however slow
+    the upstream gets.
+    """
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.ratio <= 0 or self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class PeekedStream:
+    """
+    A streamed completion whose first chunk has already been read.
+    """
+
+    def __init__(self, stream, iterator: Iterator, first):
+        self._stream = stream
+        self._iterator = iterator
+        self._first = first
+
+    def __iter__(self):
+        if self._first is not None:
+            first, self._first = self._first, None
+            yield first
+        yield from self._iterator
+
+    def close(self):
+        self._stream.close()
+
+
+def peek_stream(start: Callable[[], object]) -> Callable[[], PeekedStream]:
+    """
+    Turns a stream factory into an attempt that returns once the first chunk
+    has arrived, so hedging races on time to first token.
+    """
+    def attempt() -> PeekedStream:
+        stream = start()
+        iterator = iter(stream)
+        try:
+            first = next(iterator, None)
+        except BaseException:
+            stream.close()
+            raise
+        return PeekedStream(stream, iterator, first)
+    return attempt
+
+
+class HedgedCaller:
+    """
+    Runs upstream calls with hedging and bounded retries.
+
+    If an attempt has not returned after the hedge delay (the given
+    percentile of recent attempt latencies, default_delay until enough are
+    recorded), a duplicate is started when the shared HedgeBudget allows it;
+    the first attempt to succeed wins and the other is discarded as soon as
+    it returns. When every attempt failed with a transient error, the call is
+    retried up to max_retries times after a full-jitter exponential backoff.
+    A set cancel event stops hedging and retrying.
+
+    The caller is expected to hold one limiter slot for the whole call: it
+    covers the primary attempt (and the retries, which only start once every
+    earlier attempt has returned). A hedge takes a second slot without
+    waiting and is skipped when none is free; that slot is released once
+    both attempts have returned, so it covers whichever one lost. A
+    cancelled call waits for its running attempts before returning, so they
+    never outlive the caller's slot.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        executor: Executor,
+        budget: HedgeBudget,
+        is_transient: Callable[[BaseException], bool],
+        percentile: float = 95.0,
+        default_delay: float = 1.0,
+        min_delay: float = 0.05,
+        max_retries: int = 2,
+        backoff: float = 0.1,
+        backoff_cap: float = 1.0,
+        limiter=None,
+    ):
+        self.name = name
+        self.executor = executor
+        self.budget = budget
+        self.is_transient = is_transient
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self.limiter = limiter
+        self.latency = LatencyTracker()
+
+    def hedge_delay(self) -> float:
+        observed = self.latency.percentile(self.percentile)
+        return max(self.min_delay, self.default_delay if observed is None else observed)
+
+    def call(
+        self,
+        attempt: Callable[[], T],
+        cancel: Optional[threading.Event] = None,
+        discard: Callable[[T], None] = lambda result: None,
+    ) -> T:
+        """
+        Returns the result of the first successful attempt. discard is
+        applied to the results of the attempts that lost.
+        """
+        retries = 0
+        while True:
+            try:
+                return self._hedged(attempt, cancel, discard)
+            except Exception as e:
+                if not self.is_transient(e) or retries >= self.max_retries or (cancel is not None and cancel.is_set()):
+                    raise
+                delay = random.uniform(0, min(self.backoff_cap, self.backoff * 2 ** retries))
+                retries += 1
+                RETRIES.inc(caller=self.name)
+                logger.warning(f"Retrying {self.name} call in {delay:.2f}s after transient error: {str(e)}")
+                if cancel is not None and cancel.wait(delay):
+                    raise
+                if cancel is None:
+                    time.sleep(delay)
+
+    def _run(self, attempt: Callable[[], T]) -> T:
+        start = time.monotonic()
+        result = attempt()
+        self.latency.record(time.monotonic() - start)
+        return result
+
+    def _hedged(self, attempt: Callable[[], T], cancel: Optional[threading.Event], discard: Callable[[T], None]) -> T:
+        self.budget.earn()
+        hedge_at = time.monotonic() + self.hedge_delay()
+        primary = self.executor.submit(self._run, attempt)
+        pending = {primary}
+        hedge: Optional[Future] = None
+        hedge_due = True
+        error: Optional[BaseException] = None
+        while pending:
+            if hedge_due:
+                timeout = max(0.0, hedge_at - time.monotonic())
+            else:
+                timeout = None
+            if cancel is not None:
+                timeout = 0.05 if timeout is None else min(timeout, 0.05)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._discard_later(pending, discard)
+                    if hedge is not None:
+                        HEDGES.inc(caller=self.name, result="won" if future is hedge else "lost")
+                    return future.result()
+                error = future.exception()
+            if cancel is not None and cancel.is_set():
+                break
+            if hedge_due and pending and time.monotonic() >= hedge_at:
+                hedge_due = False
+                hedge = self._hedge(attempt, primary)
+                if hedge is not None:
+                    pending.add(hedge)
+        self._discard_later(pending, discard)
+        # Only reached when cancelled with attempts still running: keep the
+        # caller (and its limiter slot) until they have returned
+        wait(pending)
+        if error is None:
+            raise TimeoutError(f"{self.name} call cancelled")
+        raise error
+
+    def _hedge(self, attempt: Callable[[], T], primary: Future) -> Optional[Future]:
+        """
+        Starts a hedge of primary if a limiter slot is free and the budget
+        allows it; the slot is released once both attempts have returned.
+        """
+        if self.limiter is not None and not self.limiter.try_acquire():
+            HEDGES.inc(caller=self.name, result="no_slot")
+            return None
+        if not self.budget.try_spend():
+            if self.limiter is not None:
+                self.limiter.release()
+            HEDGES.inc(caller=self.name, result="over_budget")
+            return None
+        hedge = self.executor.submit(self._run, attempt)
+        HEDGES.inc(caller=self.name, result="fired")
+        if self.limiter is not None:
+            remaining = [2]
+            lock = threading.Lock()
+
+            def returned(_):
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    self.limiter.release()
+            primary.add_done_callback(returned)
+            hedge.add_done_callback(returned)
+        return hedge
+
+    @staticmethod
+    def _discard_later(futures, discard: Callable):
+        """
+        Cancels attempts that have not started and discards the results of
+        the others once they return.
+        """
+        for future in futures:
+            if not future.cancel():
+                future.add_done_callback(lambda f: f.exception() is None and discard(f.result()))
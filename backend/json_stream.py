@@ -0,0 +1,123 @@
+import json
+from typing import Any, Iterable, Iterator, List
+
+
+class JSONArrayStreamParser:
+    """
+    Incrementally parses the first top-level JSON array in a stream of text.
+
+    Text is fed in arbitrary pieces (e.g. LLM completion deltas). Each array
+    element is yielded as soon as it is complete: objects and nested arrays
+    on their closing bracket, scalars on the following ',' or ']'. Any text
+    before the array and after its closing bracket is ignored, and a '[' that
+    does not start a valid JSON array (e.g. "[note]" in prose) is skipped.
+    """
+
+    _VALUE_STARTS = set('{["-0123456789tfn')
+
+    def __init__(self):
+        self.done = False
+        self._reset()
+
+    def _reset(self):
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._element: List[str] = []
+        self._lookahead = False
+        self._valid = 0
+
+    def feed(self, text: str) -> List[Any]:
+        """
+        Consumes the next piece of text and returns the elements it completed.
+        """
+        elements = []
+        if self.done:
+            return elements
+
+        for ch in text:
+            if not self._in_array:
+                if ch == "[":
+                    self._in_array = True
+                    self._lookahead = True
+                continue
+
+            if self._lookahead:
+                # Decide whether this '[' really opens a JSON array.
+                if ch.isspace():
+                    continue
+                self._lookahead = False
+                if ch == "]":
+                    self.done = True
+                    return elements
+                if ch not in self._VALUE_STARTS:
+                    self._reset()
+                    if ch == "[":
+                        self._in_array = True
+                        self._lookahead = True
+                    continue
+
+            if self._in_string:
+                self._element.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if self._depth == 0 and ch in ",]":
+                if self._element and not self._emit(elements):
+                    continue
+                if ch == "]":
+                    self.done = True
+                    return elements
+                continue
+
+            if self._depth == 0 and not self._element and ch.isspace():
+                continue
+
+            self._element.append(ch)
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(elements)
+
+        return elements
+
+    def _emit(self, elements: List[Any]) -> bool:
+        """
+        Parses the buffered element. An invalid first element means the '['
+        was not the start of a JSON array, so scanning starts over.
+        """
+        raw = "".join(self._element).strip()
+        self._element = []
+        try:
+            elements.append(json.loads(raw))
+        except ValueError:
+            if self._valid == 0:
+                self._reset()
+                return False
+            return True
+        self._valid += 1
+        return True
+
+
+def iter_json_array(pieces: Iterable[str]) -> Iterator[Any]:
+    """
+    Yields elements of the first JSON array found across an iterable of text pieces.
+    Stops consuming the iterable once the array is closed.
+    """
+    parser = JSONArrayStreamParser()
+    for piece in pieces:
+        if not piece:
+            continue
+        yield from parser.feed(piece)
+        if parser.done:
+            return
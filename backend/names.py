@@ -0,0 +1,85 @@
+import re
+import unicodedata
+from collections import Counter as Tally
+from typing import Dict, List, Optional, Set, Tuple
+
+from metrics import Counter
+
+NAME_RESOLUTIONS = Counter(
+    "llm_name_resolutions_total", "LLM result items mapped back to entities", ["entity_type", "result"]
+)
+
+# Standalone years ("Chennai Music Festival 2024") are dropped when comparing names
+YEAR = re.compile(r"\b(19|20)\d{2}\b")
+NON_WORD = re.compile(r"[^\w\s]+")
+
+
+def normalize_name(name: str) -> str:
+    """
+    Case-, accent-, punctuation- and year-insensitive form of a name.
+    """
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode().casefold()
+    text = YEAR.sub(" ", NON_WORD.sub(" ", text.replace("&", " and ")))
+    return " ".join(text.split())
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameResolver:
+    """
+    Maps names produced by the LLM back to entities: an exact lookup on the
+    normalized name, then a fuzzy lookup through a character-trigram
+    inverted index, taking the entity whose trigram Jaccard similarity is
+    highest and at least threshold. Only entities sharing a trigram with the
+    name are scored, so a lookup never scans the whole dataset.
+    """
+
+    def __init__(self, entity_type: str, entities: List[dict], key: str, threshold: float = 0.5):
+        self.entity_type = entity_type
+        self.key = key
+        self.threshold = threshold
+        self.entities: List[dict] = []
+        self.exact: Dict[str, dict] = {}
+        self.postings: Dict[str, List[int]] = {}
+        self.sizes: List[int] = []
+        for entity in entities:
+            self.add(entity)
+
+    def add(self, entity: dict):
+        name = normalize_name(entity[self.key])
+        row = len(self.entities)
+        self.entities.append(entity)
+        self.exact.setdefault(name, entity)
+        grams = trigrams(name)
+        self.sizes.append(len(grams))
+        for gram in grams:
+            self.postings.setdefault(gram, []).append(row)
+
+    def fuzzy(self, name: str) -> Optional[Tuple[dict, float]]:
+        grams = trigrams(name)
+        shared = Tally(row for gram in grams for row in self.postings.get(gram, ()))
+        best, best_score = None, 0.0
+        for row, count in shared.items():
+            score = count / (len(grams) + self.sizes[row] - count)
+            if score > best_score:
+                best, best_score = row, score
+        if best is None or best_score < self.threshold:
+            return None
+        return self.entities[best], best_score
+
+    def resolve(self, name: str) -> Optional[dict]:
+        """
+        Returns the entity called name (or close to it), recording whether it
+        was an exact match, a fuzzy match or a miss.
+        """
+        normalized = normalize_name(name)
+        entity = self.exact.get(normalized)
+        if entity is not None:
+            NAME_RESOLUTIONS.inc(entity_type=self.entity_type, result="exact")
+            return entity
+        match = self.fuzzy(normalized) if normalized else None
+        NAME_RESOLUTIONS.inc(entity_type=self.entity_type, result="fuzzy" if match else "miss")
+        return match[0] if match else None
@@ -0,0 +1,162 @@
+import logging
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from retrieval import EntityIndex
+
+logger = logging.getLogger(__name__)
+
+
+class NeighborEngine:
+    """
+    Precomputed top-k similar users for every user.
+
+    Similarity blends interest overlap (Jaccard over a sparse user x interest
+    matrix) with the cosine of the users' profile vectors:
+
+        score = interest_weight * jaccard + (1 - interest_weight) * cosine
+
+    build() scores all pairs in row blocks of bounded size; update_user()
+    refreshes the lists affected by one user's new interests without a rebuild.
+    """
+
+    def __init__(self, users: List[dict], profiles: EntityIndex, k: int = 10, interest_weight: float = 0.5, block_bytes: int = 64 << 20):
+        self.users = users
+        self.profiles = profiles
+        self.k = k
+        self.interest_weight = interest_weight
+        self.block_bytes = block_bytes
+        self.row_by_id = {u["id"]: row for row, u in enumerate(users)}
+        self.columns: Dict[str, int] = {}
+
+        indptr = [0]
+        indices = []
+        for user in users:
+            indices.extend(self._column(interest) for interest in sorted(set(user["interests"])))
+            indptr.append(len(indices))
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int32)
+        self.neighbors = np.full((len(users), k), -1, dtype=np.int32)
+        self.scores = np.full((len(users), k), -np.inf, dtype=np.float32)
+
+    def _column(self, interest: str) -> int:
+        return self.columns.setdefault(interest, len(self.columns))
+
+    def _matrix(self) -> csr_matrix:
+        data = np.ones(len(self.indices), dtype=np.float32)
+        return csr_matrix((data, self.indices, self.indptr), shape=(len(self.users), max(len(self.columns), 1)))
+
+    def _score_rows(self, matrix: csr_matrix, start: int, stop: int) -> np.ndarray:
+        """
+        Similarity of users start..stop against all users, as a dense block.
+        """
+        sizes = np.diff(self.indptr).astype(np.float32)
+        overlap = (matrix[start:stop] @ matrix.T).toarray()
+        union = sizes[start:stop, None] + sizes[None, :] - overlap
+        jaccard = np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+        scores = self.interest_weight * jaccard
+        # Profiles appended since this engine was built (bulk imports) are not part of it
+        vectors = self.profiles.embeddings[:len(self.users)]
+        if vectors.shape[1]:
+            scores += (1.0 - self.interest_weight) * (vectors[start:stop] @ vectors.T)
+        scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        return scores
+
+    def _top_k(self, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(self.k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        return top, np.take_along_axis(scores, top, axis=1)
+
+    def build(self):
+        """
+        Computes every user's neighbor list, block by block.
+        """
+        count = len(self.users)
+        if count < 2:
+            return
+        matrix = self._matrix()
+        block = max(1, self.block_bytes // (4 * count))
+        k = min(self.k, count)
+        for start in range(0, count, block):
+            stop = min(start + block, count)
+            top, top_scores = self._top_k(self._score_rows(matrix, start, stop))
+            self.neighbors[start:stop, :k] = top
+            self.scores[start:stop, :k] = top_scores
+        logger.info(f"Built neighbor lists for {count} users in blocks of {block}")
+
+    def similar(self, user_id: int, limit: int = 10) -> List[Tuple[dict, float]]:
+        """
+        Returns up to limit (user, score) pairs from the precomputed list.
+        """
+        row = self.row_by_id.get(user_id)
+        if row is None:
+            return []
+        return [
+            (self.users[n], float(s))
+            for n, s in zip(self.neighbors[row][:limit], self.scores[row][:limit])
+            if n >= 0 and np.isfinite(s)
+        ]
+
+    def update_user(self, user_id: int, interests: Sequence[str]):
+        """
+        Replaces a user's interests (their profile vector must already be
+        updated) and refreshes the neighbor lists incrementally: the user's own
+        list, every list that gains the user, and every list whose score for
+        the user dropped (those are recomputed in full).
+        """
+        row = self.row_by_id[user_id]
+        columns = np.array([self._column(i) for i in sorted(set(interests))], dtype=np.int32)
+        start, stop = self.indptr[row], self.indptr[row + 1]
+        self.indices = np.concatenate([self.indices[:start], columns, self.indices[stop:]])
+        self.indptr[row + 1:] += len(columns) - (stop - start)
+
+        matrix = self._matrix()
+        scores = self._score_rows(matrix, row, row + 1)
+        top, top_scores = self._top_k(scores)
+        k = top.shape[1]
+        self.neighbors[row, :k] = top[0]
+        self.scores[row, :k] = top_scores[0]
+
+        # Symmetric similarity: score of the changed user in everyone else's list
+        column = scores[0]
+        contains = (self.neighbors == row).any(axis=1)
+        position = np.argmax(self.neighbors == row, axis=1)
+        old = self.scores[np.arange(len(self.users)), position]
+        dropped = contains & (column < old)
+        raised = contains & ~dropped
+        gained = ~contains & (column > self.scores[:, -1])
+        gained[row] = False
+
+        for other in np.flatnonzero(raised | gained):
+            if raised[other]:
+                self.scores[other, position[other]] = column[other]
+            else:
+                self.neighbors[other, -1] = row
+                self.scores[other, -1] = column[other]
+            order = np.argsort(-self.scores[other], kind="stable")
+            self.neighbors[other] = self.neighbors[other][order]
+            self.scores[other] = self.scores[other][order]
+
+        for other in np.flatnonzero(dropped):
+            top, top_scores = self._top_k(self._score_rows(matrix, other, other + 1))
+            self.neighbors[other, :k] = top[0]
+            self.scores[other, :k] = top_scores[0]
+
+        logger.info(
+            f"Refreshed neighbors for user {user_id}: {int(raised.sum() + gained.sum())} lists patched, "
+            f"{int(dropped.sum())} recomputed"
+        )
+
+
+def compute_neighbor_lists(users: List[dict], profiles: EntityIndex, k: int, interest_weight: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Builds all neighbor lists from a snapshot and returns (neighbors, scores).
+    Module-level so it can run in a process pool.
+    """
+    engine = NeighborEngine(users, profiles, k=k, interest_weight=interest_weight)
+    engine.build()
+    return engine.neighbors, engine.scores
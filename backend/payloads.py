@@ -0,0 +1,69 @@
+import json
+import threading
+from typing import Callable, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+
+def encode_field(field: str, value) -> bytes:
+    """
+    One '"key":value' JSON member, serialized exactly as JSONResponse would.
+    """
+    return (
+        json.dumps(field) + ":" + json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    ).encode("utf-8")
+
+
+class PayloadCache:
+    """
+    Pre-serialized response payloads of a record list, one JSON fragment per
+    field and record. A response is assembled by joining the fragments of
+    its rows, so serialization is a byte join and a fields= projection
+    just joins fewer fragments. Rows follow the order of the records.
+    """
+
+    def __init__(self, fields: Sequence[str], render: Callable[[Mapping], dict], records: Iterable[Mapping] = ()):
+        self.fields = tuple(fields)
+        self.positions = {field: i for i, field in enumerate(self.fields)}
+        self.render = render
+        self.fragments: List[Tuple[bytes, ...]] = []
+        self._lock = threading.Lock()
+        self.append(records)
+
+    def __len__(self) -> int:
+        return len(self.fragments)
+
+    def append(self, records: Iterable[Mapping]):
+        """
+        Serializes records and adds them as the next rows.
+        """
+        encoded = []
+        for record in records:
+            payload = self.render(record)
+            encoded.append(tuple(encode_field(field, payload.get(field)) for field in self.fields))
+        with self._lock:
+            self.fragments.extend(encoded)
+
+    def projection(self, fields: Optional[Iterable[str]]) -> Tuple[int, ...]:
+        """
+        Fragment positions of the requested fields in canonical order (all
+        fields when none are given). Unknown fields raise ValueError.
+        """
+        if not fields:
+            return tuple(range(len(self.fields)))
+        wanted = set(fields)
+        unknown = wanted - set(self.fields)
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+        return tuple(i for i, field in enumerate(self.fields) if field in wanted)
+
+    def render_row(self, row: int, positions: Tuple[int, ...]) -> bytes:
+        fragments = self.fragments[row]
+        return b"{" + b",".join([fragments[i] for i in positions]) + b"}"
+
+    def render_rows(self, rows: Iterable[int], positions: Tuple[int, ...]) -> bytes:
+        """
+        JSON array of the projected payloads of rows.
+        """
+        fragments = self.fragments
+        return b"[" + b",".join([
+            b"{" + b",".join([fragments[row][i] for i in positions]) + b"}" for row in rows
+        ]) + b"]"
@@ -0,0 +1,59 @@
+from typing import List
+
+import numpy as np
+
+from retrieval import EntityIndex, normalize_rows
+
+
+def build_user_profiles(users: List[dict], community_index: EntityIndex, encoder, batch_size: int = 64) -> EntityIndex:
+    """
+    Precomputes a profile vector per user: the normalized sum of the mean
+    embedding of their interests and the mean embedding of their communities.
+    Each distinct interest string is encoded once.
+    """
+    vocabulary = sorted({interest for u in users for interest in u["interests"]})
+    if not users or not vocabulary:
+        return EntityIndex("profile", users, np.zeros((len(users), 0), dtype=np.float32))
+
+    interest_vectors = normalize_rows(
+        np.asarray(encoder.encode(vocabulary, batch_size=batch_size, convert_to_numpy=True), dtype=np.float32)
+    )
+    interest_rows = {interest: i for i, interest in enumerate(vocabulary)}
+    community_rows = {c["id"]: i for i, c in enumerate(community_index.entities)}
+
+    profiles = np.zeros((len(users), interest_vectors.shape[1]), dtype=np.float32)
+    for row, user in enumerate(users):
+        rows = [interest_rows[i] for i in user["interests"]]
+        if rows:
+            profiles[row] += normalize_rows(interest_vectors[rows].mean(axis=0))
+        rows = [community_rows[c] for c in user["community_ids"] if c in community_rows]
+        if rows:
+            profiles[row] += normalize_rows(community_index.embeddings[rows].mean(axis=0))
+
+    return EntityIndex("profile", users, normalize_rows(profiles))
+
+
+def user_profile_vector(user: dict, community_index: EntityIndex, encoder, dim: int) -> np.ndarray:
+    """
+    Computes one user's normalized profile vector of dim floats, e.g. after
+    their interests change, as build_user_profiles would.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    if user["interests"]:
+        interest_vectors = normalize_rows(
+            np.asarray(encoder.encode(list(user["interests"]), convert_to_numpy=True), dtype=np.float32)
+        )
+        vector += normalize_rows(interest_vectors.mean(axis=0))
+    community_rows = [i for i, c in enumerate(community_index.entities) if c["id"] in user["community_ids"]]
+    if community_rows:
+        vector += normalize_rows(community_index.embeddings[community_rows].mean(axis=0))
+    return normalize_rows(vector)
+
+
+def personalize(query_embedding: np.ndarray, profile: np.ndarray, weight: float) -> np.ndarray:
+    """
+    Blends a normalized query vector with a user's profile vector. Scoring
+    candidates against the blend is one matrix-vector product and equals
+    (1 - weight) * query score + weight * profile score.
+    """
+    return (1.0 - weight) * query_embedding + weight * profile
@@ -0,0 +1,176 @@
+"""
+On-demand profiling of a running worker.
+
+sample_stacks() samples the Python stack of every thread at a fixed interval
+and returns collapsed stacks ("thread;outer;...;inner count" lines), the
+input format of flamegraph.pl and speedscope. RequestProfiler traces a
+single request with cProfile: it is armed for a window, the next matching
+request claims it, and every piece of that request's work wrapped in
+traced() is profiled in the thread it runs on. Nothing samples or traces
+while no profile has been asked for.
+"""
+import asyncio
+import contextvars
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+# Trace of the request being handled in this context, if it is the traced one
+CURRENT_TRACE: contextvars.ContextVar[Optional["RequestTrace"]] = contextvars.ContextVar("current_trace", default=None)
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def collapse_stack(frame, thread_name: str) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name.replace(";", ":").replace(" ", "_"))
+    return ";".join(reversed(labels))
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> Dict[str, int]:
+    """
+    Samples every thread but the calling one for seconds and counts each
+    distinct collapsed stack.
+    """
+    own = threading.get_ident()
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident != own:
+                counts[collapse_stack(frame, names.get(ident, f"thread-{ident}"))] += 1
+        time.sleep(interval)
+    return dict(counts)
+
+
+def format_collapsed(counts: Dict[str, int]) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+
+class RequestTrace:
+    """
+    cProfile profiles of one request, one per stretch of work in a thread,
+    merged by report().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.started = time.perf_counter()
+        self.seconds: Optional[float] = None
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profiling(self):
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+
+    def report(self, sort: str = "cumulative", limit: int = 60) -> str:
+        out = io.StringIO()
+        out.write(f"Traced {self.path} in {self.seconds:.3f}s across {len(self._profiles)} profiled call(s)\n")
+        profiles = [p for p in self._profiles if p.getstats()]
+        if profiles:
+            stats = pstats.Stats(profiles[0], stream=out)
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+def traced(fn):
+    """
+    Returns fn, or a wrapper profiling it into the current request's trace
+    when this request is being traced. Wrap at the call site, in the
+    request's context: the wrapper can then run on any thread.
+    """
+    trace = CURRENT_TRACE.get()
+    if trace is None:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with trace.profiling():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+class RequestProfiler:
+    """
+    Hands a RequestTrace to the first request on one of paths after arm().
+    """
+
+    def __init__(self, paths: Iterable[str]):
+        self.paths = frozenset(paths)
+        self.armed = False
+        self._wanted: frozenset = self.paths
+        self._done: Optional[asyncio.Future] = None
+
+    def arm(self, paths: Optional[Iterable[str]] = None) -> asyncio.Future:
+        """
+        Arms the profiler; the returned future resolves to the finished trace.
+        """
+        self._wanted = frozenset(paths) if paths else self.paths
+        self._done = asyncio.get_running_loop().create_future()
+        self.armed = True
+        return self._done
+
+    def disarm(self):
+        self.armed = False
+        self._done = None
+
+    def claim(self, path: str) -> Optional[RequestTrace]:
+        if not self.armed or path not in self._wanted:
+            return None
+        self.armed = False
+        return RequestTrace(path)
+
+    def finish(self, trace: RequestTrace):
+        trace.seconds = time.perf_counter() - trace.started
+        if self._done is not None and not self._done.done():
+            self._done.set_result(trace)
+        self._done = None
+
+
+class ProfileMiddleware:
+    """
+    ASGI middleware that lets RequestProfiler trace a request. While the
+    profiler is not armed it only checks one attribute per request.
+    """
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if not self.profiler.armed or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trace = self.profiler.claim(scope["path"])
+        if trace is None:
+            return await self.app(scope, receive, send)
+        token = CURRENT_TRACE.set(trace)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            CURRENT_TRACE.reset(token)
+            self.profiler.finish(trace)
@@ -0,0 +1,55 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """
+    Tracks start-up components (model load, index builds, warmup, cache
+    priming) with their status and timings. The service is ready once every
+    required component has completed.
+    """
+
+    def __init__(self, required: Sequence[str]):
+        self.required = tuple(required)
+        self.started = time.time()
+        self._components: Dict[str, Dict[str, Any]] = {name: {"status": "pending", "seconds": None} for name in required}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def component(self, name: str):
+        """
+        Times a start-up step and records whether it completed or failed.
+        """
+        with self._lock:
+            self._components[name] = {"status": "running", "seconds": None}
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                self._components[name] = {"status": "failed", "seconds": round(time.perf_counter() - start, 4), "error": str(e)}
+            logger.error(f"Start-up component {name} failed: {str(e)}")
+            raise
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self._components[name] = {"status": "ready", "seconds": round(seconds, 4)}
+        logger.info(f"Start-up component {name} ready in {seconds:.3f}s")
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return all(self._components.get(name, {}).get("status") == "ready" for name in self.required)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            components = {name: dict(info) for name, info in self._components.items()}
+        return {
+            "ready": self.ready,
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "components": components,
+        }
@@ -0,0 +1,181 @@
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+
+from retrieval import EntityIndex
+
+logger = logging.getLogger(__name__)
+
+
+class CommunityRecommender:
+    """
+    Precomputed "communities you should join" for every user.
+
+    Each user is scored against every community from three signals:
+    - interest overlap: Jaccard of the user's and the community's interests
+    - embedding similarity: cosine of the user profile and community vectors
+    - co-membership: how often members of the user's communities also belong
+      to the candidate community
+    Communities the user already belongs to are excluded. Users are scored in
+    chunks of bounded size, and only the top-k per user are kept, so memory
+    stays O(chunk x communities + users x k).
+    """
+
+    def __init__(
+        self,
+        users: List[dict],
+        profiles: EntityIndex,
+        community_index: EntityIndex,
+        k: int = 5,
+        weights: Tuple[float, float, float] = (0.4, 0.4, 0.2),
+        chunk_bytes: int = 64 << 20,
+    ):
+        self.users = users
+        self.profiles = profiles
+        self.community_index = community_index
+        self.k = k
+        self.weights = weights
+        self.chunk_bytes = chunk_bytes
+        self.row_by_id = {u["id"]: row for row, u in enumerate(users)}
+        self.recommendations = np.full((len(users), k), -1, dtype=np.int32)
+        self.scores = np.full((len(users), k), -np.inf, dtype=np.float32)
+        self._communities = None
+
+    def index_communities(self) -> Tuple[Dict[str, int], Dict[int, int], csr_matrix, csr_matrix]:
+        """
+        Builds, once, the community side of the scoring: the interest columns,
+        the community rows, the sparse community x interest matrix and the
+        sparse row-normalized co-membership matrix. update_user scores against
+        these, so a single user costs O(communities) rather than a rebuild.
+        """
+        if self._communities is not None:
+            return self._communities
+        communities = self.community_index.entities
+        columns: Dict[str, int] = {}
+        community_rows = {c["id"]: i for i, c in enumerate(communities)}
+        indptr, indices = [0], []
+        for community in communities:
+            indices.extend(columns.setdefault(i, len(columns)) for i in sorted(set(community["interests"])))
+            indptr.append(len(indices))
+        community_interests = csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, indptr), shape=(len(communities), max(len(columns), 1))
+        )
+
+        # P(member of j | member of i), without the diagonal; kept sparse since
+        # most pairs of communities share no members
+        membership = self._membership(self.users, community_rows, len(communities))
+        cooccurrence = (membership.T @ membership).tocsr()
+        cooccurrence.setdiag(0.0)
+        cooccurrence.eliminate_zeros()
+        sizes = np.asarray(membership.sum(axis=0)).ravel()
+        cooccurrence = diags(1.0 / np.where(sizes == 0, 1.0, sizes)).astype(np.float32) @ cooccurrence
+
+        self._communities = columns, community_rows, community_interests, cooccurrence.tocsr()
+        return self._communities
+
+    @staticmethod
+    def _membership(users: List[dict], community_rows: Dict[int, int], width: int) -> csr_matrix:
+        indptr, indices = [0], []
+        for user in users:
+            indices.extend(sorted({community_rows[c] for c in user["community_ids"] if c in community_rows}))
+            indptr.append(len(indices))
+        return csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr), shape=(len(users), width))
+
+    def _score_chunk(self, start: int, stop: int) -> np.ndarray:
+        columns, community_rows, community_interests, cooccurrence = self.index_communities()
+        interest_weight, embedding_weight, comembership_weight = self.weights
+        users = self.users[start:stop]
+
+        # Interests no community has cannot overlap, but still count in the union
+        indptr, indices = [0], []
+        user_sizes = np.empty(len(users), dtype=np.float32)
+        for row, user in enumerate(users):
+            interests = set(user["interests"])
+            user_sizes[row] = len(interests)
+            indices.extend(sorted(columns[i] for i in interests if i in columns))
+            indptr.append(len(indices))
+        user_interests = csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, indptr), shape=(len(users), community_interests.shape[1])
+        )
+        overlap = (user_interests @ community_interests.T).toarray()
+        community_sizes = np.diff(community_interests.indptr).astype(np.float32)
+        union = user_sizes[:, None] + community_sizes[None, :] - overlap
+        scores = interest_weight * np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+
+        # Communities appended since index_communities() (bulk imports) wait for the next build
+        community_vectors = self.community_index.embeddings[:community_interests.shape[0]]
+        vectors = self.profiles.embeddings
+        if vectors.shape[1] and community_vectors.shape[1]:
+            scores += embedding_weight * (vectors[start:stop] @ community_vectors.T)
+
+        members = self._membership(users, community_rows, len(community_rows))
+        counts = np.diff(members.indptr).astype(np.float32)
+        scores += comembership_weight * (members @ cooccurrence).toarray() / np.where(counts == 0, 1.0, counts)[:, None]
+
+        # Exclude communities the user already belongs to
+        rows, cols = members.nonzero()
+        scores[rows, cols] = -np.inf
+        return scores
+
+    def _store(self, start: int, scores: np.ndarray):
+        k = min(self.k, scores.shape[1])
+        if k == 0:
+            return
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        self.recommendations[start:start + len(scores), :k] = top
+        self.scores[start:start + len(scores), :k] = np.take_along_axis(scores, top, axis=1)
+
+    def build(self):
+        """
+        Scores all users against all communities, chunk by chunk.
+        """
+        count = len(self.users)
+        communities = len(self.community_index)
+        if not count or not communities:
+            return
+        self._communities = None
+        self.index_communities()
+        # A handful of chunk x communities float32 temporaries are alive at once
+        chunk = max(1, self.chunk_bytes // (4 * 4 * communities))
+        for start in range(0, count, chunk):
+            stop = min(start + chunk, count)
+            self._store(start, self._score_chunk(start, stop))
+        logger.info(f"Built community recommendations for {count} users in chunks of {chunk}")
+
+    def update_user(self, user_id: int):
+        """
+        Recomputes one user's recommendations, e.g. after their interests
+        change. Co-membership comes from the cached index_communities(), so
+        membership changes only show up after the next build.
+        """
+        row = self.row_by_id[user_id]
+        if len(self.community_index):
+            self._store(row, self._score_chunk(row, row + 1))
+
+    def recommend(self, user_id: int, limit: int = 5) -> List[Tuple[dict, float]]:
+        """
+        Returns up to limit (community, score) pairs from the precomputed table.
+        """
+        row = self.row_by_id.get(user_id)
+        if row is None:
+            return []
+        communities = self.community_index.entities
+        return [
+            (communities[c], float(s))
+            for c, s in zip(self.recommendations[row][:limit], self.scores[row][:limit])
+            if c >= 0 and np.isfinite(s)
+        ]
+
+
+def compute_recommendations(users: List[dict], profiles: EntityIndex, community_index: EntityIndex, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Builds all recommendations from a snapshot and returns (recommendations, scores).
+    Module-level so it can run in a process pool.
+    """
+    recommender = CommunityRecommender(users, profiles, community_index, k=k)
+    recommender.build()
+    return recommender.recommendations, recommender.scores
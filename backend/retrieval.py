@@ -0,0 +1,269 @@
+import os
+import threading
+from collections import Counter, OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class EntityIndex:
+    """
+    Precomputed, L2-normalized embeddings for one entity collection.
+    Row i of the matrix belongs to entities[i]. The index keeps its own list
+    of the entities, so appends never touch the caller's list.
+    """
+
+    def __init__(self, entity_type: str, entities: List[dict], embeddings: np.ndarray):
+        self.entity_type = entity_type
+        self.entities = list(entities)
+        self.embeddings = embeddings
+        self.by_id = {e["id"]: e for e in entities}
+        # Spare-capacity buffer that embeddings is a view of, once append() has run
+        self._buffer: Optional[np.ndarray] = None
+
+    @classmethod
+    def build(cls, entity_type: str, entities: List[dict], texts: Sequence[str], encoder, batch_size: int = 64) -> "EntityIndex":
+        """
+        Encodes the entity texts once and stores the normalized embedding matrix.
+        """
+        if texts:
+            embeddings = encoder.encode(list(texts), batch_size=batch_size, convert_to_numpy=True)
+            embeddings = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        else:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        return cls(entity_type, entities, embeddings)
+
+    def save(self, directory: str):
+        """
+        Writes the embedding matrix and row ids as .npy files that other
+        processes can memory-map with load().
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, f"{self.entity_type}.embeddings.npy"), np.ascontiguousarray(self.embeddings))
+        np.save(os.path.join(directory, f"{self.entity_type}.ids.npy"), np.array([e["id"] for e in self.entities], dtype=np.int64))
+
+    @classmethod
+    def load(cls, entity_type: str, entities: List[dict], directory: str) -> "EntityIndex":
+        """
+        Memory-maps an index written by save(). The matrix pages are shared
+        read-only between every process that loads the same files.
+        """
+        embeddings = np.load(os.path.join(directory, f"{entity_type}.embeddings.npy"), mmap_mode="r")
+        ids = np.load(os.path.join(directory, f"{entity_type}.ids.npy"))
+        if len(ids) != len(entities) or any(int(i) != e["id"] for i, e in zip(ids, entities)):
+            raise ValueError(f"Shared {entity_type} index does not match the loaded dataset")
+        return cls(entity_type, entities, embeddings)
+
+    def set_row(self, row: int, vector: np.ndarray):
+        """
+        Overwrites one row with an already normalized vector. A read-only
+        (memory-mapped) matrix is copied before the first write.
+        """
+        if not self.embeddings.flags.writeable:
+            self.embeddings = np.array(self.embeddings)
+        self.embeddings[row] = vector
+
+    def append(self, entities: List[dict], embeddings: np.ndarray):
+        """
+        Adds entities and their normalized embeddings. Rows are written into a
+        buffer with spare capacity that grows geometrically, so a stream of
+        appends copies the matrix O(log n) times. embeddings always stays a
+        view of exactly one row per entity.
+        """
+        if not entities:
+            return
+        count = len(self.entities)
+        total = count + len(entities)
+        if self._buffer is None or len(self._buffer) < total or self.embeddings.base is not self._buffer:
+            buffer = np.empty((max(total, 2 * count, 1024), embeddings.shape[1]), dtype=np.float32)
+            if count:
+                buffer[:count] = self.embeddings
+            self._buffer = buffer
+        self._buffer[count:total] = embeddings
+        self.by_id.update((e["id"], e) for e in entities)
+        self.entities.extend(entities)
+        self.embeddings = self._buffer[:total]
+
+    def compacted(self) -> "EntityIndex":
+        """
+        Returns a copy whose matrix is a contiguous float32 array with exactly
+        one row per entity, and whose id lookup is rebuilt. An index still
+        memory-mapped from shared files (see load) is already compact and is
+        returned as is, so its pages stay shared between processes.
+        """
+        if isinstance(self.embeddings, np.memmap):
+            return self
+        embeddings = np.ascontiguousarray(self.embeddings[:len(self.entities)], dtype=np.float32).copy()
+        return EntityIndex(self.entity_type, list(self.entities), embeddings)
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def search(self, query_embedding: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[dict, float]]:
+        """
+        Returns up to k (entity, cosine score) pairs, best first.
+        An optional boolean mask restricts the candidate rows.
+        """
+        if not len(self) or k <= 0:
+            return []
+
+        scores = score_rows(self.embeddings, query_embedding)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        top = top_rows(scores, k)
+        return [(self.entities[i], float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+
+# Rows scored per matrix-vector product. Scoring in fixed, row-aligned blocks
+# makes every score independent of how the matrix is partitioned (see sharding.py).
+SCORE_BLOCK_ROWS = 1024
+
+
+def score_rows(matrix: np.ndarray, query_embedding: np.ndarray) -> np.ndarray:
+    """
+    Dot product of every row with the query, computed block by block.
+    """
+    if len(matrix) <= SCORE_BLOCK_ROWS:
+        return matrix @ query_embedding
+    return np.concatenate([
+        matrix[start:start + SCORE_BLOCK_ROWS] @ query_embedding for start in range(0, len(matrix), SCORE_BLOCK_ROWS)
+    ])
+
+
+def top_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Rows of the k highest scores, best first. Ties are broken by row, also at
+    the k-th place, so the result is fully determined by the scores.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    above = np.flatnonzero(scores > kth)
+    tied = np.flatnonzero(scores == kth)[:k - len(above)]
+    top = np.concatenate([above, tied])
+    return top[np.lexsort((top, -scores[top]))]
+
+
+class QueryCache:
+    """
+    LRU cache of query embeddings that also counts how often each query is
+    asked, so the most frequent ones can be warmed in the background.
+    """
+
+    def __init__(self, maxsize: int = 4096, tracked: int = 10000):
+        self.maxsize = maxsize
+        self.tracked = tracked
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        key = self.key(query)
+        with self._lock:
+            self._counts[key] += 1
+            if len(self._counts) > 2 * self.tracked:
+                self._counts = Counter(dict(self._counts.most_common(self.tracked)))
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+            return vector
+
+    def put(self, query: str, vector: np.ndarray):
+        key = self.key(query)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def top_missing(self, n: int) -> List[str]:
+        """
+        Returns up to n of the most frequent queries that are not cached.
+        """
+        with self._lock:
+            return [q for q, _ in self._counts.most_common(self.tracked) if q not in self._entries][:n]
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    L2-normalizes each row, leaving all-zero rows untouched.
+    """
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def convert_data_to_string(entities: List[dict], entity_type: str) -> str:
+    """
+    Converts a list of entities into a single string representation.
+    """
+    if entity_type == "event":
+        return "\n".join([
+            f"Name: {e['name']}\nLocation: {e['location']}\nType: {e['type']}\nDate: {e['date']}\nTime: {e['time']}\nDescription: {e.get('description', '')}\n"
+            for e in entities
+        ])
+    elif entity_type == "user":
+        return "\n".join([
+            f"Username: {u['username']}\nEmail: {u['email']}\nInterests: {', '.join(u['interests'])}\n"
+            for u in entities
+        ])
+    elif entity_type == "community":
+        return "\n".join([
+            f"Name: {c['name']}\nDescription: {c.get('description', '')}\nInterests: {', '.join(c['interests'])}\n"
+            for c in entities
+        ])
+    else:
+        return ""
+
+
+def entity_texts(entities: List[dict], entity_type: str) -> List[str]:
+    """
+    Returns the text embedded for each entity in the indexes.
+    """
+    return [convert_data_to_string([e], entity_type) for e in entities]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for budgeting prompts (~4 characters per token).
+    """
+    return len(text) // 4 + 1
+
+
+def format_candidate_line(entity: dict, entity_type: str) -> str:
+    """
+    Formats an entity as a single compact candidate line for the LLM prompt.
+    """
+    if entity_type == "event":
+        return f"{entity['id']}|{entity['name']}|{entity['location']}|{entity['type']}|{entity['date']} {entity['time']}"
+    elif entity_type == "user":
+        return f"{entity['id']}|{entity['username']}|{','.join(entity['interests'])}"
+    elif entity_type == "community":
+        return f"{entity['id']}|{entity['name']}|{','.join(entity['interests'])}"
+    return str(entity["id"])
+
+
+CANDIDATE_HEADERS = {
+    "event": "id|name|location|type|day time",
+    "user": "id|username|interests",
+    "community": "id|name|interests",
+}
+
+
+def fit_candidates(lines: List[str], base_tokens: int, token_budget: int) -> List[str]:
+    """
+    Keeps the leading (best ranked) candidate lines that fit in the input token budget.
+    """
+    kept = []
+    used = base_tokens
+    for line in lines:
+        cost = estimate_tokens(line)
+        if used + cost > token_budget and kept:
+            break
+        kept.append(line)
+        used += cost
+    return kept
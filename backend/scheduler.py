@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+JOB_DURATION = Histogram(
+    "job_duration_seconds", "Duration of background jobs", ["job"], buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900)
+)
+JOB_RUNS = Counter("job_runs_total", "Background job runs", ["job", "status"])
+
+
+class Job:
+    """
+    A background precomputation.
+
+    snapshot() runs on the thread pool (it may copy large state under a
+    lock) and returns the arguments for target;
+    target(*args) does the heavy work on the thread or process pool (process
+    targets must be importable module-level functions with picklable
+    arguments); the optional prepare(result) runs on the thread pool and
+    turns the result into the structure to swap in (e.g. an engine built
+    around precomputed arrays); apply(prepared) runs on the thread pool too
+    and swaps it in with a single assignment, under whatever lock guards
+    in-place updates of the old structure. Nothing heavy or blocking ever
+    runs on the event loop.
+
+    A job runs every `interval` seconds and/or when one of its `triggers`
+    is notified; notifications arriving within `debounce` seconds coalesce.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        target: Callable,
+        snapshot: Callable[[], Tuple] = tuple,
+        apply: Optional[Callable[[Any], None]] = None,
+        prepare: Optional[Callable[[Any], Any]] = None,
+        interval: Optional[float] = None,
+        triggers: Sequence[str] = (),
+        executor: str = "process",
+        debounce: float = 1.0,
+    ):
+        self.name = name
+        self.target = target
+        self.snapshot = snapshot
+        self.apply = apply
+        self.prepare = prepare
+        self.interval = interval
+        self.triggers = tuple(triggers)
+        self.executor = executor
+        self.debounce = debounce
+        self.runs = 0
+        self.status = "never"
+        self.last_started: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.next_run: Optional[float] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval,
+            "triggers": list(self.triggers),
+            "executor": self.executor,
+            "runs": self.runs,
+            "status": self.status,
+            "last_started": self.last_started,
+            "last_duration_seconds": self.last_duration,
+            "last_error": self.last_error,
+            "next_run": self.next_run,
+        }
+
+
+class Scheduler:
+    """
+    In-process scheduler for background jobs, started and stopped with the
+    FastAPI lifespan. CPU-heavy targets run in a process pool (spawned, so no
+    server state is forked), the rest in a thread pool.
+    """
+
+    def __init__(self, process_workers: int = 1, thread_workers: int = 2):
+        self.process_workers = process_workers
+        self.thread_workers = thread_workers
+        self.jobs: Dict[str, Job] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def add(self, job: Job):
+        self.jobs[job.name] = job
+
+    def _setup(self):
+        """
+        Creates the pools and run locks on first use: by start(), or by a
+        manual run() when the jobs are not scheduled.
+        """
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._threads = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="job")
+        if any(job.executor == "process" for job in self.jobs.values()):
+            self._processes = ProcessPoolExecutor(
+                max_workers=self.process_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        self._locks = {name: asyncio.Lock() for name in self.jobs}
+
+    async def start(self):
+        self._setup()
+        for job in self.jobs.values():
+            job._wake = asyncio.Event()
+            self._tasks.append(asyncio.create_task(self._loop_job(job), name=f"job-{job.name}"))
+        logger.info(f"Scheduler started with jobs: {', '.join(self.jobs)}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+        self._loop = self._processes = self._threads = None
+        logger.info("Scheduler stopped")
+
+    def notify(self, topic: str):
+        """
+        Triggers every job listening to topic. Safe to call from any thread;
+        a no-op before the scheduler has started.
+        """
+        if self._loop is None:
+            return
+        for job in self.jobs.values():
+            if topic in job.triggers and job._wake is not None:
+                self._loop.call_soon_threadsafe(job._wake.set)
+
+    async def run(self, name: str) -> Dict[str, Any]:
+        """
+        Runs a job now (waiting for a run in progress to finish first),
+        whether or not the scheduler has been started.
+        """
+        job = self.jobs[name]
+        self._setup()
+        async with self._locks[name]:
+            job.status = "running"
+            job.last_started = time.time()
+            start = time.monotonic()
+            try:
+                args = await self._loop.run_in_executor(self._threads, job.snapshot)
+                pool = self._processes if job.executor == "process" else self._threads
+                result = await self._loop.run_in_executor(pool, job.target, *args)
+                if job.prepare is not None:
+                    result = await self._loop.run_in_executor(self._threads, job.prepare, result)
+                if job.apply is not None:
+                    await self._loop.run_in_executor(self._threads, job.apply, result)
+                job.status = "ok"
+                job.last_error = None
+            except Exception as e:
+                job.status = "error"
+                job.last_error = str(e)
+                logger.error(f"Background job {name} failed: {str(e)}")
+            finally:
+                job.runs += 1
+                job.last_duration = time.monotonic() - start
+                JOB_DURATION.observe(job.last_duration, job=name)
+                JOB_RUNS.inc(job=name, status=job.status)
+        return job.describe()
+
+    async def _loop_job(self, job: Job):
+        while True:
+            job.next_run = time.time() + job.interval if job.interval else None
+            try:
+                await asyncio.wait_for(job._wake.wait(), timeout=job.interval)
+                # Coalesce bursts of change notifications
+                await asyncio.sleep(job.debounce)
+            except asyncio.TimeoutError:
+                pass
+            job._wake.clear()
+            await self.run(job.name)
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [job.describe() for job in self.jobs.values()]
@@ -0,0 +1,88 @@
+"""
+Multi-worker launcher with a shared encoder process and shared indexes.
+
+    python serve.py --workers 4 --port 8000
+
+The embedding indexes, user profiles, neighbor lists and recommendations are
+built once into .npy files that every worker memory-maps. Query encoding is
+served by a single encoder process, so workers never load the model
+themselves.
+"""
+import argparse
+import logging
+import multiprocessing as mp
+import os
+import tempfile
+
+import numpy as np
+import uvicorn
+
+from encoders import ENCODER_ADDRESS_ENV, ENCODER_AUTHKEY_ENV, serve_encoder
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def build_shared_indexes(directory: str):
+    """
+    Builds every entity index (through the shared encoder), the user
+    profiles, neighbor lists and recommendations, and saves them to directory.
+    """
+    os.environ["SHARED_INDEX_BUILDER"] = "1"
+    import fast
+
+    for index in fast.INDEXES.values():
+        index.save(directory)
+    fast.USER_PROFILES.save(directory)
+    tables = {
+        "neighbors": fast.NEIGHBORS.neighbors,
+        "neighbor_scores": fast.NEIGHBORS.scores,
+        "recommendations": fast.RECOMMENDER.recommendations,
+        "recommendation_scores": fast.RECOMMENDER.scores,
+    }
+    for name, table in tables.items():
+        np.save(os.path.join(directory, f"{name}.npy"), table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with shared model and indexes across workers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shared-dir", default=None, help="Directory for the index files and encoder socket")
+    args = parser.parse_args()
+
+    shared_dir = args.shared_dir or tempfile.mkdtemp(prefix="eventhub-")
+    os.makedirs(shared_dir, exist_ok=True)
+    address = os.path.join(shared_dir, "encoder.sock")
+    if os.path.exists(address):
+        os.remove(address)
+    authkey = os.urandom(16)
+
+    # Start the shared encoder process
+    ready = mp.Event()
+    encoder = mp.Process(target=serve_encoder, args=(address, authkey, ready), daemon=True)
+    encoder.start()
+    ready.wait()
+    os.environ[ENCODER_ADDRESS_ENV] = address
+    os.environ[ENCODER_AUTHKEY_ENV] = authkey.hex()
+
+    # Build the indexes once, in a short-lived process
+    builder = mp.Process(target=build_shared_indexes, args=(shared_dir,))
+    builder.start()
+    builder.join()
+    if builder.exitcode != 0:
+        encoder.terminate()
+        raise SystemExit(f"Building shared indexes failed (exit code {builder.exitcode})")
+    os.environ["SHARED_INDEX_DIR"] = shared_dir
+    os.environ["SERVE_WORKERS"] = str(args.workers)
+    logger.info(f"Shared indexes written to {shared_dir}")
+
+    try:
+        uvicorn.run("fast:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        encoder.terminate()
+
+
+if __name__ == "__main__":
+    main()
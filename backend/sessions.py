@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from metrics import Counter, Gauge
+from retrieval import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_SESSIONS = Gauge("chat_sessions_active", "Chat sessions held in memory")
+EVICTED_SESSIONS = Counter("chat_sessions_evicted_total", "Chat sessions evicted", ["reason"])
+SUMMARIES = Counter("chat_summaries_total", "Rolling summary updates", ["status"])
+DROPPED_TURNS = Counter("chat_turns_dropped_total", "Chat turns dropped unsummarized after failed summary updates")
+
+# summarize(previous_summary, turns) -> new summary
+Summarizer = Callable[[str, List[dict]], str]
+
+
+class ChatSession:
+    """
+    Server-side conversation state: a rolling summary of older turns plus
+    the most recent turns verbatim.
+    """
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.summary = ""
+        self.turns: List[dict] = []
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+    def add(self, role: str, content: str):
+        self.turns.append({"role": role, "content": content})
+
+    def context(self, token_budget: int, summarize: Summarizer, max_unsummarized: Optional[int] = None) -> List[dict]:
+        """
+        Returns the messages to send: the summary (as a system message) and the
+        recent turns within token_budget. When the turns exceed token_budget,
+        the oldest ones are folded into the summary until they fit in half the
+        budget, so the summarizer runs once every few turns rather than every
+        turn. The newest turn is always kept verbatim.
+
+        Turns are only removed once the summary holds them: if summarize
+        raises, they stay and the fold is retried on the next turn. Kept
+        turns are capped at max_unsummarized tokens (4 x token_budget by
+        default); beyond that the oldest are dropped, so memory and the
+        summarizer's input stay bounded while the summarizer keeps failing.
+        """
+        if max_unsummarized is None:
+            max_unsummarized = 4 * token_budget
+        sizes = [estimate_tokens(t["content"]) for t in self.turns]
+        used = sum(sizes)
+        if used > token_budget:
+            fold = 0
+            while used > token_budget // 2 and fold < len(self.turns) - 1:
+                used -= sizes[fold]
+                fold += 1
+            try:
+                self.summary = summarize(self.summary, self.turns[:fold])
+                SUMMARIES.inc(status="ok")
+                del self.turns[:fold]
+                del sizes[:fold]
+            except Exception as e:
+                # Keep the previous summary and the turns; the fold is retried next turn
+                SUMMARIES.inc(status="error")
+                logger.error(f"Error summarizing chat session {self.id}: {str(e)}")
+                self._drop_oldest(sizes, max_unsummarized)
+
+        # The newest turns that fit the budget (at least the newest one)
+        recent, used = 1, sizes[-1] if sizes else 0
+        while recent < len(sizes) and used + sizes[-recent - 1] <= token_budget:
+            used += sizes[-recent - 1]
+            recent += 1
+
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the conversation so far: {self.summary}"})
+        return messages + self.turns[-recent:]
+
+    def _drop_oldest(self, sizes: List[int], max_tokens: int):
+        """
+        Drops the oldest turns (and their sizes) until the rest fit max_tokens, keeping the newest.
+        """
+        drop, used = 0, sum(sizes)
+        while used > max_tokens and drop < len(sizes) - 1:
+            used -= sizes[drop]
+            drop += 1
+        if drop:
+            DROPPED_TURNS.inc(drop)
+            logger.warning(f"Dropped {drop} unsummarized turn(s) of chat session {self.id}")
+            del self.turns[:drop]
+            del sizes[:drop]
+
+
+class SessionStore:
+    """
+    In-memory chat sessions with LRU eviction beyond max_sessions and
+    expiry after ttl seconds without use.
+    """
+
+    def __init__(self, max_sessions: int = 10000, ttl: float = 1800.0):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            EVICTED_SESSIONS.inc(reason="ttl")
+
+    def get_or_create(self, session_id: Optional[str]) -> ChatSession:
+        """
+        Returns the live session with this id, or a new session (with a fresh
+        id) when the id is missing, unknown or expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None:
+                session = ChatSession(uuid.uuid4().hex)
+                self._sessions[session.id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    EVICTED_SESSIONS.inc(reason="lru")
+            session.last_used = now
+            self._sessions.move_to_end(session.id)
+            ACTIVE_SESSIONS.set(len(self._sessions))
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            removed = self._sessions.pop(session_id, None) is not None
+            ACTIVE_SESSIONS.set(len(self._sessions))
+            return removed
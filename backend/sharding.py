@@ -0,0 +1,325 @@
+"""
+Sharded retrieval: an EntityIndex whose rows are searched by worker processes.
+
+The embedding matrix lives in a memory-mapped .npy file that every shard maps
+read-only. Rows are grouped in blocks of SCORE_BLOCK_ROWS and each shard owns
+a set of whole blocks, either contiguous id ranges ("range") or blocks spread
+by block number modulo the shard count ("hash"). A query is sent to every
+shard at once, each shard returns its local top k and the parent merges them
+with a heap. Every search message carries the matrix file and row spans it
+was planned against, so shards keep no row state, and the parent talks to
+them over a pool of connection sets ("lanes") so several queries can be in
+flight at once. Blocks are scored exactly as EntityIndex.search scores them
+and ties are broken by row, so the results are identical to the unsharded
+index.
+"""
+import atexit
+import heapq
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from retrieval import SCORE_BLOCK_ROWS, EntityIndex, score_rows, top_rows
+
+logger = logging.getLogger(__name__)
+
+SHARD_MODES = ("range", "hash")
+
+
+def shard_blocks(total: int, shards: int, mode: str) -> List[List[int]]:
+    """
+    Block numbers owned by each shard for a matrix of total rows.
+    """
+    blocks = -(-total // SCORE_BLOCK_ROWS)
+    if mode == "hash":
+        return [list(range(shard, blocks, shards)) for shard in range(shards)]
+    return [list(range(shard * blocks // shards, (shard + 1) * blocks // shards)) for shard in range(shards)]
+
+
+def block_spans(blocks: List[int], total: int) -> List[Tuple[int, int]]:
+    """
+    Row ranges covered by a sorted list of blocks, with adjacent blocks joined.
+    """
+    spans: List[Tuple[int, int]] = []
+    for block in blocks:
+        start, stop = block * SCORE_BLOCK_ROWS, min((block + 1) * SCORE_BLOCK_ROWS, total)
+        if spans and spans[-1][1] == start:
+            spans[-1] = (spans[-1][0], stop)
+        else:
+            spans.append((start, stop))
+    return spans
+
+
+def search_spans(matrix: np.ndarray, spans: List[Tuple[int, int]], query: np.ndarray, k: int, mask: Optional[np.ndarray]):
+    """
+    Local top k over the rows of spans, as (rows, scores).
+    """
+    if not spans:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    scores = np.concatenate([score_rows(matrix[start:stop], query) for start, stop in spans])
+    if mask is not None:
+        scores = np.where(mask, scores, -np.inf)
+    top = top_rows(scores, k)
+    # Map positions in the concatenated spans back to matrix rows
+    starts = np.array([start for start, _ in spans], dtype=np.int64)
+    offsets = np.cumsum([0] + [stop - start for start, stop in spans[:-1]])
+    span = np.searchsorted(offsets, top, side="right") - 1
+    return starts[span] + (top - offsets[span]), scores[top]
+
+
+def serve_shard(conns):
+    """
+    multiprocessing.Process target: answers ("search", (path, spans, query,
+    k, mask)) and ("stop", None) messages, one thread per connection so
+    queries on different lanes overlap (numpy releases the GIL while
+    scoring). Every reply is ("ok", payload) or ("error", message).
+    """
+    maps = {}
+    maps_lock = threading.Lock()
+    stopped = threading.Event()
+
+    def matrix_at(path: str) -> np.ndarray:
+        with maps_lock:
+            if path not in maps:
+                # Only the newest file is searched once an append has moved the matrix
+                maps.clear()
+                maps[path] = np.load(path, mmap_mode="r")
+            return maps[path]
+
+    def serve(conn):
+        while True:
+            try:
+                op, args = conn.recv()
+            except (EOFError, OSError):
+                return
+            if op == "stop":
+                conn.send(("ok", None))
+                stopped.set()
+                return
+            try:
+                if op == "search":
+                    path, spans, query, k, mask = args
+                    conn.send(("ok", search_spans(matrix_at(path), spans, query, k, mask)))
+                else:
+                    conn.send(("error", f"Unknown shard operation {op}"))
+            except Exception as e:
+                conn.send(("error", str(e)))
+
+    threads = [threading.Thread(target=serve, args=(conn,), daemon=True) for conn in conns]
+    for thread in threads:
+        thread.start()
+    while not stopped.is_set() and any(thread.is_alive() for thread in threads):
+        stopped.wait(0.5)
+
+
+def shared_file(embeddings: np.ndarray) -> Optional[str]:
+    """
+    The .npy file embeddings is a read-only map of in full, if any.
+    """
+    path = getattr(embeddings, "filename", None)
+    if not isinstance(embeddings, np.memmap) or embeddings.flags.writeable or not path:
+        return None
+    return path if np.load(path, mmap_mode="r").shape == embeddings.shape else None
+
+
+class ShardedIndex(EntityIndex):
+    """
+    EntityIndex searched by shard processes on the same machine, with up to
+    lanes queries in flight at once.
+
+    The parent keeps a writable map of the whole matrix, so set_row(),
+    build_user_profiles() and the recommenders read and write it as before;
+    shards see in-place writes through the shared file. append() writes into
+    spare capacity at the end of the file (or a geometrically larger copy)
+    and then adds the new blocks to the spans later queries are planned
+    against; queries already in flight finish on the rows they started
+    with. If a shard fails, the query is answered from the parent's map
+    instead.
+
+    An index memory-mapped from a shared .npy file (EntityIndex.load) is
+    searched from that file directly, so its pages stay shared with every
+    other process mapping it; the matrix is only copied into a file of its
+    own on the first write.
+    """
+
+    def __init__(self, index: EntityIndex, shards: int, mode: str = "range", lanes: int = 4):
+        if mode not in SHARD_MODES:
+            raise ValueError(f"Unknown shard mode {mode}, expected one of {', '.join(SHARD_MODES)}")
+        super().__init__(index.entity_type, index.entities, index.embeddings)
+        self.shards = shards
+        self.mode = mode
+        self._directory = tempfile.mkdtemp(prefix=f"kynnovate-{index.entity_type}-shards-")
+        self._versions = itertools.count()
+        self._path: Optional[str] = None
+        self._buffer = None
+        shared = shared_file(index.embeddings)
+        if shared:
+            self._path, self._buffer = shared, index.embeddings
+        else:
+            self._allocate(max(len(self.entities), SCORE_BLOCK_ROWS), index.embeddings)
+        self._lock = threading.Lock()
+        self._plan()
+        context = multiprocessing.get_context("spawn")
+        # lanes[i][shard] is the i-th connection to shard; a query holds one lane
+        lanes_by_shard = []
+        self._processes = []
+        for shard in range(shards):
+            pipes = [context.Pipe() for _ in range(max(1, lanes))]
+            process = context.Process(
+                target=serve_shard, args=([child for _, child in pipes],),
+                name=f"{index.entity_type}-shard-{shard}", daemon=True,
+            )
+            process.start()
+            for _, child in pipes:
+                child.close()
+            lanes_by_shard.append([parent for parent, _ in pipes])
+            self._processes.append(process)
+        self._lanes = [list(lane) for lane in zip(*lanes_by_shard)]
+        self._idle = queue.Queue()
+        for lane in self._lanes:
+            self._idle.put(lane)
+        atexit.register(self.close)
+        logger.info(f"Sharded {index.entity_type} index: {len(self)} rows over {shards} {mode} shard(s)")
+
+    def __reduce__(self):
+        # Process-pool jobs receive a plain in-memory copy
+        return EntityIndex, (self.entity_type, list(self.entities), np.array(self.embeddings))
+
+    def _allocate(self, capacity: int, rows: np.ndarray):
+        """
+        Creates a new matrix file with room for capacity rows and copies rows into it.
+        """
+        path = os.path.join(self._directory, f"{self.entity_type}.{next(self._versions)}.npy")
+        buffer = open_memmap(path, mode="w+", dtype=np.float32, shape=(capacity, rows.shape[1]))
+        buffer[:len(rows)] = rows
+        buffer.flush()
+        old_path, self._path, self._buffer = self._path, path, buffer
+        self.embeddings = buffer[:len(rows)]
+        # A shared file is not ours to remove
+        return old_path if old_path and os.path.dirname(old_path) == self._directory else None
+
+    def set_row(self, row: int, vector: np.ndarray):
+        with self._lock:
+            if not self._buffer.flags.writeable:
+                self._allocate(max(len(self.entities), SCORE_BLOCK_ROWS), self.embeddings)
+            self.embeddings[row] = vector
+
+    def _call(self, lane: list, messages: list) -> list:
+        """
+        Sends one message to every shard of a lane, then collects every reply.
+        A lost shard closes the index, whose searches then run in the parent.
+        """
+        try:
+            for conn, message in zip(lane, messages):
+                conn.send(message)
+            replies = [conn.recv() for conn in lane]
+        except (OSError, EOFError):
+            self.close()
+            raise
+        for status, payload in replies:
+            if status != "ok":
+                raise RuntimeError(f"{self.entity_type} shard failed: {payload}")
+        return [payload for _, payload in replies]
+
+    def _plan(self):
+        """
+        Splits the current rows into each shard's spans; call under _lock.
+        """
+        total = len(self.entities)
+        self._spans = [block_spans(blocks, total) for blocks in shard_blocks(total, self.shards, self.mode)]
+        self._rows = [np.concatenate([np.arange(a, b) for a, b in s] or [np.zeros(0, dtype=np.int64)]) for s in self._spans]
+
+    def append(self, entities: List[dict], embeddings: np.ndarray):
+        if not entities:
+            return
+        count = len(self.entities)
+        total = count + len(entities)
+        with self._lock:
+            old_path = None
+            if len(self._buffer) < total or not self._buffer.flags.writeable:
+                old_path = self._allocate(max(total, 2 * count), self.embeddings)
+            self._buffer[count:total] = embeddings
+            self.by_id.update((e["id"], e) for e in entities)
+            self.entities.extend(entities)
+            self.embeddings = self._buffer[:total]
+            self._plan()
+        if old_path:
+            # Shards still mapping the old file keep it until they move on
+            os.remove(old_path)
+
+    def compacted(self) -> "EntityIndex":
+        """
+        The shared matrix file is already contiguous; the index is kept as is.
+        """
+        return self
+
+    def search(self, query_embedding: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[dict, float]]:
+        """
+        Fans the query out to every shard over an idle lane and merges their
+        local top k. Only planning the message takes the lock.
+        """
+        if not len(self) or k <= 0:
+            return []
+        if not self._processes:
+            return super().search(query_embedding, k, mask)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        with self._lock:
+            path, spans, rows = self._path, self._spans, self._rows
+        messages = [("search", (path, s, query, k, None if mask is None else mask[r])) for s, r in zip(spans, rows)]
+        lane = self._idle.get()
+        try:
+            results = self._call(lane, messages)
+        except Exception as e:
+            logger.error(f"Sharded {self.entity_type} search failed, searching locally: {str(e)}")
+            return super().search(query_embedding, k, mask)
+        finally:
+            self._idle.put(lane)
+        merged = heapq.merge(*(
+            zip((-scores).tolist(), shard_rows.tolist()) for shard_rows, scores in results
+        ))
+        return [
+            (self.entities[row], -negative) for negative, row in itertools.islice(merged, k)
+            if np.isfinite(negative)
+        ]
+
+    def close(self):
+        """
+        Stops the shard processes and removes the matrix file.
+        """
+        with self._lock:
+            lanes, processes = self._lanes, self._processes
+            self._lanes, self._processes = [], []
+        if not processes:
+            return
+        # Stop the shards over an idle lane so the replies cannot mix with a
+        # query in flight; shards still busy after a second are terminated
+        try:
+            lane = self._idle.get(timeout=1)
+        except queue.Empty:
+            lane = None
+        for shard, process in enumerate(processes):
+            if lane is not None:
+                try:
+                    lane[shard].send(("stop", None))
+                    lane[shard].recv()
+                except (OSError, EOFError):
+                    pass
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        for conns in lanes:
+            for conn in conns:
+                conn.close()
+        if lane is not None:
+            # Queries waiting for a lane find it closed and search locally
+            self._idle.put(lane)
+        shutil.rmtree(self._directory, ignore_errors=True)
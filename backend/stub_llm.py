@@ -0,0 +1,269 @@
+"""
+Local stand-in for the Groq chat completions API, for evaluation and load tests.
+
+    python stub_llm.py --port 8765 --latency-ms 300 --tail-rate 0.05 --tail-ms 3000
+    GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=stub uvicorn fast:app
+
+It answers the match prompts of fast.py without a model: candidates (compact
+and /search prompts) or data records (verbose prompt) are ranked by how many
+query words they contain, and the ids or names of those that contain any are
+returned as the JSON array the prompt asks for. Responses are streamed as
+server-sent events like the real API. Latency is injected per request: a
+base delay, prefill time per prompt token, decode time per output piece, and
+a tail delay or a transient 503 for a configurable fraction of requests.
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+from retrieval import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "and", "the", "for", "with", "who", "that", "are", "like", "people", "events", "event", "groups", "group",
+    "communities", "community", "interested", "lovers", "fans", "find", "some", "any", "near", "into",
+}
+# Candidate lines of the compact and /search prompts: "12|name|..." or "e12|name|..."
+CANDIDATE_LINE = re.compile(r"^([a-z]?\d+)\|(.*)$", re.MULTILINE)
+# Records in the (whitespace-collapsed) data of the verbose prompt
+VERBOSE_RECORDS = {
+    "event": re.compile(r"Name: (.*?) Location: (.*?)(?= Name: |$)"),
+    "user": re.compile(r"Username: (.*?) Email: (.*?)(?= Username: |$)"),
+    "community": re.compile(r"Name: (.*?) Description: (.*?)(?= Name: |$)"),
+}
+
+
+def terms(text: str) -> List[str]:
+    return [w for w in WORD.findall(text.lower()) if len(w) >= 3 and w not in STOPWORDS]
+
+
+def overlap(query_terms: List[str], text: str) -> int:
+    """
+    Query terms found in text; a term matches any word it is a prefix of
+    (or that is a prefix of it), so "tech" finds "technology".
+    """
+    words = set(terms(text))
+    return sum(
+        1 for term in query_terms
+        if any(word.startswith(term) or (len(word) >= 4 and term.startswith(word)) for word in words)
+    )
+
+
+def rank(query: str, items: List[Tuple[object, str]], limit: int) -> List[object]:
+    query_terms = terms(query)
+    scored = [(overlap(query_terms, text), position, key) for position, (key, text) in enumerate(items)]
+    return [key for score, _, key in sorted(scored, key=lambda s: (-s[0], s[1])) if score > 0][:limit]
+
+
+def answer(messages: List[dict]) -> str:
+    """
+    The stub's reply to a chat completion request.
+    """
+    prompt = "\n".join(str(m.get("content", "")) for m in messages if m.get("role") == "user")
+    limit_match = re.search(r"(?:up to|at most) (\d+)", prompt)
+    limit = int(limit_match.group(1)) if limit_match else 10
+
+    query_match = re.search(r"^Query: (.*)$", prompt, re.MULTILINE)
+    if query_match:
+        candidates = [(key, text) for key, text in CANDIDATE_LINE.findall(prompt)]
+        ids = rank(query_match.group(1), candidates, limit)
+        return json.dumps([int(i) if i.isdigit() else i for i in ids])
+
+    verbose_match = re.search(r"find matching (\w+)s for: '(.*)'\.", prompt)
+    if verbose_match:
+        entity_type, query = verbose_match.groups()
+        data = " ".join(prompt.split("Data:", 1)[-1].split())
+        pattern = VERBOSE_RECORDS.get(entity_type)
+        records = [(name, f"{name} {rest}") for name, rest in pattern.findall(data)] if pattern else []
+        key = "username" if entity_type == "user" else "name"
+        return json.dumps([{key: name} for name in rank(query, records, limit)])
+
+    return "This is a reply from the local LLM stub."
+
+
+class LatencyModel:
+    """
+    Delays and failures injected per request.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        prefill_ms_per_1k: float = 0.0,
+        token_ms: float = 0.0,
+        tail_rate: float = 0.0,
+        tail_ms: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.prefill_ms_per_1k = prefill_ms_per_1k
+        self.token_ms = token_ms
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self, prompt_tokens: int) -> Tuple[float, bool]:
+        """
+        Seconds before the first token, and whether the request fails.
+        """
+        with self._lock:
+            tail = self._random.random() < self.tail_rate
+            failed = self._random.random() < self.error_rate
+        delay = self.latency_ms + self.prefill_ms_per_1k * prompt_tokens / 1000 + (self.tail_ms if tail else 0.0)
+        return delay / 1000, failed
+
+
+def completion_chunk(completion_id: str, model: str, content: Optional[str], finish_reason: Optional[str] = None, usage=None) -> dict:
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": {"content": content} if content is not None else {}, "finish_reason": finish_reason}],
+    }
+    if usage is not None:
+        chunk["x_groq"] = {"id": completion_id, "usage": usage}
+    return chunk
+
+
+def make_handler(latency: LatencyModel, piece_chars: int = 8):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+        def send_json(self, status: int, body: dict):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if self.path.rstrip("/") != COMPLETIONS_PATH:
+                self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            try:
+                request = json.loads(body)
+            except ValueError:
+                self.send_json(400, {"error": {"message": "Invalid JSON body"}})
+                return
+
+            messages = request.get("messages", [])
+            prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+            delay, failed = latency.draw(prompt_tokens)
+            time.sleep(delay)
+            if failed:
+                self.send_json(503, {"error": {"message": "Injected transient failure", "type": "service_unavailable"}})
+                return
+
+            text = answer(messages)
+            if request.get("max_tokens"):
+                text = text[:4 * int(request["max_tokens"])]
+            pieces = [text[i:i + piece_chars] for i in range(0, len(text), piece_chars)]
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": estimate_tokens(text)}
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            model = request.get("model", "stub")
+
+            if not request.get("stream"):
+                time.sleep(latency.token_ms * len(pieces) / 1000)
+                self.send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            try:
+                for piece in pieces:
+                    self.wfile.write(f"data: {json.dumps(completion_chunk(completion_id, model, piece))}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(latency.token_ms / 1000)
+                final = completion_chunk(completion_id, model, None, "stop", usage)
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading (cancelled or had enough matches)
+                pass
+
+    return StubHandler
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, **latency) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Serves the stub on a daemon thread; returns the server and its base URL.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(LatencyModel(**latency)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_latency_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Base delay before the first token")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=0.0, help="Extra delay per 1000 prompt tokens")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="Delay between streamed pieces")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Fraction of requests delayed by --tail-ms")
+    parser.add_argument("--tail-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with HTTP 503")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def latency_options(args: argparse.Namespace) -> dict:
+    return {
+        "latency_ms": args.latency_ms,
+        "prefill_ms_per_1k": args.prefill_ms_per_1k,
+        "token_ms": args.token_ms,
+        "tail_rate": args.tail_rate,
+        "tail_ms": args.tail_ms,
+        "error_rate": args.error_rate,
+        "seed": args.seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Groq-compatible LLM stub with injected latency.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_latency_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(LatencyModel(**latency_options(args))))
+    server.daemon_threads = True
+    logger.info(f"LLM stub listening on http://{args.host}:{args.port} (set GROQ_BASE_URL to this URL)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend modules are flat top-level modules (imported as "from retrieval import ...")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,53 @@
+import pickle
+
+import numpy as np
+
+from columnar import DATE, INT, INT_LIST, STR, STR_LIST, TEXT, ColumnStore
+
+SCHEMA = {"id": INT, "name": TEXT, "type": STR, "date": DATE, "tags": STR_LIST, "refs": INT_LIST}
+
+
+def records(start, stop):
+    return [
+        {
+            "id": i,
+            "name": None if i % 5 == 0 else f"Évènement {i}",
+            "type": ["Music", "Tech"][i % 2],
+            "date": f"2026-01-{i % 28 + 1:02d}",
+            "tags": [f"tag{i % 3}", "all"],
+            "refs": list(range(i % 4)),
+        }
+        for i in range(start, stop)
+    ]
+
+
+def test_rows_read_back_as_written():
+    data = records(0, 50)
+    store = ColumnStore("event", data, SCHEMA)
+    assert [row.to_dict() for row in store.page(0, len(store))] == data
+    assert store.row(3).date() == np.datetime64("2026-01-04")
+
+
+def test_append_and_lookup_by_id():
+    store = ColumnStore("event", records(0, 10), SCHEMA)
+    store.append(records(10, 3000))
+    assert len(store) == 3000
+    assert store.row(store.row_of(2999))["name"] == "Évènement 2999"
+    assert store.row_of(5000) is None
+    assert list(store.rows_where("type", "Music")) == list(range(0, 3000, 2))
+
+
+def test_list_overlay_survives_compaction():
+    store = ColumnStore("event", records(0, 20), SCHEMA)
+    store.set_list(4, "tags", ["new"])
+    assert store.row(4)["tags"] == ["new"]
+    assert 4 in store.rows_where("tags", "new") and 4 not in store.rows_where("tags", "all")
+    store.compact()
+    assert store.row(4)["tags"] == ["new"]
+    assert store.row(5)["tags"] == ["tag2", "all"]
+
+
+def test_row_views_pickle_as_dicts():
+    store = ColumnStore("event", records(0, 3), SCHEMA)
+    copy = pickle.loads(pickle.dumps(store.row(1)))
+    assert type(copy) is dict and copy == records(1, 2)[0]
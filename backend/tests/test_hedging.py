@@ -0,0 +1,164 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from admission import ConcurrencyLimiter
+from hedging import HedgeBudget, HedgedCaller, LatencyTracker, peek_stream
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(4) as pool:
+        yield pool
+
+
+def make_caller(executor, budget=None, **kwargs):
+    options = dict(default_delay=0.05, min_delay=0.01, backoff=0.001, backoff_cap=0.01)
+    options.update(kwargs)
+    return HedgedCaller(
+        "test", executor, budget or HedgeBudget(ratio=1.0, burst=1.0),
+        lambda e: isinstance(e, ConnectionError), **options
+    )
+
+
+def sequence(*behaviours):
+    """
+    An attempt whose n-th call sleeps and then returns or raises behaviours[n].
+    """
+    calls = []
+    lock = threading.Lock()
+
+    def attempt():
+        with lock:
+            n = len(calls)
+            calls.append(n)
+        delay, outcome = behaviours[min(n, len(behaviours) - 1)]
+        time.sleep(delay)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    return attempt, calls
+
+
+def test_latency_percentile_needs_min_samples():
+    tracker = LatencyTracker(window=10, min_samples=3)
+    tracker.record(1.0)
+    tracker.record(2.0)
+    assert tracker.percentile(50) is None
+    tracker.record(3.0)
+    assert tracker.percentile(50) == 2.0
+
+
+def test_budget_caps_hedges():
+    budget = HedgeBudget(ratio=0.5, burst=1.0)
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    budget.earn()
+    budget.earn()
+    assert budget.try_spend()
+    assert not HedgeBudget(ratio=0.0, burst=5.0).try_spend()
+
+
+def test_slow_primary_is_hedged_and_loser_discarded(executor):
+    attempt, calls = sequence((0.5, "slow"), (0.0, "fast"))
+    discarded = threading.Event()
+    caller = make_caller(executor)
+    assert caller.call(attempt, discard=lambda result: result == "slow" and discarded.set()) == "fast"
+    assert len(calls) == 2
+    assert discarded.wait(2)
+
+
+def test_no_hedge_without_budget(executor):
+    attempt, calls = sequence((0.2, "only"))
+    caller = make_caller(executor, budget=HedgeBudget(ratio=0.0, burst=0.0))
+    assert caller.call(attempt) == "only"
+    assert len(calls) == 1
+
+
+def test_transient_errors_are_retried(executor):
+    attempt, calls = sequence((0.0, ConnectionError("reset")), (0.0, ConnectionError("reset")), (0.0, "ok"))
+    caller = make_caller(executor, budget=HedgeBudget(ratio=0.0, burst=0.0), max_retries=2)
+    assert caller.call(attempt) == "ok"
+    assert len(calls) == 3
+
+
+def test_retries_are_bounded(executor):
+    attempt, calls = sequence((0.0, ConnectionError("reset")))
+    caller = make_caller(executor, budget=HedgeBudget(ratio=0.0, burst=0.0), max_retries=1)
+    with pytest.raises(ConnectionError):
+        caller.call(attempt)
+    assert len(calls) == 2
+
+
+def test_other_errors_are_not_retried(executor):
+    attempt, calls = sequence((0.0, ValueError("bad request")))
+    with pytest.raises(ValueError):
+        make_caller(executor).call(attempt)
+    assert len(calls) == 1
+
+
+def test_cancel_stops_hedging_and_waits_for_running_attempt(executor):
+    attempt, calls = sequence((0.3, "late"))
+    cancel = threading.Event()
+    cancel.set()
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        make_caller(executor, default_delay=0.01).call(attempt, cancel=cancel)
+    # Returned only once the running attempt had, without hedging it
+    assert time.monotonic() - started >= 0.3
+    assert len(calls) == 1
+
+
+def test_hedge_needs_a_free_slot(executor):
+    limiter = ConcurrencyLimiter("test", max_concurrent=1, max_queue=0, queue_timeout=0.1)
+    attempt, calls = sequence((0.2, "only"))
+    with limiter.slot():
+        assert make_caller(executor, limiter=limiter).call(attempt) == "only"
+    assert len(calls) == 1
+    assert limiter.try_acquire()
+
+
+def test_hedge_slot_covers_the_losing_attempt(executor):
+    limiter = ConcurrencyLimiter("test", max_concurrent=2, max_queue=0, queue_timeout=0.1)
+    attempt, calls = sequence((0.4, "slow"), (0.0, "fast"))
+    with limiter.slot():
+        assert make_caller(executor, limiter=limiter).call(attempt) == "fast"
+    assert len(calls) == 2
+    # The slow primary is still running under the hedge's slot
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+    time.sleep(0.5)
+    assert limiter.try_acquire()
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def test_peeked_stream_replays_first_chunk():
+    stream = FakeStream(["a", "b", "c"])
+    peeked = peek_stream(lambda: stream)()
+    assert list(peeked) == ["a", "b", "c"]
+    peeked.close()
+    assert stream.closed
+
+
+def test_peek_closes_stream_when_first_chunk_fails():
+    stream = FakeStream([ConnectionError("reset")])
+    with pytest.raises(ConnectionError):
+        peek_stream(lambda: stream)()
+    assert stream.closed
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from json_stream import JSONArrayStreamParser, iter_json_array
+
+
+def pieces(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+ELEMENTS = [
+    {"id": 1, "reason": "likes [music] and \"jazz\"", "tags": ["a", "b"]},
+    [1, [2, 3]],
+    "plain, with comma",
+    -4.5,
+    True,
+    None,
+    {"nested": {"deep": [{}]}},
+]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_elements_survive_any_split(size):
+    text = "Here you go:\n" + json.dumps(ELEMENTS, indent=2) + "\nHope that helps."
+    parser = JSONArrayStreamParser()
+    elements = []
+    for piece in pieces(text, size):
+        elements.extend(parser.feed(piece))
+    assert elements == ELEMENTS
+    assert parser.done
+
+
+def test_objects_are_yielded_on_their_closing_brace():
+    parser = JSONArrayStreamParser()
+    assert parser.feed('[{"id": 1}') == [{"id": 1}]
+    assert parser.feed(', {"id"') == []
+    assert parser.feed(': 2}') == [{"id": 2}]
+
+
+def test_scalars_wait_for_the_separator():
+    parser = JSONArrayStreamParser()
+    assert parser.feed("[12") == []
+    assert parser.feed("3, 4") == [123]
+    assert parser.feed("]") == [4]
+
+
+def test_brackets_in_prose_are_skipped():
+    text = 'See [note] and [1 of 2] first. [{"id": 7}]'
+    assert list(iter_json_array(pieces(text, 4))) == [{"id": 7}]
+
+
+def test_empty_array():
+    parser = JSONArrayStreamParser()
+    assert parser.feed("[ ]") == []
+    assert parser.done
+
+
+def test_text_after_the_array_is_ignored():
+    parser = JSONArrayStreamParser()
+    assert parser.feed('[1, 2] and [3]') == [1, 2]
+    assert parser.feed("[4]") == []
+
+
+def test_iter_json_array_stops_consuming_after_close():
+    consumed = []
+
+    def source():
+        for piece in ['[{"id": 1}', "]", " trailing", " more"]:
+            consumed.append(piece)
+            yield piece
+
+    assert list(iter_json_array(source())) == [{"id": 1}]
+    assert consumed == ['[{"id": 1}', "]"]
@@ -0,0 +1,68 @@
+import random
+
+import numpy as np
+import pytest
+
+from neighbors import NeighborEngine
+from retrieval import EntityIndex
+
+
+@pytest.fixture
+def users():
+    rng = random.Random(5)
+    interests = [f"interest{i}" for i in range(12)]
+    return [{"id": 100 + i, "interests": rng.sample(interests, rng.randint(0, 4))} for i in range(150)]
+
+
+@pytest.fixture
+def profiles(users):
+    vectors = np.random.default_rng(5).standard_normal((len(users), 8)).astype(np.float32)
+    return EntityIndex("profile", users, vectors / np.linalg.norm(vectors, axis=1, keepdims=True))
+
+
+def rebuilt(users, profiles, **kwargs):
+    engine = NeighborEngine(users, profiles, **kwargs)
+    engine.build()
+    return engine
+
+
+def test_blocked_build_matches_single_block(users, profiles):
+    whole = rebuilt(users, profiles, k=5)
+    blocked = rebuilt(users, profiles, k=5, block_bytes=4 * len(users) * 7)
+    np.testing.assert_allclose(blocked.scores, whole.scores, atol=1e-6)
+    np.testing.assert_array_equal(blocked.neighbors, whole.neighbors)
+
+
+@pytest.mark.parametrize("interests", [["interest0", "interest1"], [], ["interest11", "brand new"]])
+def test_update_user_matches_full_rebuild(users, profiles, interests):
+    engine = rebuilt(users, profiles, k=5)
+    for user_id in (100, 175, 249):
+        users[user_id - 100]["interests"] = interests
+        engine.update_user(user_id, interests)
+
+    expected = rebuilt(users, profiles, k=5)
+    np.testing.assert_allclose(engine.scores, expected.scores, atol=1e-6)
+    np.testing.assert_array_equal(engine.neighbors, expected.neighbors)
+
+
+def test_similar_excludes_self(users, profiles):
+    engine = rebuilt(users, profiles, k=5)
+    for user in users[:20]:
+        similar = engine.similar(user["id"], 5)
+        assert len(similar) == 5
+        assert user["id"] not in {u["id"] for u, _ in similar}
+    assert engine.similar(999) == []
+
+
+def test_update_after_profiles_grow(users, profiles):
+    # A bulk import appends users and profile rows the engine has not indexed yet
+    engine = rebuilt(list(users), profiles, k=5)
+    extra = [{"id": 900 + i, "interests": ["interest0"]} for i in range(3)]
+    vectors = np.random.default_rng(6).standard_normal((3, 8)).astype(np.float32)
+    users.extend(extra)
+    profiles.append(extra, vectors)
+
+    users[0]["interests"] = ["interest3"]
+    engine.update_user(100, ["interest3"])
+    expected = rebuilt(users[:150], EntityIndex("profile", users[:150], profiles.embeddings[:150]), k=5)
+    np.testing.assert_allclose(engine.scores, expected.scores, atol=1e-6)
@@ -0,0 +1,85 @@
+import random
+
+import numpy as np
+import pytest
+
+from recommend import CommunityRecommender
+from retrieval import EntityIndex
+
+
+def unit_rows(rng, count, dim=8):
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def world():
+    rng = random.Random(7)
+    vectors = np.random.default_rng(7)
+    interests = [f"interest{i}" for i in range(30)]
+    communities = [{"id": 1000 + i, "interests": rng.sample(interests, rng.randint(0, 5))} for i in range(40)]
+    community_ids = [c["id"] for c in communities]
+    users = [
+        {
+            "id": i,
+            # Some interests no community has, and a membership of an unknown community
+            "interests": rng.sample(interests + ["knitting", "chess"], rng.randint(0, 6)),
+            "community_ids": rng.sample(community_ids + [99], rng.randint(0, 4)),
+        }
+        for i in range(200)
+    ]
+    profiles = EntityIndex("profile", users, unit_rows(vectors, len(users)))
+    return users, profiles, EntityIndex("community", communities, unit_rows(vectors, len(communities)))
+
+
+def test_chunked_build_matches_single_chunk(world):
+    users, profiles, communities = world
+    whole = CommunityRecommender(users, profiles, communities, k=5)
+    whole.build()
+    chunked = CommunityRecommender(users, profiles, communities, k=5, chunk_bytes=4 * 4 * len(communities) * 17)
+    chunked.build()
+    np.testing.assert_allclose(chunked.scores, whole.scores, atol=1e-6)
+
+
+def test_update_user_matches_full_rebuild(world):
+    users, profiles, communities = world
+    recommender = CommunityRecommender(users, profiles, communities, k=5)
+    recommender.build()
+    for user_id, interests in ((3, ["interest1", "interest2", "chess"]), (50, []), (199, ["interest29"])):
+        users[user_id]["interests"] = interests
+        recommender.update_user(user_id)
+
+    rebuilt = CommunityRecommender(users, profiles, communities, k=5)
+    rebuilt.build()
+    np.testing.assert_allclose(recommender.scores, rebuilt.scores, atol=1e-6)
+    np.testing.assert_array_equal(recommender.recommendations, rebuilt.recommendations)
+
+
+def test_recommendations_exclude_joined_communities(world):
+    users, profiles, communities = world
+    recommender = CommunityRecommender(users, profiles, communities, k=5)
+    recommender.build()
+    for user in users:
+        assert not {c["id"] for c, _ in recommender.recommend(user["id"])} & set(user["community_ids"])
+
+
+def test_update_after_bulk_import(world):
+    # Bulk imports append users, profiles and communities the recommender has not indexed yet
+    users, profiles, communities = world
+    recommender = CommunityRecommender(list(users), profiles, communities, k=5)
+    recommender.build()
+    vectors = np.random.default_rng(8)
+    new_users = [{"id": 500 + i, "interests": ["interest1"], "community_ids": []} for i in range(3)]
+    profiles.append(new_users, unit_rows(vectors, 3))
+    communities.append([{"id": 2000 + i, "interests": ["interest1"]} for i in range(4)], unit_rows(vectors, 4))
+
+    users[3]["interests"] = ["interest1", "interest2"]
+    recommender.update_user(3)
+    assert all(c["id"] < 2000 for c, _ in recommender.recommend(3))
+
+    expected = CommunityRecommender(
+        users[:200], EntityIndex("profile", users[:200], profiles.embeddings[:200]),
+        EntityIndex("community", communities.entities[:40], communities.embeddings[:40]), k=5,
+    )
+    expected.build()
+    np.testing.assert_allclose(recommender.scores, expected.scores, atol=1e-6)
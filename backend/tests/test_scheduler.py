@@ -0,0 +1,36 @@
+import asyncio
+import threading
+
+from scheduler import Job, Scheduler
+
+
+def test_run_without_start():
+    applied = []
+    scheduler = Scheduler()
+    scheduler.add(Job("double", lambda x: 2 * x, snapshot=lambda: (21,), apply=applied.append, executor="thread"))
+
+    async def main():
+        try:
+            return await scheduler.run("double")
+        finally:
+            await scheduler.stop()
+
+    status = asyncio.run(main())
+    assert status["status"] == "ok" and status["runs"] == 1
+    assert applied == [42]
+
+
+def test_apply_runs_off_the_event_loop():
+    threads = []
+    scheduler = Scheduler()
+    scheduler.add(Job("noop", lambda: None, apply=lambda _: threads.append(threading.current_thread()), executor="thread"))
+
+    async def main():
+        await scheduler.start()
+        try:
+            await scheduler.run("noop")
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(main())
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,91 @@
+import pytest
+
+from retrieval import estimate_tokens
+from sessions import ChatSession, SessionStore
+
+
+def make_session(turns, words=40):
+    session = ChatSession("s")
+    for i in range(turns):
+        session.add("user" if i % 2 == 0 else "assistant", f"turn{i} " + "word " * words)
+    return session
+
+
+def turn_tokens(session):
+    return sum(estimate_tokens(t["content"]) for t in session.turns)
+
+
+def failing(previous, turns):
+    raise RuntimeError("LLM overloaded")
+
+
+def test_context_within_budget_does_not_summarize():
+    session = make_session(2)
+    calls = []
+    messages = session.context(10_000, lambda previous, turns: calls.append(turns) or "summary")
+    assert calls == []
+    assert messages == session.turns
+
+
+def test_context_folds_oldest_turns_into_summary():
+    session = make_session(10)
+    budget = turn_tokens(session) // 2
+    folded = []
+
+    def summarize(previous, turns):
+        folded.extend(t["content"] for t in turns)
+        return "summary"
+
+    messages = session.context(budget, summarize)
+    assert folded and folded[0].startswith("turn0 ")
+    assert session.summary == "summary"
+    assert not any(t["content"] in folded for t in session.turns)
+    assert messages[0]["role"] == "system" and "summary" in messages[0]["content"]
+    assert messages[-1]["content"].startswith("turn9 ")
+    assert turn_tokens(session) <= budget // 2
+
+
+def test_failed_summary_keeps_turns_and_retries_next_turn():
+    session = make_session(10)
+    budget = turn_tokens(session) // 2
+    before = list(session.turns)
+
+    messages = session.context(budget, failing)
+    assert session.turns == before
+    assert session.summary == ""
+    # The prompt is still bounded by the budget and ends with the newest turn
+    assert sum(estimate_tokens(m["content"]) for m in messages) <= budget
+    assert messages[-1] == before[-1]
+
+    session.add("user", "turn10 " + "word " * 40)
+    folded = []
+    session.context(budget, lambda previous, turns: folded.extend(turns) or "recovered")
+    assert folded[0] == before[0]
+    assert session.summary == "recovered"
+    assert turn_tokens(session) <= budget // 2
+
+
+def test_repeated_failures_cap_kept_turns():
+    session = make_session(4)
+    budget = turn_tokens(session) // 2
+    cap = 2 * budget
+    for i in range(40):
+        session.add("user", f"more{i} " + "word " * 40)
+        messages = session.context(budget, failing, max_unsummarized=cap)
+        assert turn_tokens(session) <= cap
+        assert sum(estimate_tokens(m["content"]) for m in messages) <= budget
+    assert session.turns[-1]["content"].startswith("more39 ")
+
+
+def test_newest_turn_is_kept_even_when_over_budget():
+    session = make_session(1, words=500)
+    messages = session.context(10, failing, max_unsummarized=10)
+    assert messages == session.turns and len(session.turns) == 1
+
+
+@pytest.mark.parametrize("max_sessions", [1, 3])
+def test_store_evicts_least_recently_used(max_sessions):
+    store = SessionStore(max_sessions=max_sessions, ttl=60)
+    ids = [store.get_or_create(None).id for _ in range(max_sessions + 1)]
+    assert store.get_or_create(ids[-1]).id == ids[-1]
+    assert store.get_or_create(ids[0]).id != ids[0]
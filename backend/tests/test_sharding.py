@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from retrieval import SCORE_BLOCK_ROWS, EntityIndex
+from sharding import ShardedIndex, block_spans, search_spans, shard_blocks
+
+
+def unit_rows(rng, count, dim=16):
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def entities(start, stop):
+    return [{"id": i, "name": f"event {i}"} for i in range(start, stop)]
+
+
+def ranked(results):
+    return [(entity["id"], round(score, 5)) for entity, score in results]
+
+
+@pytest.fixture(scope="module")
+def rng():
+    return np.random.default_rng(3)
+
+
+@pytest.fixture(scope="module", params=["range", "hash"])
+def pair(request, rng):
+    count = 4 * SCORE_BLOCK_ROWS + 123
+    vectors = unit_rows(rng, count)
+    plain = EntityIndex("event", entities(0, count), vectors.copy())
+    sharded = ShardedIndex(EntityIndex("event", entities(0, count), vectors.copy()), shards=3, mode=request.param, lanes=2)
+    yield plain, sharded
+    sharded.close()
+
+
+def test_blocks_cover_every_row_once():
+    total = 7 * SCORE_BLOCK_ROWS + 5
+    for mode in ("range", "hash"):
+        rows = [
+            row for blocks in shard_blocks(total, 3, mode)
+            for start, stop in block_spans(blocks, total) for row in range(start, stop)
+        ]
+        assert sorted(rows) == list(range(total))
+
+
+def test_search_spans_maps_positions_to_rows(rng):
+    matrix = unit_rows(rng, 50)
+    spans = [(5, 10), (20, 30), (40, 50)]
+    rows, scores = search_spans(matrix, spans, matrix[25], 3, None)
+    assert rows[0] == 25
+    np.testing.assert_allclose(scores, matrix[rows] @ matrix[25], atol=1e-6)
+
+
+def test_sharded_search_matches_unsharded(pair, rng, caplog):
+    plain, sharded = pair
+    for query in unit_rows(rng, 5):
+        assert ranked(sharded.search(query, 10)) == ranked(plain.search(query, 10))
+        mask = rng.random(len(plain)) < 0.1
+        assert ranked(sharded.search(query, 10, mask)) == ranked(plain.search(query, 10, mask))
+    assert "searching locally" not in caplog.text
+
+
+def test_concurrent_queries_match_unsharded(pair, rng, caplog):
+    plain, sharded = pair
+    queries = unit_rows(rng, 16)
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda q: ranked(sharded.search(q, 5)), queries))
+    assert results == [ranked(plain.search(q, 5)) for q in queries]
+    assert "searching locally" not in caplog.text
+
+
+def test_append_is_searched_by_shards(rng, caplog):
+    count = SCORE_BLOCK_ROWS + 10
+    vectors = unit_rows(rng, count)
+    sharded = ShardedIndex(EntityIndex("event", entities(0, count), vectors), shards=2, lanes=2)
+    try:
+        # Enough rows to outgrow the file and move the matrix
+        added = unit_rows(rng, 2 * SCORE_BLOCK_ROWS)
+        sharded.append(entities(count, count + len(added)), added)
+        assert sharded._processes
+        results = sharded.search(added[-1], 1)
+        assert results[0][0]["id"] == count + len(added) - 1
+        plain = EntityIndex("event", list(sharded.entities), np.array(sharded.embeddings))
+        assert ranked(sharded.search(added[0], 10)) == ranked(plain.search(added[0], 10))
+        assert "searching locally" not in caplog.text
+    finally:
+        sharded.close()
+
+
+def test_shared_file_is_searched_in_place(rng, tmp_path):
+    count = 2 * SCORE_BLOCK_ROWS + 7
+    vectors = unit_rows(rng, count)
+    EntityIndex("event", entities(0, count), vectors).save(str(tmp_path))
+    shared = EntityIndex.load("event", entities(0, count), str(tmp_path))
+    sharded = ShardedIndex(shared, shards=2, lanes=1)
+    try:
+        assert sharded._path == str(tmp_path / "event.embeddings.npy")
+        plain = EntityIndex("event", entities(0, count), vectors.copy())
+        assert ranked(sharded.search(vectors[5], 10)) == ranked(plain.search(vectors[5], 10))
+
+        # The first write moves the index to a file of its own and leaves the shared one untouched
+        sharded.set_row(5, vectors[6])
+        assert sharded._path != str(tmp_path / "event.embeddings.npy")
+        assert {e["id"] for e, _ in sharded.search(vectors[6], 2)} == {5, 6}
+        np.testing.assert_array_equal(np.load(tmp_path / "event.embeddings.npy"), vectors)
+    finally:
+        sharded.close()
+    assert (tmp_path / "event.embeddings.npy").exists()
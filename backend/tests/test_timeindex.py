@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from timeindex import TimeIndex, parse_day, parse_time, parse_time_constraint
+
+EVENTS = [
+    {"id": 1, "name": "Acoustic Night", "date": "Friday", "time": "8 PM"},
+    {"id": 2, "name": "Astronomy Night", "date": "Friday", "time": "9 PM"},
+    {"id": 3, "name": "Jazz Evening", "date": "Saturday", "time": "7 PM"},
+    {"id": 4, "name": "Sunrise Yoga", "date": "Sunday", "time": "6 AM"},
+    {"id": 5, "name": "Sunday Market", "date": "2024-06-01", "time": "10:30 am"},
+    {"id": 6, "name": "Mystery Meetup", "date": "someday", "time": "later"},
+]
+
+
+def minutes(hour, minute=0):
+    return hour * 60 + minute
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("7 PM", minutes(19)),
+    ("10 AM", minutes(10)),
+    ("12 PM", minutes(12)),
+    ("12 AM", 0),
+    ("10:30 am", minutes(10, 30)),
+    ("19:30", minutes(19, 30)),
+    ("noon", minutes(12)),
+    ("13 PM", -1),
+    ("later", -1),
+    (None, -1),
+])
+def test_parse_time(value, expected):
+    assert parse_time(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("Saturday", 5), ("sat", 5), ("Monday", 0), ("2024-06-01", 5), ("someday", -1), (None, -1),
+])
+def test_parse_day(value, expected):
+    assert parse_day(value) == expected
+
+
+@pytest.mark.parametrize("query, windows", [
+    ("music 7-9pm", [(minutes(19), minutes(21) + 1)]),
+    ("from 9 to 5pm", [(minutes(9), minutes(17) + 1)]),
+    ("2 pm to 4 pm", [(minutes(14), minutes(16) + 1)]),
+    ("between 6 and 9 pm", [(minutes(18), minutes(21) + 1)]),
+    ("from 9pm to 2am", [(minutes(21), minutes(2) + 1)]),
+    ("from 10 to noon", [(minutes(10), minutes(12) + 1)]),
+    ("18:00-21:00 talks", [(minutes(18), minutes(21) + 1)]),
+    ("after 6pm", [(minutes(18), minutes(24))]),
+    ("before 10am", [(0, minutes(10))]),
+    ("jazz at 7:30 pm", [(minutes(18, 30), minutes(20, 30) + 1)]),
+])
+def test_clock_times_are_hard_windows(query, windows):
+    constraint = parse_time_constraint(query)
+    assert list(constraint.windows) == windows
+    assert not constraint.soft_windows
+
+
+@pytest.mark.parametrize("query", ["top 5 events", "21+ party", "kids 5-12 years", "rock and 9 fans", ""])
+def test_bare_numbers_add_no_constraint(query):
+    assert not parse_time_constraint(query)
+
+
+@pytest.mark.parametrize("query", ["Acoustic Night", "beach bonfire night", "evening jazz", "events tonight"])
+def test_periods_are_soft(query):
+    constraint = parse_time_constraint(query)
+    assert constraint.soft_windows and not constraint.hard
+
+
+def test_days():
+    assert parse_time_constraint("Saturday evening music").days == {5}
+    assert parse_time_constraint("weekend brunch").days == {5, 6}
+    assert parse_time_constraint("weekdays").days == {0, 1, 2, 3, 4}
+    # Abbreviations are ordinary words in queries
+    assert not parse_time_constraint("sat by the sun")
+
+
+def test_day_words_of_event_names_are_soft():
+    index = TimeIndex(EVENTS + [{"id": 7, "name": "Weekend Warriors Bootcamp", "date": "Monday", "time": "7 AM"}])
+    for query in ("sunday market", "the Sunday Market near me"):
+        constraint = parse_time_constraint(query, index.name_phrases)
+        assert not constraint.days and constraint.soft_days == {6}
+    assert parse_time_constraint("weekend warriors", index.name_phrases).soft_days == {5, 6}
+    # The same day words outside the phrases of a name still filter
+    assert parse_time_constraint("saturday market", index.name_phrases).days == {5}
+    assert parse_time_constraint("sunday concerts", index.name_phrases).days == {6}
+    assert parse_time_constraint("weekend concerts", index.name_phrases).days == {5, 6}
+
+
+def test_index_columns():
+    index = TimeIndex(EVENTS)
+    assert index.days.tolist() == [4, 4, 5, 6, 5, -1]
+    assert index.minutes.tolist() == [minutes(20), minutes(21), minutes(19), minutes(6), minutes(10, 30), -1]
+
+
+def test_mask_uses_hard_constraints_only():
+    index = TimeIndex(EVENTS)
+    constraint = parse_time_constraint("friday night")
+    assert index.mask(constraint).tolist() == [True, True, False, False, False, False]
+    assert index.preferred(constraint).tolist() == [False, True, False, False, False, False]
+
+
+def test_windows_wrap_past_midnight_and_skip_unparsed_times():
+    index = TimeIndex(EVENTS)
+    rows = index.window_rows(minutes(20, 30), minutes(7))
+    assert sorted(rows.tolist()) == [1, 3]
+    assert not index.mask(parse_time_constraint("after 11am"))[5]
+
+
+def test_append_matches_building_at_once():
+    whole = TimeIndex(EVENTS)
+    grown = TimeIndex(EVENTS[:2])
+    grown.append(EVENTS[2:])
+    constraint = parse_time_constraint("between 6 and 9 pm")
+    assert np.array_equal(grown.mask(constraint), whole.mask(constraint))
+    assert grown.name_phrases == whole.name_phrases
@@ -0,0 +1,321 @@
+import re
+import threading
+from datetime import datetime
+from typing import FrozenSet, Iterable, Iterator, Mapping, Optional, Tuple
+
+import numpy as np
+
+MINUTES_PER_DAY = 24 * 60
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+# Abbreviations accepted in event dates; queries only match full names, since "sun" or "sat" are ordinary words there
+DAY_ABBREVIATIONS = {
+    "mon": 0, "tue": 1, "tues": 1, "wed": 2, "thu": 3, "thur": 3, "thurs": 3, "fri": 4, "sat": 5, "sun": 6,
+}
+# Day words of a query and the days they stand for
+QUERY_DAYS = {
+    **{name: frozenset([day]) for day, name in enumerate(WEEKDAYS)},
+    **{name + "s": frozenset([day]) for day, name in enumerate(WEEKDAYS)},
+    "weekend": frozenset([5, 6]),
+    "weekends": frozenset([5, 6]),
+    "weekday": frozenset(range(5)),
+    "weekdays": frozenset(range(5)),
+}
+# Parts of the day as [start, end) minute windows; a window with start > end wraps past midnight.
+# They only rank matching events higher: "night" or "evening" are as often part of a name ("Acoustic Night").
+PERIODS = {
+    "morning": (5 * 60, 12 * 60),
+    "mornings": (5 * 60, 12 * 60),
+    "afternoon": (12 * 60, 17 * 60),
+    "afternoons": (12 * 60, 17 * 60),
+    "evening": (17 * 60, 21 * 60),
+    "evenings": (17 * 60, 21 * 60),
+    "tonight": (17 * 60, 5 * 60),
+    "night": (21 * 60, 5 * 60),
+    "nights": (21 * 60, 5 * 60),
+}
+NAMED_TIMES = {"noon": 12 * 60, "midday": 12 * 60, "midnight": 0}
+# Minutes either side of a time named with "at" (or on its own), e.g. "at 7pm"
+TIME_TOLERANCE = 60
+
+CLOCK = r"(?:(\d{1,2})(?::(\d{2}))?\s*([ap])\.?m\.?|(\d{1,2}):(\d{2})|(noon|midday|midnight))"
+# "7-9pm", "2 pm to 4 pm", "from 9 to 5pm", "between 6 and 9 pm": the end must be a clock time,
+# the start may omit its meridiem; "and" only separates the ends after "between"
+TIME_RANGE = re.compile(
+    r"\b(?:(from|between)\s+)?(\d{1,2})(?::(\d{2}))?\s*(?:([ap])\.?m\.?)?\s*(to|and|-|\u2013|until|till)\s*" + CLOCK
+    + r"(?![\w:])",
+    re.IGNORECASE,
+)
+TIME_POINT = re.compile(r"\b(?:(after|from|before|until|till|by|at|around)\s+)?" + CLOCK + r"(?![\w:])", re.IGNORECASE)
+WORD = re.compile(r"[a-z]+")
+
+
+def clock_minutes(hour: str, minute: Optional[str], meridiem: Optional[str]) -> int:
+    """
+    Minute of day of a 12-hour (with meridiem "a"/"p") or 24-hour clock reading, or -1.
+    """
+    hour, minute = int(hour), int(minute or 0)
+    if minute >= 60:
+        return -1
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return -1
+        hour = hour % 12 + (12 if meridiem.lower() == "p" else 0)
+    elif hour >= 24:
+        return -1
+    return hour * 60 + minute
+
+
+def match_minutes(match: re.Match, offset: int) -> int:
+    """
+    Minute of day of the CLOCK groups of match, starting at group offset.
+    """
+    hour, minute, meridiem, hour24, minute24, named = match.group(*range(offset, offset + 6))
+    if named:
+        return NAMED_TIMES[named.lower()]
+    if hour24 is not None:
+        return clock_minutes(hour24, minute24, None)
+    return clock_minutes(hour, minute, meridiem)
+
+
+def range_start(hour: str, minute: Optional[str], meridiem: Optional[str], end: int, end_is_24h: bool) -> int:
+    """
+    Minute of day of the start of a range. Without a meridiem, a start read
+    as 12-hour time takes whichever of am and pm gives the shorter range up
+    to end, so "7-9pm" starts at 7 PM and "from 9 to 5pm" at 9 AM.
+    """
+    if meridiem or end_is_24h or int(hour) > 12:
+        return clock_minutes(hour, minute, meridiem)
+    morning = clock_minutes(hour, minute, "a")
+    if morning < 0:
+        return -1
+    return min((morning, morning + 12 * 60), key=lambda start: (end - start) % MINUTES_PER_DAY)
+
+
+def parse_day(value: Optional[str]) -> int:
+    """
+    Day of the week (0 = Monday) of an event date given as a day name or
+    as YYYY-MM-DD, or -1 when it does not parse.
+    """
+    text = (value or "").strip().lower().rstrip(".")
+    if text in WEEKDAYS:
+        return WEEKDAYS.index(text)
+    if text in DAY_ABBREVIATIONS:
+        return DAY_ABBREVIATIONS[text]
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").weekday()
+    except ValueError:
+        return -1
+
+
+def parse_time(value: Optional[str]) -> int:
+    """
+    Minute of day of an event time such as "7 PM", "10:30 am", "19:00" or
+    "noon", or -1 when it does not parse.
+    """
+    match = re.fullmatch(CLOCK, (value or "").strip(), re.IGNORECASE)
+    return match_minutes(match, 1) if match else -1
+
+
+def format_days(days: Iterable[int]) -> str:
+    return ",".join(WEEKDAYS[d][:3] for d in sorted(days))
+
+
+def format_windows(windows: Iterable[Tuple[int, int]]) -> str:
+    return ",".join(f"{s // 60:02d}:{s % 60:02d}-{e // 60:02d}:{e % 60:02d}" for s, e in windows)
+
+
+class TimeConstraint:
+    """
+    Days (0 = Monday) and [start, end) minute windows a query asks for.
+    days and windows are hard constraints that filter events out;
+    soft_days and soft_windows are preferences that only rank matching
+    events higher. Empty means unconstrained.
+    """
+
+    def __init__(
+        self,
+        days: Iterable[int] = (),
+        windows: Iterable[Tuple[int, int]] = (),
+        soft_days: Iterable[int] = (),
+        soft_windows: Iterable[Tuple[int, int]] = (),
+    ):
+        self.days: FrozenSet[int] = frozenset(days)
+        self.windows: Tuple[Tuple[int, int], ...] = tuple(windows)
+        self.soft_days: FrozenSet[int] = frozenset(soft_days)
+        self.soft_windows: Tuple[Tuple[int, int], ...] = tuple(soft_windows)
+
+    @property
+    def hard(self) -> bool:
+        return bool(self.days or self.windows)
+
+    @property
+    def soft(self) -> bool:
+        return bool(self.soft_days or self.soft_windows)
+
+    def __bool__(self) -> bool:
+        return self.hard or self.soft
+
+    def __repr__(self) -> str:
+        return (
+            f"TimeConstraint(days=[{format_days(self.days)}], windows=[{format_windows(self.windows)}], "
+            f"soft_days=[{format_days(self.soft_days)}], soft_windows=[{format_windows(self.soft_windows)}])"
+        )
+
+
+def day_phrases(name: str) -> Iterator[Tuple[str, str]]:
+    """
+    The word pairs of a name that contain a day word, e.g. ("sunday",
+    "market") for "Sunday Market".
+    """
+    words = WORD.findall(name.lower())
+    for first, second in zip(words, words[1:]):
+        if first in QUERY_DAYS or second in QUERY_DAYS:
+            yield first, second
+
+
+def parse_time_constraint(query: str, name_phrases: Iterable[Tuple[str, str]] = ()) -> TimeConstraint:
+    """
+    Pulls day and time constraints out of free query text. Hard constraints
+    are day names and "weekend(s)"/"weekday(s)", clock times with
+    "after"/"before"/"at" ("after 6pm", "at 19:30") and ranges ("7-9pm",
+    "between 6 and 9 pm", "from 10am to noon"). Parts of the day
+    ("evening", "tonight") are only soft preferences, and so is a day word
+    that forms one of name_phrases (the day_phrases of the event names)
+    with the query word before or after it: "sunday market" names the
+    "Sunday Market" event, "sunday concerts" still asks for Sundays.
+    Bare numbers are not read as times, so "top 5" or "21+" add no constraint.
+    """
+    text = query.lower()
+    name_phrases = frozenset(name_phrases)
+    days, soft_days = set(), set()
+    windows, soft_windows = [], []
+    words = WORD.findall(text)
+    for position, word in enumerate(words):
+        if word in QUERY_DAYS:
+            named = (
+                (position > 0 and (words[position - 1], word) in name_phrases)
+                or (position + 1 < len(words) and (word, words[position + 1]) in name_phrases)
+            )
+            (soft_days if named else days).update(QUERY_DAYS[word])
+        elif word in PERIODS:
+            soft_windows.append(PERIODS[word])
+
+    spans = []
+    for match in TIME_RANGE.finditer(text):
+        prefix, separator = match.group(1), match.group(5).lower()
+        if separator == "and" and (prefix or "").lower() != "between":
+            continue
+        end = match_minutes(match, 6)
+        if end < 0:
+            continue
+        start = range_start(match.group(2), match.group(3), match.group(4), end, match.group(9) is not None)
+        if start < 0:
+            continue
+        # The end is inclusive, so "between 6 and 9 pm" keeps 9 PM events
+        windows.append((start, (end + 1) % MINUTES_PER_DAY))
+        spans.append(match.span())
+    for start, end in reversed(spans):
+        text = text[:start] + " " + text[end:]
+
+    for match in TIME_POINT.finditer(text):
+        minutes = match_minutes(match, 2)
+        if minutes < 0:
+            continue
+        keyword = (match.group(1) or "at").lower()
+        if keyword in ("after", "from"):
+            windows.append((minutes, MINUTES_PER_DAY))
+        elif keyword in ("before", "until", "till", "by"):
+            windows.append((0, minutes))
+        else:
+            windows.append(((minutes - TIME_TOLERANCE) % MINUTES_PER_DAY, (minutes + TIME_TOLERANCE + 1) % MINUTES_PER_DAY))
+    return TimeConstraint(days, windows, soft_days, soft_windows)
+
+
+class TimeIndex:
+    """
+    Structured day-of-week and minute-of-day columns of the events (-1 when
+    the free-text date or time does not parse), with the rows also sorted by
+    minute. A time window is then two binary searches over the sorted
+    minutes, and a constraint becomes a boolean row mask for
+    EntityIndex.search without a loop over events. Rows follow the order of
+    the events. The day phrases of the event names are collected for
+    parse_time_constraint, so day words that name events stay soft.
+    """
+
+    def __init__(self, events: Iterable[Mapping] = ()):
+        empty = np.zeros(0, dtype=np.int16)
+        # days, minutes, rows ordered by minute, minutes in that order
+        self._columns = (empty.astype(np.int8), empty, empty.astype(np.int64), empty)
+        self.name_phrases: FrozenSet[Tuple[str, str]] = frozenset()
+        self._lock = threading.Lock()
+        self.append(events)
+
+    def __len__(self) -> int:
+        return len(self._columns[0])
+
+    @property
+    def days(self) -> np.ndarray:
+        return self._columns[0]
+
+    @property
+    def minutes(self) -> np.ndarray:
+        return self._columns[1]
+
+    def append(self, events: Iterable[Mapping]):
+        """
+        Parses events and adds them as the next rows.
+        """
+        events = list(events)
+        new_days = np.array([parse_day(e.get("date")) for e in events], dtype=np.int8)
+        new_minutes = np.array([parse_time(e.get("time")) for e in events], dtype=np.int16)
+        new_phrases = {phrase for e in events for phrase in day_phrases(str(e.get("name", "")))}
+        with self._lock:
+            self.name_phrases = self.name_phrases | new_phrases
+            days = np.concatenate([self._columns[0], new_days])
+            minutes = np.concatenate([self._columns[1], new_minutes])
+            order = np.argsort(minutes, kind="stable")
+            # Readers take the columns as one tuple, so they never see a partial update
+            self._columns = (days, minutes, order, minutes[order])
+
+    def window_rows(self, start: int, end: int) -> np.ndarray:
+        """
+        Rows whose time falls in [start, end), wrapping past midnight when start > end.
+        """
+        return self._window_rows(self._columns, start, end)
+
+    @staticmethod
+    def _window_rows(columns: tuple, start: int, end: int) -> np.ndarray:
+        _, _, order, sorted_minutes = columns
+        if start <= end:
+            bounds = [(start, end)]
+        else:
+            bounds = [(start, MINUTES_PER_DAY), (0, end)]
+        return np.concatenate([
+            order[np.searchsorted(sorted_minutes, lo, "left"):np.searchsorted(sorted_minutes, hi, "left")]
+            for lo, hi in bounds
+        ])
+
+    def mask(self, constraint: TimeConstraint) -> np.ndarray:
+        """
+        Boolean row mask of the events meeting the hard constraints: on one
+        of the constraint's days (any day if none) and within one of its
+        windows (any time if none). Events whose date or time does not
+        parse fail that part.
+        """
+        return self._match(self._columns, constraint.days, constraint.windows)
+
+    def preferred(self, constraint: TimeConstraint) -> np.ndarray:
+        """
+        Boolean row mask of the events meeting the soft preferences, in the same way.
+        """
+        return self._match(self._columns, constraint.soft_days, constraint.soft_windows)
+
+    def _match(self, columns: tuple, days: FrozenSet[int], windows: Tuple[Tuple[int, int], ...]) -> np.ndarray:
+        mask = np.isin(columns[0], list(days)) if days else np.ones(len(columns[0]), dtype=bool)
+        if windows:
+            in_window = np.zeros(len(columns[0]), dtype=bool)
+            for start, end in windows:
+                in_window[self._window_rows(columns, start, end)] = True
+            mask &= in_window
+        return mask